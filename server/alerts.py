@@ -0,0 +1,164 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from models import db, dialect_insert, Product, Sales, StockTransaction, LowStockAlert, AlertRetry, AlertWatermark
+
+logger = logging.getLogger(__name__)
+
+#watermark source -> table whose new rows mark their product as touched
+SOURCES = {
+    'sales': Sales.__table__,
+    'stock_transactions': StockTransaction.__table__,
+}
+
+class WatermarkMoved(Exception):
+    """Raised when another evaluator advanced a watermark first, the caller rolls back and retries later."""
+
+def claim_new_rows(connection):
+    """Advance every watermark to its table's current max id, returning {source: (last_id, new_id)}."""
+    table = AlertWatermark.__table__
+    watermarks = dict(connection.execute(db.select(table.c.source, table.c.last_id)).all())
+    ranges = {}
+    for source, source_table in SOURCES.items():
+        last_id = watermarks.get(source, 0)
+        #max() of the primary key is an index lookup, never a scan
+        new_id = max(connection.execute(db.select(db.func.max(source_table.c.id))).scalar() or 0, last_id)
+        if source not in watermarks:
+            claimed = connection.execute(dialect_insert(connection)(table)
+                .values(source=source, last_id=new_id)
+                .on_conflict_do_nothing(index_elements=['source'])).rowcount
+        else:
+            claimed = connection.execute(table.update()
+                .where(table.c.source == source, table.c.last_id == last_id)
+                .values(last_id=new_id)).rowcount
+        if claimed == 0:
+            raise WatermarkMoved(source)
+        ranges[source] = (last_id, new_id)
+    return ranges
+
+def touched_products(connection, ranges, margin=0):
+    #ids are handed out before commit, so on Postgres a row can become visible after a higher id was claimed;
+    #the last `margin` ids below the watermark are looked at again to catch those, anything later is missed
+    product_ids = set()
+    for source, (last_id, new_id) in ranges.items():
+        if new_id > last_id:
+            source_table = SOURCES[source]
+            product_ids.update(connection.execute(db.select(source_table.c.product_id).distinct()
+                .where(source_table.c.id > last_id - margin, source_table.c.id <= new_id)).scalars())
+    return product_ids
+
+def claim_retries(connection, now):
+    """Take the products whose debounce window has passed off the retry list, returns their ids."""
+    table = AlertRetry.__table__
+    product_ids = connection.execute(db.select(table.c.product_id).where(table.c.retry_at <= now)).scalars().all()
+    if product_ids:
+        connection.execute(table.delete().where(table.c.product_id.in_(product_ids), table.c.retry_at <= now))
+    return product_ids
+
+def schedule_retries(connection, retries):
+    """Re-check {product_id: retry_at} once retry_at has passed, even if nothing touches the product again."""
+    insert = dialect_insert(connection)(AlertRetry.__table__)
+    connection.execute(insert.on_conflict_do_update(index_elements=['product_id'],
+                                                    set_={'retry_at': insert.excluded.retry_at}),
+                       [{'product_id': product_id, 'retry_at': retry_at} for product_id, retry_at in retries.items()])
+
+def evaluate_products(connection, product_ids, now, debounce):
+    """Raise or resolve alerts for these products, returns (raised, resolved, deferred)."""
+    products = Product.__table__
+    alerts = LowStockAlert.__table__
+    levels = connection.execute(db.select(products.c.id, products.c.quantity_in_stock, products.c.reorder_point)
+        .where(products.c.id.in_(product_ids), products.c.reorder_point.is_not(None))).all()
+    if not levels:
+        return 0, 0, 0
+
+    latest = {row.product_id: row for row in connection.execute(
+        db.select(alerts.c.product_id,
+                  db.func.max(alerts.c.created_at).label('last_raised'),
+                  db.func.max(db.case((alerts.c.resolved_at.is_(None), alerts.c.id))).label('open_id'))
+            .where(alerts.c.product_id.in_([product_id for product_id, _, _ in levels]))
+            .group_by(alerts.c.product_id))}
+
+    raise_rows, resolve_ids, retries = [], [], {}
+    for product_id, quantity_in_stock, reorder_point in levels:
+        previous = latest.get(product_id)
+        open_id = previous.open_id if previous else None
+        if quantity_in_stock <= reorder_point:
+            #one open alert per product, and none again within the debounce window after the last one
+            if open_id is None and (previous is None or previous.last_raised <= now - debounce):
+                raise_rows.append({'product_id': product_id, 'quantity_in_stock': quantity_in_stock,
+                                   'reorder_point': reorder_point, 'created_at': now})
+            elif open_id is None:
+                retries[product_id] = previous.last_raised + debounce
+        elif open_id is not None:
+            resolve_ids.append(open_id)
+
+    if raise_rows:
+        connection.execute(alerts.insert(), raise_rows)
+    if resolve_ids:
+        connection.execute(alerts.update().where(alerts.c.id.in_(resolve_ids)).values(resolved_at=now))
+    if retries:
+        schedule_retries(connection, retries)
+    return len(raise_rows), len(resolve_ids), len(retries)
+
+def evaluate_low_stock(connection, debounce_seconds=3600, chunk_size=500, now=None, product_ids=(), margin=0):
+    """Re-check the products touched by sales or stock transactions since the last run, those whose debounce
+    window has passed and the given product_ids, in the caller's transaction."""
+    now = now or datetime.utcnow()
+    #claimed first, the watermark update also serializes concurrent evaluators
+    ranges = claim_new_rows(connection)
+    product_ids = sorted(touched_products(connection, ranges, margin) | set(claim_retries(connection, now))
+                         | set(product_ids))
+    report = {'products_checked': len(product_ids), 'raised': 0, 'resolved': 0, 'deferred': 0,
+              'watermarks': {source: new_id for source, (_, new_id) in ranges.items()}}
+    for start in range(0, len(product_ids), chunk_size):
+        raised, resolved, deferred = evaluate_products(connection, product_ids[start:start + chunk_size], now,
+                                                       timedelta(seconds=debounce_seconds))
+        report['raised'] += raised
+        report['resolved'] += resolved
+        report['deferred'] += deferred
+    return report
+
+class AlertEvaluator:
+    """Runs evaluate_low_stock every interval seconds on a daemon thread."""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def run_once(self):
+        with self.app.app_context():
+            try:
+                with db.engine.begin() as connection:
+                    return evaluate_low_stock(connection, self.app.config['ALERTS_DEBOUNCE_SECONDS'],
+                                              self.app.config['ALERTS_CHUNK_SIZE'],
+                                              margin=self.app.config['ALERTS_WATERMARK_MARGIN'])
+            except WatermarkMoved:
+                #another worker's evaluator got these rows
+                return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Low stock evaluation failed')
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='low-stock-evaluator', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+def init_alerts(app):
+    """Keep an evaluator on the app, running in the background when ALERTS_INTERVAL_SECONDS is positive."""
+    evaluator = AlertEvaluator(app, app.config['ALERTS_INTERVAL_SECONDS'])
+    app.extensions['alert_evaluator'] = evaluator
+    if evaluator.interval > 0:
+        #like the job workers, started by the first request so CLI commands never run it
+        app.before_request(evaluator.start)
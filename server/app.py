@@ -1,34 +1,48 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
 from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from flask_cors import CORS
-from flask_migrate import Migrate
 from flask_restful import Api, Resource
-from flask_bcrypt import Bcrypt
 from config import get_config
+import io
 import jwt
-import re
+import json
+import click
+import base64
 import datetime
-from functools import wraps
-from models import db, User, Product, Supplier, Sales, Receipt, StockSummary
+from models import (db, PASSWORD_PATTERN, User, Product, Supplier, Sales, ArchivedSales, Receipt, StockSummary, SalesRollup, StockTransaction, StockSnapshot,
+                    LowStockAlert, Job, SearchChange, product_supplier)
+from importer import read_rows, import_products
+from profiling import init_profiling
+from auth import HashPoolSaturated, HashTimeout, hash_pool, init_auth, token_required
+from export import EXPORTS, FORMATS, stream_export
+from alerts import init_alerts
+from search import KINDS, include_object, init_search, rebuild_fts_index, search
+from jobs import JobQueue, enqueue, init_jobs, sale_jobs
+from responses import cache_control, init_responses, versioned
+from serializers import init_serializers, load_row, row_dicts, serializer
+from replicas import get_router, init_replicas, read_engine, replica_reads
+from cache import cached, get_cache, init_cache, invalidate_after_commit
 
-app = Flask(__name__)
-app.config.from_object(get_config())
-app.config['SECRET_KEY'] = 'HS256' 
+#extensions are created unbound and attached to each app in create_app
+bp = Blueprint('inventory', __name__, cli_group=None)
+api = Api()
+cors = CORS()
 
-#initialize extentions
-db.init_app(app)
-migrate = Migrate(app, db)
-api = Api(app)
-bcrypt = Bcrypt(app)
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    #handlers return jsonify(...) responses, pass those through instead of re-encoding them
+    resp = data if isinstance(data, Response) else jsonify(data)
+    resp.status_code = code
+    resp.headers.extend(headers or {})
+    return resp
 
-#initialize CORS with specific origin
-CORS(app, resources={r"/*": {"origins": "*"}})
-
-@app.route('/')
+@bp.route('/')
 def index():
     return 'Hello, this is an inventory designed by BARACK!'
 
-@app.route('/auth/signup', methods=['POST'])
+@bp.route('/auth/signup', methods=['POST'])
 def signup():
     data = request.get_json()
     name = data.get('name')
@@ -46,8 +60,7 @@ def signup():
     if User.query.filter_by(email=email).first():
         return jsonify({'message': "Email already exits"}), 400
 
-    password_pattern = re.compile(r'^(?=.*[A-Za-z])(?=.*\d)[A-Za-z\d]{8,}$')
-    if not password_pattern.match(password_hash):
+    if not PASSWORD_PATTERN.match(password_hash):
         return jsonify({'message': 'Password must be at least 8 characters long and contain both letters and numbers.'}), 400
 
     #create user
@@ -55,13 +68,13 @@ def signup():
         name=name,
         email=email,
         phone_number=phone_number,
-        password_hash=bcrypt.generate_password_hash(password_hash).decode('utf-8')
+        password_hash=hash_pool().hash_password(password_hash, current_app.config.get('BCRYPT_LOG_ROUNDS', 12))
     )
     db.session.add(new_user)
     db.session.commit()
     return jsonify({'message': 'Your account has been created successfully🎉🎉'}), 201
 
-@app.route('/auth/login', methods=['POST'])
+@bp.route('/auth/login', methods=['POST'])
 def login():
     data = request.get_json()
     email = data.get('email')
@@ -69,11 +82,11 @@ def login():
 
     # Check if user exists and password is correct
     user = User.query.filter_by(email=email).first()
-    if user and bcrypt.check_password_hash(user.password_hash, password_hash):
+    if user and password_hash and hash_pool().check_password(user.password_hash, password_hash):
         token = jwt.encode({
             'user_id': user.id,
             'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=30)
-        }, app.config['SECRET_KEY'], algorithm='HS256')
+        }, current_app.config['SECRET_KEY'], algorithm='HS256')
 
         return jsonify({
             'access_token': token,
@@ -83,8 +96,119 @@ def login():
     
     return jsonify({'message': 'Invalid credentials'}), 401
 
+@bp.errorhandler(HashPoolSaturated)
+def hash_pool_saturated(error):
+    #shed load fast instead of queueing logins behind a busy pool
+    return jsonify({'message': 'Too many sign-ins in progress, try again shortly😒'}), 429, {'Retry-After': '1'}
+
+@bp.errorhandler(HashTimeout)
+def hash_timeout(error):
+    #the pool is backed up behind slow hashes, the client should come back rather than wait on
+    return jsonify({'message': 'Sign-in is taking too long, try again shortly😒'}), 503, {'Retry-After': '1'}
+
+@bp.route('/products/bulk', methods=['POST'])
+@token_required
+def bulk_import_products():
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'csv' if request.mimetype == 'text/csv' else 'jsonl'
+    if fmt not in ('csv', 'jsonl', 'ndjson'):
+        return jsonify({'message': 'format must be jsonl or csv😒'}), 400
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8')
+    report = import_products(read_rows(stream, fmt), batch_size=current_app.config['IMPORT_BATCH_SIZE'])
+    return jsonify(report), 207 if report['errors'] else 200
+
+@bp.cli.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), default=None,
+              help='Input format, guessed from the file extension by default.')
+@click.option('--batch-size', type=int, default=None, help='Rows per upsert statement and transaction.')
+def import_products_command(path, fmt, batch_size):
+    """Upsert products on sku from a JSON Lines or CSV file."""
+    fmt = fmt or ('csv' if path.endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8') as stream:
+        report = import_products(read_rows(stream, fmt), batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'])
+
+    for error in report['errors']:
+        click.echo(f"row {error['row']}: {error['error']}", err=True)
+    click.echo(f"{report['upserted']}/{report['processed']} rows upserted in "
+               f"{report['elapsed_seconds']}s ({report['rows_per_second']} rows/sec)")
+
+@bp.route('/cache/stats')
+def cache_stats():
+    cache = get_cache()
+    return jsonify(cache.stats() if cache else {'backend': 'none'}), 200
+
+@bp.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail when a hot query's plan falls back to a full table scan."""
+    from queryplan import check_query_plans
+    with db.engine.connect() as connection:
+        failures = check_query_plans(connection)
+    for name, scans in failures.items():
+        click.echo(f"{name}: {'; '.join(scans)}", err=True)
+    if failures:
+        raise SystemExit(1)
+    click.echo('All hot queries use an index')
+
+def parse_export_args(fmt, start, end):
+    if fmt not in FORMATS:
+        raise ValueError('format must be csv or ndjson')
+    return (datetime.datetime.fromisoformat(start) if start else None,
+            datetime.datetime.fromisoformat(end) if end else None)
+
+@bp.route('/export/<name>')
+@replica_reads
+def export(name):
+    if name not in EXPORTS:
+        return jsonify({'message': 'Unknown export😒'}), 404
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', 'false').lower() == 'true'
+    try:
+        start, end = parse_export_args(fmt, request.args.get('from'), request.args.get('to'))
+    except ValueError:
+        return jsonify({'message': 'format must be csv or ndjson, from and to ISO 8601 dates😒'}), 400
+
+    filename = f"{name}.{fmt}{'.gz' if compress else ''}"
+    body = stream_export(read_engine(), name, fmt, start, end, compress, current_app.config['EXPORT_CHUNK_SIZE'])
+    mimetype = 'application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson')
+    return Response(body, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@bp.cli.command('export')
+@click.argument('name', type=click.Choice(list(EXPORTS)))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv')
+@click.option('--from', 'start', help='Only rows on or after this ISO 8601 date.')
+@click.option('--to', 'end', help='Only rows before this ISO 8601 date.')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--output', type=click.File('wb'), default='-', help='Output file, stdout by default.')
+def export_command(name, fmt, start, end, compress, output):
+    """Stream sales or stock transaction history as CSV or NDJSON."""
+    start, end = parse_export_args(fmt, start, end)
+    for chunk in stream_export(db.engine, name, fmt, start, end, compress, current_app.config['EXPORT_CHUNK_SIZE']):
+        output.write(chunk)
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({'id': last_id}).encode()).decode()
+
+def page_args():
+    #keyset pagination on the primary key, the cursor is the last id of the previous page
+    after_id = decode_cursor(request.args.get('cursor'))
+    limit = int(request.args.get('limit', current_app.config['PRODUCTS_PAGE_SIZE']))
+    return after_id, max(1, min(limit, current_app.config['PRODUCTS_MAX_PAGE_SIZE']))
+
+def decode_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))['id'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+
 class ProductResource(Resource):
-    def post(self, product_id):
+    method_decorators = {'get': [replica_reads]}
+
+    def post(self, product_id=None):
         data = request.get_json()
         new_product = Product(
             name = data['name'],
@@ -92,29 +216,90 @@ class ProductResource(Resource):
             description = data['description'],
             price = data['price'],
             quantity_in_stock = data['quantity_in_stock'],
+            reorder_point = data.get('reorder_point'),
             suppliers = data['supplier']
         )
         db.session.add(new_product)
         db.session.commit()
         return jsonify({'message': 'Product added successfully👍'}), 201
     
-    def get(self, product_id):
-        product = Product.query.get(product_id)
+    def get(self, product_id=None):
+        if product_id is None:
+            return self.list()
+
+        product = cached('product', product_id, self.load)
         if product:
-            return jsonify({
-                'name': product.name,
-                'sku': product.sku,
-                'description': product.description,
-                'price': product.price,
-                'quantity_in_stock': product.quantity_in_stock,
-                'suppliers': product.suppliers
-                }), 200
+            return versioned('product', product['version_id'], lambda: {
+                'name': product['name'],
+                'sku': product['sku'],
+                'description': product['description'],
+                'price': product['price'],
+                'quantity_in_stock': product['quantity_in_stock'],
+                'reorder_point': product['reorder_point'],
+                #suppliers come from their own cache entries so a supplier edit doesn't go stale here
+                'suppliers': [dict(SupplierResource.body(supplier), id=supplier_id) for supplier_id, supplier in
+                              ((supplier_id, cached('supplier', supplier_id, SupplierResource.load))
+                               for supplier_id in product['supplier_ids']) if supplier],
+                })
         return jsonify({'message': 'Product not found😒'}), 404
+
+    @staticmethod
+    def load(product_id):
+        row = db.session.execute(PRODUCT.select(Product.version_id).where(Product.id == product_id)).first()
+        if row is None:
+            return None
+        supplier_ids = db.session.scalars(db.select(product_supplier.c.supplier_id)
+            .where(product_supplier.c.product_id == product_id)).all()
+        return dict(PRODUCT.row(row), version_id=row.version_id, supplier_ids=supplier_ids)
+
+    def list(self):
+        try:
+            after_id, limit = page_args()
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor or limit😒'}), 400
+
+        fields = Product.COLUMNS
+        if request.args.get('fields'):
+            requested = request.args['fields'].split(',')
+            unknown = set(requested) - set(Product.COLUMNS)
+            if unknown:
+                return jsonify({'message': f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+            fields = ('id',) + tuple(field for field in requested if field != 'id')
+
+        include = set(filter(None, request.args.get('include', '').split(',')))
+        if include - {'suppliers'}:
+            return jsonify({'message': 'Only include=suppliers is supported😒'}), 400
+
+        products = serializer(Product, fields)
+        rows = db.session.execute(products.select()
+            .where(Product.id > after_id)
+            .order_by(Product.id)
+            .limit(limit + 1)).all()
+
+        next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+        page = products.rows(rows[:limit])
+        if 'suppliers' in include and page:
+            #one extra SELECT ... WHERE product_id IN (page ids) for the whole page
+            suppliers = {entry['id']: [] for entry in page}
+            for *supplier, product_id in db.session.execute(SUPPLIER.select()
+                    .add_columns(product_supplier.c.product_id)
+                    .join(product_supplier, product_supplier.c.supplier_id == Supplier.id)
+                    .where(product_supplier.c.product_id.in_(suppliers))
+                    .order_by(Supplier.id)).all():
+                suppliers[product_id].append(SUPPLIER.row(supplier))
+            for entry in page:
+                entry['suppliers'] = suppliers[entry['id']]
+        return cache_control(jsonify({
+            'products': page,
+            'next_cursor': next_cursor,
+        }), 'products')
     
     def patch(self, product_id):
         product = Product.query.get(product_id)
         if product is None:
             return jsonify({'message': 'Product to be edited not found😒'}), 404
+        if not etag_matches(product.version_id):
+            return jsonify({'message': 'Product changed since it was read, fetch it again😒'}), 412
         
         data = request.get_json()
         if 'name' in data:
@@ -127,30 +312,228 @@ class ProductResource(Resource):
             product.price = data['price']
         if 'quantity_in_stock' in data:
             product.quantity_in_stock = data['quantity_in_stock']
+        if 'reorder_point' in data:
+            product.reorder_point = data['reorder_point']
         if 'supplier' in data:
             product.supplier = data['supplier']
 
+        #the UPDATE is guarded by the version that was read, a concurrent write makes it match no row
+        try:
+            db.session.flush()
+        except StaleDataError:
+            db.session.rollback()
+            return concurrent_write()
+        if 'reorder_point' in data or 'quantity_in_stock' in data:
+            #a new reorder point moves no stock, so the product is handed to the evaluator directly
+            enqueue(db.session, [('evaluate_alerts', {'product_ids': [product_id]}, None)])
+        version_id = product.version_id
         db.session.commit()
-        return jsonify({'message': 'Product updated successfully👍'}), 200
+        response = jsonify({'message': 'Product updated successfully👍'})
+        response.set_etag(str(version_id))
+        return response, 200
     
     def delete(self, product_id):
         product = Product.query.get(product_id)
         if product:
+            if not etag_matches(product.version_id):
+                return jsonify({'message': 'Product changed since it was read, fetch it again😒'}), 412
+            #sales, receipts and their reports keep pointing at the product, it can't go once it has sold
+            if has_sales(product_id):
+                return product_has_sales()
             db.session.delete(product)
-            db.session.commit()
+            try:
+                db.session.commit()
+            except StaleDataError:
+                db.session.rollback()
+                return concurrent_write()
+            except IntegrityError:
+                #a sale committed between the check and the delete
+                db.session.rollback()
+                return product_has_sales()
             return jsonify({'message': 'Product deleted successfully👍'}), 200
         
         return jsonify({'message': 'Product to be deleted not found😒'}), 404
+
+def etag_matches(version_id):
+    #If-Match is optional, clients that send it only write over the version they read
+    return not request.if_match or request.if_match.contains(str(version_id))
+
+def has_sales(product_id):
+    return any(db.session.scalar(db.select(db.exists().where(model.product_id == product_id)))
+               for model in (Sales, ArchivedSales))
+
+def product_has_sales():
+    return jsonify({'message': 'Product has sales and cannot be deleted, set its quantity to 0 instead😒'}), 409
+
+def concurrent_write():
+    status = 412 if request.if_match else 409
+    return jsonify({'message': 'Product was changed by another request, fetch it again and retry😒'}), status
+
+class ProductAdjustStockResource(Resource):
+    def post(self, product_id):
+        data = request.get_json(silent=True) or {}
+        delta = data.get('delta')
+        if isinstance(delta, bool) or not isinstance(delta, int) or delta == 0:
+            return jsonify({'message': 'delta must be a non-zero integer😒'}), 400
+
+        #one conditional UPDATE, relative to whatever the stock is now, so concurrent adjustments all land
+        products = Product.__table__
+        query = (products.update()
+            .where(products.c.id == product_id, products.c.quantity_in_stock + delta >= 0)
+            .values(quantity_in_stock=products.c.quantity_in_stock + delta, version_id=products.c.version_id + 1)
+            .returning(products.c.quantity_in_stock, products.c.version_id, products.c.reorder_point))
+        if request.if_match and not request.if_match.star_tag:
+            query = query.where(products.c.version_id.in_(
+                [int(tag) for tag in request.if_match.as_set() if tag.isdigit()]))
+        row = db.session.execute(query).first()
+        if row is None:
+            db.session.rollback()
+            current = db.session.execute(db.select(products.c.version_id).where(products.c.id == product_id)).scalar()
+            if current is None:
+                return jsonify({'message': 'Product not found😒'}), 404
+            if not etag_matches(current):
+                return jsonify({'message': 'Product changed since it was read, fetch it again😒'}), 412
+            return jsonify({'message': f'Not enough stock to remove {-delta}😒'}), 409
+
+        connection = db.session.connection()
+        StockTransaction.append(connection, {product_id: delta}, 'adjustment')
+        StockSummary.refresh_stock_values(connection, [product_id])
+        invalidate_after_commit(db.session, 'product', [product_id])
+        #only an adjustment across the reorder point can raise or resolve an alert
+        if row.reorder_point is not None and \
+                (row.quantity_in_stock <= row.reorder_point) != (row.quantity_in_stock - delta <= row.reorder_point):
+            enqueue(db.session, [('evaluate_alerts', {'product_ids': [product_id]}, None)])
+        db.session.commit()
+
+        response = jsonify({
+            'message': 'Stock adjusted successfully👍',
+            'product_id': product_id,
+            'quantity_in_stock': row.quantity_in_stock,
+        })
+        response.set_etag(str(row.version_id))
+        return response, 200
     
+class ProductStockResource(Resource):
+    method_decorators = {'get': [replica_reads]}
+
+    def get(self, product_id):
+        try:
+            as_of = (datetime.datetime.fromisoformat(request.args['as_of']) if 'as_of' in request.args
+                     else datetime.datetime.utcnow())
+        except ValueError:
+            return jsonify({'message': 'as_of must be an ISO 8601 date😒'}), 400
+        if db.session.get(Product, product_id) is None:
+            return jsonify({'message': 'Product not found😒'}), 404
+
+        #nearest snapshot at or before as_of plus the movements after it, never the whole history
+        with read_engine().connect() as connection:
+            quantity, snapshot_taken_at, replayed = StockSnapshot.stock_as_of(connection, product_id, as_of)
+        return jsonify({
+            'product_id': product_id,
+            'as_of': as_of,
+            'quantity_in_stock': quantity,
+            'snapshot_taken_at': snapshot_taken_at,
+            'replayed_transactions': replayed,
+        }), 200
+
+@bp.cli.command('snapshot-stock')
+@click.option('--backfill', is_flag=True, help='Rebuild daily snapshots from the whole ledger instead.')
+def snapshot_stock_command(backfill):
+    """Checkpoint the stock ledger at the start of today, run it daily to bound point in time replays."""
+    connection = db.session.connection()
+    if backfill:
+        count = StockSnapshot.backfill(connection)
+    else:
+        count = StockSnapshot.take(connection, SalesRollup.truncate(datetime.datetime.utcnow(), 'day'))
+    db.session.commit()
+    click.echo(f"Wrote {count} stock snapshots")
+
+@bp.cli.command('reconcile-stock-ledger')
+def reconcile_stock_ledger_command():
+    """Append a reconciliation movement wherever quantity_in_stock and the ledger balance disagree."""
+    count = StockTransaction.reconcile(db.session.connection())
+    db.session.commit()
+    click.echo(f"Reconciled {count} products")
+
+class StockLevelResource(Resource):
+    method_decorators = {'get': [replica_reads]}
+
+    def get(self):
+        return jsonify({
+            'stock_levels': row_dicts(Product.stock_levels()),
+        }), 200
+
+PRODUCT = serializer(Product)
+SUPPLIER = serializer(Supplier)
+
+class SupplierProductsResource(Resource):
+    method_decorators = {'get': [replica_reads]}
+
+    def get(self, supplier_id):
+        try:
+            after_id, limit = page_args()
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor or limit😒'}), 400
+        if db.session.get(Supplier, supplier_id) is None:
+            return jsonify({'message': 'Supplier not found😒'}), 404
+
+        #walks ix_product_supplier_supplier_id, no per-product lazy loads
+        rows = db.session.execute(PRODUCT.select()
+            .join(product_supplier, product_supplier.c.product_id == Product.id)
+            .where(product_supplier.c.supplier_id == supplier_id, Product.id > after_id)
+            .order_by(Product.id)
+            .limit(limit + 1)).all()
+
+        next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+        return jsonify({
+            'products': PRODUCT.rows(rows[:limit]),
+            'next_cursor': next_cursor,
+        }), 200
+
+class SupplierLookupResource(Resource):
+    def post(self):
+        """Which suppliers can restock these SKUs, answered from one join over product_supplier."""
+        skus = (request.get_json(silent=True) or {}).get('skus')
+        if not isinstance(skus, list) or not all(isinstance(sku, str) for sku in skus):
+            return jsonify({'message': 'skus must be a list of strings😒'}), 400
+        if len(skus) > current_app.config['SUPPLIER_LOOKUP_MAX_SKUS']:
+            return jsonify({'message': f"At most {current_app.config['SUPPLIER_LOOKUP_MAX_SKUS']} skus per lookup😒"}), 400
+
+        rows = db.session.execute(
+            SUPPLIER.select(Product.sku)
+            .join(product_supplier, product_supplier.c.supplier_id == Supplier.id)
+            .join(Product, Product.id == product_supplier.c.product_id)
+            .where(Product.sku.in_(set(skus)))
+            .order_by(Supplier.id, Product.sku)
+        ).all()
+
+        suppliers = {}
+        for *supplier, sku in rows:
+            entry = suppliers.setdefault(supplier[0], dict(SUPPLIER.row(supplier), skus=[]))
+            entry['skus'].append(sku)
+        covered = {sku for *_, sku in rows}
+        return jsonify({
+            #the suppliers covering the most skus first
+            'suppliers': sorted(suppliers.values(), key=lambda entry: -len(entry['skus'])),
+            'unsupplied_skus': sorted(set(skus) - covered),
+        }), 200
+
 class SupplierResource(Resource):
+    method_decorators = {'get': [replica_reads]}
+
     def get(self, supplier_id):
-        supplier = Supplier.query.get(supplier_id)
+        supplier = cached('supplier', supplier_id, self.load)
         if supplier:
-            return jsonify({
-                'name': supplier.name,
-                'contact': supplier.contact,
-                }), 200
+            return versioned('supplier', supplier['version_id'], lambda: self.body(supplier))
         return jsonify({'message': 'Supplier not found😒'}), 404
+
+    @staticmethod
+    def load(supplier_id):
+        return load_row(Supplier, ('name', 'contact', 'version_id'), supplier_id)
+
+    @staticmethod
+    def body(supplier):
+        return {'name': supplier['name'], 'contact': supplier['contact']}
     
     def post(self):
         data = request.get_json()
@@ -162,75 +545,465 @@ class SupplierResource(Resource):
     def delete(self, supplier_id):
         supplier = Supplier.query.get(supplier_id)
         if supplier:
+            #its products embed it, so their versions move on and their cached copies go
+            product_ids = [product.id for product in supplier.products]
+            if product_ids:
+                db.session.execute(db.update(Product)
+                    .where(Product.id.in_(product_ids))
+                    .values(version_id=Product.version_id + 1)
+                    .execution_options(synchronize_session=False))
+                invalidate_after_commit(db.session, 'product', product_ids)
             db.session.delete(supplier)
             db.session.commit()
             return jsonify({'message': 'Supplier deleted successfully👍'}), 200
         return jsonify({'message': 'Supplier to be deleted not found😒'}), 404
     
+def take_stock(quantities, when=None):
+    """Take {product_id: quantity sold} off quantity_in_stock and append the sale movements to the ledger.
+
+    Returns the first product without enough stock, after rolling the transaction back, or None.
+    """
+    #the quantity guard lives in the WHERE clause, so concurrent sales can't oversell
+    for product_id, quantity in quantities.items():
+        result = db.session.execute(db.update(Product)
+            .where(Product.id == product_id, Product.quantity_in_stock >= quantity)
+            .values(quantity_in_stock=Product.quantity_in_stock - quantity, version_id=Product.version_id + 1)
+            .execution_options(synchronize_session=False))
+        if result.rowcount == 0:
+            db.session.rollback()
+            return product_id
+
+    #bulk statements skip the flush listeners, the ledger and cache are brought along here
+    StockTransaction.append(db.session.connection(),
+                            {product_id: -quantity for product_id, quantity in quantities.items()}, 'sale', when)
+    invalidate_after_commit(db.session, 'product', quantities)
+    return None
+
 class SaleResource(Resource):
+    method_decorators = {'get': [replica_reads]}
+
     def get(self, sale_id):
-        sale = Sales.query.get(sale_id)
+        sale = cached('sale', sale_id, self.load)
         if sale:
-            return jsonify({
-                'product_id': sale.product_id,
-                'name': sale.name,
-                'quantity_sold': sale.quantity_sold,
-                'total_price': sale.total_price,
-                'date_of_sale': sale.date_of_sale,
-                'receipt_id': sale.receipt_id,
-                }), 200
+            return jsonify(sale), 200
         return jsonify({'message': 'Sale not found😒'}), 404
+
+    FIELDS = ('product_id', 'name', 'quantity_sold', 'total_price', 'date_of_sale', 'receipt_id')
+
+    @staticmethod
+    def load(sale_id):
+        #sales past the archive horizon keep their ids in archived_sales
+        return load_row(Sales, SaleResource.FIELDS, sale_id) or load_row(ArchivedSales, SaleResource.FIELDS, sale_id)
     
     def post(self):
         data = request.get_json()
+        try:
+            date_of_sale = (datetime.datetime.fromisoformat(data['date_of_sale']) if data.get('date_of_sale')
+                            else datetime.datetime.utcnow())
+        except (TypeError, ValueError):
+            return jsonify({'message': 'date_of_sale must be an ISO 8601 date😒'}), 400
+        quantity_sold = data.get('quantity_sold')
+        if isinstance(quantity_sold, bool) or not isinstance(quantity_sold, int) or quantity_sold <= 0:
+            return jsonify({'message': 'quantity_sold must be a positive integer😒'}), 400
+        if db.session.scalar(db.select(Product.id).where(Product.id == data.get('product_id'))) is None:
+            return jsonify({'message': 'Product not found😒'}), 404
+        #the units leave the shelf now, whatever date the sale is recorded under
+        if take_stock({data['product_id']: quantity_sold}) is not None:
+            return jsonify({'message': f'Not enough stock to sell {quantity_sold}😒'}), 409
+
         new_sale = Sales(product_id=data['product_id'],
         name=data['name'], 
-        quantity_sold=data['quantity_sold'],
+        quantity_sold=quantity_sold,
         total_price=data['total_price'],
-        date_of_sale=data['date_of_sale'],
-        receipt_id=data['receipt_id']
+        date_of_sale=date_of_sale,
+        receipt_id=data.get('receipt_id')
         )
+        if new_sale.receipt_id is None:
+            #written in the same flush as the sale, the receipt's sale_id is filled in by a post-update
+            new_sale.receipt = Receipt(sale=new_sale, total_amount=new_sale.total_price)
+        #the request only pays for the writes, summaries, rollups, the receipt text and alerts follow in jobs
+        new_sale.summaries_deferred = True
         db.session.add(new_sale)
+        db.session.flush()
+        enqueue(db.session, sale_jobs(f'sale:{new_sale.id}',
+            [(new_sale.product_id, new_sale.date_of_sale, new_sale.quantity_sold, new_sale.total_price)],
+            new_sale.receipt_id, refresh=[new_sale.product_id]))
         db.session.commit()
         return jsonify({'message': 'Sale created successfully👍'}), 201
     
 class ReceiptResource(Resource):
+    method_decorators = {'get': [replica_reads]}
+
     def get(self, receipt_id):
-        receipt = Receipt.query.get(receipt_id)
+        receipt = cached('receipt', receipt_id, self.load)
         if receipt:
-            return jsonify({
-                'sale_id': receipt.sale_id,
-                'total_amount': receipt.total_amount,
-                'date_of_receipt': receipt.date_of_receipt,
-            }), 200
-        return jsonify({'message': 'Receipt not found😒'})
-    
-    @event.listens_for(Sales, 'after_insert')
-    def create_receipt(mapper, connection, target):
-        new_receipt = Receipt(
-            sale_id = target.id,
-            total_amount = target.total_price,
-            date_of_receipt = datetime.now()
-        )
-        db.session.add(new_receipt)
+            return versioned('receipt', receipt['version_id'],
+                             lambda: {key: value for key, value in receipt.items() if key != 'version_id'})
+        return jsonify({'message': 'Receipt not found😒'}), 404
+
+    @staticmethod
+    def load(receipt_id):
+        return load_row(Receipt, ('sale_id', 'total_amount', 'date_of_receipt', 'rendered', 'version_id'), receipt_id)
+
+class CheckoutResource(Resource):
+    method_decorators = [token_required]
+
+    def post(self):
+        data = request.get_json() or {}
+        items = data.get('items')
+        if not items:
+            return jsonify({'message': 'items are required!'}), 400
+
+        quantities = {}
+        try:
+            for item in items:
+                product_id, quantity = int(item['product_id']), int(item['quantity'])
+                if quantity <= 0:
+                    raise ValueError
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'message': 'Each item needs a product_id and a positive quantity😒'}), 400
+
+        products = {row.id: row for row in db.session.execute(
+            db.select(Product.id, Product.name, Product.price).where(Product.id.in_(quantities)))}
+        missing = set(quantities) - set(products)
+        if missing:
+            return jsonify({'message': f"Products not found: {sorted(missing)}😒"}), 404
+
+        now = datetime.datetime.utcnow()
+        short = take_stock(quantities, now)
+        if short is not None:
+            return jsonify({'message': f'Not enough stock for product {short}😒'}), 409
+
+        lines = [{
+            'product_id': product_id,
+            'name': products[product_id].name,
+            'quantity_sold': quantity,
+            'total_price': products[product_id].price * quantity,
+            'date_of_sale': now,
+        } for product_id, quantity in quantities.items()]
+
+        receipt = Receipt(total_amount=sum(line['total_price'] for line in lines), date_of_receipt=now)
+        db.session.add(receipt)
+        db.session.flush()
+        sale_ids = db.session.scalars(db.insert(Sales).returning(Sales.id),
+                                      [dict(line, receipt_id=receipt.id) for line in lines]).all()
+        receipt.sale_id = sale_ids[0]
+
+        #the summaries, rollups, receipt text and alerts are queued in the same transaction
+        enqueue(db.session, sale_jobs(f'receipt:{receipt.id}',
+            [(line['product_id'], now, line['quantity_sold'], line['total_price']) for line in lines],
+            receipt.id, refresh=quantities))
         db.session.commit()
 
+        return jsonify({
+            'message': 'Checkout completed successfully👍',
+            'receipt': receipt.to_dict(),
+            'sale_ids': sale_ids,
+        }), 201
+
+class SalesAnalyticsResource(Resource):
+    method_decorators = {'get': [replica_reads]}
+
+    def get(self):
+        bucket = request.args.get('bucket', 'day')
+        if bucket not in SalesRollup.BUCKETS:
+            return jsonify({'message': 'bucket must be hour or day😒'}), 400
+        try:
+            #not type=int, that would quietly turn a mistyped id into the whole catalog
+            product_id = int(request.args['product_id']) if 'product_id' in request.args else None
+        except ValueError:
+            return jsonify({'message': 'product_id must be an integer😒'}), 400
+        try:
+            end = datetime.datetime.fromisoformat(request.args['to']) if 'to' in request.args else datetime.datetime.utcnow()
+            start = (datetime.datetime.fromisoformat(request.args['from']) if 'from' in request.args
+                     else end - datetime.timedelta(days=30))
+        except ValueError:
+            return jsonify({'message': 'from and to must be ISO 8601 dates😒'}), 400
+
+        #closed buckets come from the rollups, only the still-open bucket is summed from raw sales
+        current_bucket = SalesRollup.truncate(datetime.datetime.utcnow(), bucket)
+        query = (db.select(SalesRollup.bucket_start,
+                           db.func.sum(SalesRollup.quantity_sold),
+                           db.func.sum(SalesRollup.total_sales),
+                           db.func.sum(SalesRollup.sale_count))
+            .where(SalesRollup.bucket == bucket,
+                   SalesRollup.bucket_start >= SalesRollup.truncate(start, bucket),
+                   SalesRollup.bucket_start < min(end, current_bucket))
+            .group_by(SalesRollup.bucket_start)
+            .having(db.func.sum(SalesRollup.sale_count) > 0)
+            .order_by(SalesRollup.bucket_start))
+        if product_id is not None:
+            query = query.where(SalesRollup.product_id == product_id)
+        rows = db.session.execute(query).all()
+
+        if end > current_bucket:
+            partial = (db.select(db.func.sum(Sales.quantity_sold), db.func.sum(Sales.total_price), db.func.count())
+                .where(Sales.date_of_sale >= max(start, current_bucket), Sales.date_of_sale < end))
+            if product_id is not None:
+                partial = partial.where(Sales.product_id == product_id)
+            quantity_sold, total_sales, sale_count = db.session.execute(partial).one()
+            if sale_count:
+                rows.append((current_bucket, quantity_sold, total_sales, sale_count))
+
+        return jsonify({
+            'bucket': bucket,
+            'product_id': product_id,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'series': [{
+                'bucket_start': bucket_start.isoformat(),
+                'quantity_sold': quantity_sold,
+                'total_sales': total_sales,
+                'sale_count': sale_count,
+            } for bucket_start, quantity_sold, total_sales, sale_count in rows],
+        }), 200
+
+@bp.cli.command('backfill-sales-rollups')
+@click.option('--bucket', type=click.Choice(SalesRollup.BUCKETS), multiple=True,
+              help='Bucket size to rebuild, every size by default.')
+def backfill_sales_rollups_command(bucket):
+    """Rebuild the hourly and daily sales rollups from the full sales history."""
+    connection = db.session.connection()
+    for size in bucket or SalesRollup.BUCKETS:
+        SalesRollup.backfill(connection, size)
+    db.session.commit()
+    click.echo(f"Backfilled {SalesRollup.query.count()} rollup rows")
+
+@bp.cli.command('archive-history')
+@click.option('--days', type=int, default=None, help='Archive rows older than this many days, ARCHIVE_AFTER_DAYS by default.')
+def archive_history_command(days):
+    """Move old sales and stock movements to the archive tables, carrying their totals forward."""
+    from archive import archive_history
+    days = current_app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    before = SalesRollup.truncate(datetime.datetime.utcnow() - datetime.timedelta(days=days), 'day')
+    moved = archive_history(db.engine, before, current_app.config['ARCHIVE_BATCH_SIZE'])
+    click.echo(f"Archived {moved['sales']} sales and {moved['stock_transactions']} stock movements "
+               f"dated before {before:%Y-%m-%d}")
+
+class LowStockAlertResource(Resource):
+    method_decorators = {'get': [replica_reads]}
+
+    def get(self):
+        try:
+            after_id, limit = page_args()
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor or limit😒'}), 400
+        status = request.args.get('status', 'open')
+        if status not in ('open', 'all'):
+            return jsonify({'message': 'status must be open or all😒'}), 400
+
+        alerts = serializer(LowStockAlert)
+        query = (alerts.select(Product.name, Product.sku)
+            .join(Product, Product.id == LowStockAlert.product_id)
+            .where(LowStockAlert.id > after_id)
+            .order_by(LowStockAlert.id)
+            .limit(limit + 1))
+        if status == 'open':
+            query = query.where(LowStockAlert.resolved_at.is_(None))
+        rows = db.session.execute(query).all()
+
+        next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+        return jsonify({
+            'alerts': alerts.rows(rows[:limit], 'name', 'sku'),
+            'next_cursor': next_cursor,
+        }), 200
+
+@bp.cli.command('evaluate-alerts')
+def evaluate_alerts_command():
+    """Run one low stock evaluation over the sales and stock transactions added since the last one."""
+    report = current_app.extensions['alert_evaluator'].run_once()
+    if report is None:
+        click.echo('Another evaluator is running, nothing done')
+    else:
+        click.echo(f"Checked {report['products_checked']} products, raised {report['raised']} "
+                   f"and resolved {report['resolved']} alerts, {report['deferred']} held back by the debounce window")
+
+@bp.route('/jobs/stats')
+def job_stats():
+    return jsonify(JobQueue.stats()), 200
+
+@bp.cli.command('run-jobs')
+@click.option('--limit', type=int, default=None, help='Stop after this many jobs.')
+def run_jobs_command(limit):
+    """Run queued jobs on this process until none are runnable."""
+    count = current_app.extensions['job_queue'].run_pending(limit)
+    click.echo(f'Ran {count} jobs')
+
+@bp.cli.command('purge-jobs')
+@click.option('--days', type=int, default=7, help='Delete finished jobs older than this.')
+def purge_jobs_command(days):
+    """Delete done jobs finished more than --days ago, failed ones are kept for inspection."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    deleted = db.session.execute(Job.__table__.delete()
+        .where(Job.status == 'done', Job.finished_at < cutoff)).rowcount
+    db.session.commit()
+    click.echo(f'Deleted {deleted} jobs')
+
+@bp.route('/replicas/stats')
+def replica_stats():
+    router = get_router()
+    return jsonify(router.stats() if router else {'replicas': {}}), 200
+
+@bp.cli.command('sync-replicas')
+def sync_replicas_command():
+    """Copy the SQLite primary over every replica file, the local stand-in for streaming replication."""
+    router = get_router()
+    if router is None:
+        raise click.ClickException('No replicas configured, set DATABASE_REPLICA_URIS')
+    try:
+        router.sync()
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
+    click.echo(f"Synced {', '.join(router.replicas)}")
+
+@bp.cli.command('purge-search-changes')
+@click.option('--days', type=int, default=1, help='Delete search changes older than this.')
+def purge_search_changes_command(days):
+    """Delete search_changes rows every in-memory index has long since read."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    deleted = db.session.execute(SearchChange.__table__.delete().where(SearchChange.changed_at < cutoff)).rowcount
+    db.session.commit()
+    click.echo(f'Deleted {deleted} search changes')
+
+class SearchResource(Resource):
+    method_decorators = {'get': [replica_reads]}
+
+    def get(self):
+        q = request.args.get('q', '')
+        if not q.strip():
+            return jsonify({'message': 'q is required!'}), 400
+        try:
+            limit = int(request.args.get('limit', current_app.config['SEARCH_DEFAULT_LIMIT']))
+        except ValueError:
+            return jsonify({'message': 'Invalid limit😒'}), 400
+        limit = max(1, min(limit, current_app.config['SEARCH_MAX_LIMIT']))
+        kinds = tuple(filter(None, request.args.get('type', '').split(','))) or KINDS
+        if set(kinds) - set(KINDS):
+            return jsonify({'message': 'type must be product or supplier😒'}), 400
+
+        return jsonify({'results': search(q, limit, kinds)}), 200
+
+@bp.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Recreate and repopulate the SQLite FTS5 search index."""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('The FTS5 index only exists on SQLite, other databases search in memory')
+    rebuild_fts_index(db.session.connection())
+    db.session.commit()
+    click.echo('Search index rebuilt')
+
 class StockSummaryResource(Resource):
+    method_decorators = {'get': [replica_reads]}
+
     def get(self):
-        stock_summary = db.session.query(Stock).all()
+        #summaries are maintained incrementally on every write, so this never touches sales
+        summaries = serializer(StockSummary)
+        rows = db.session.execute(summaries.select().order_by(StockSummary.product_id)).all()
+        totals = db.session.query(
+            db.func.coalesce(db.func.sum(StockSummary.total_stock_value), 0.0),
+            db.func.coalesce(db.func.sum(StockSummary.total_sold_value), 0.0),
+            db.func.coalesce(db.func.sum(StockSummary.total_unsold_value), 0.0),
+        ).one()
         return jsonify({
-            'product_id': stock_summary.product_id,
-            'total_stock_value': stock_summary.total_stock_value,
-            'total_sold_value': stock_summary.total_sold_value,
-            'total_unsold_value': stock_summary.total_unsold_value,
+            'stock_summary': summaries.rows(rows),
+            'total_stock_value': totals[0],
+            'total_sold_value': totals[1],
+            'total_unsold_value': totals[2],
         }), 200
 
-        return jsonify({'message': 'Invalid search😒'})
-    
-api.add_resource(ProductResource, '/products' '/products/<int:product_id>')
+@bp.cli.command('rebuild-stock-summary')
+@click.option('--check', is_flag=True, help='Only report drift, exit non-zero if any row differs.')
+def rebuild_stock_summary_command(check):
+    """Recompute every stock summary from products and sales and compare with the incremental values."""
+    stored = {summary.product_id: summary for summary in StockSummary.query.all()}
+    drifted = 0
+    for product_id, stock, sold in db.session.execute(StockSummary.full_recomputation()):
+        summary = stored.pop(product_id, None)
+        expected = (stock, sold, stock - sold)
+        actual = (summary.total_stock_value, summary.total_sold_value, summary.total_unsold_value) if summary else None
+        if actual and all(abs(a - e) < 1e-6 for a, e in zip(actual, expected)):
+            continue
+
+        drifted += 1
+        click.echo(f"product {product_id}: stored {actual}, expected {expected}")
+        if not check:
+            summary = summary or StockSummary(product_id=product_id)
+            summary.total_stock_value, summary.total_sold_value, summary.total_unsold_value = expected
+            db.session.add(summary)
+
+    for summary in stored.values():
+        drifted += 1
+        click.echo(f"product {summary.product_id}: summary row without a product")
+        if not check:
+            db.session.delete(summary)
+
+    if check:
+        click.echo(f"{drifted} stock summaries differ from a full recomputation")
+        raise SystemExit(1 if drifted else 0)
+    db.session.commit()
+    click.echo(f"Rebuilt stock summaries, {drifted} rows corrected")
+
+api.add_resource(ProductResource, '/products', '/products/<int:product_id>')
+api.add_resource(StockLevelResource, '/products/stock-levels')
+api.add_resource(ProductStockResource, '/products/<int:product_id>/stock')
+api.add_resource(ProductAdjustStockResource, '/products/<int:product_id>/adjust-stock')
 api.add_resource(SupplierResource, '/suppliers', '/suppliers/<int:supplier_id>')
+api.add_resource(SupplierProductsResource, '/suppliers/<int:supplier_id>/products')
+api.add_resource(SupplierLookupResource, '/suppliers/restock-lookup')
 api.add_resource(SaleResource, '/sales', '/sales/<int:sale_id>')
 api.add_resource(ReceiptResource, '/receipts', '/receipts/<int:receipt_id>')
+api.add_resource(CheckoutResource, '/checkout')
+api.add_resource(StockSummaryResource, '/stock-summary')
+api.add_resource(SalesAnalyticsResource, '/analytics/sales')
+api.add_resource(LowStockAlertResource, '/alerts/low-stock')
+api.add_resource(SearchResource, '/search')
     
+def configure_sqlite(engine, busy_timeout):
+    #WAL lets readers run alongside the single writer, busy_timeout makes writers queue instead of failing
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+        cursor.close()
+
+def init_migrate(app):
+    #alembic takes longer to import than the rest of the app, only `flask db` needs it
+    from flask_migrate import Migrate
+    Migrate(app, db, include_object=include_object)
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_object(config or get_config())
+    app.config['SECRET_KEY'] = 'HS256' 
+
+    #initialize extentions
+    db.init_app(app)
+    #the flask CLI builds the app inside a click context, servers and workers skip the migration tooling
+    if click.get_current_context(silent=True) is not None:
+        init_migrate(app)
+    api.init_app(app)
+    #initialize CORS with specific origin
+    cors.init_app(app, resources={r"/*": {"origins": "*"}})
+    app.register_blueprint(bp)
+    init_cache(app)
+    init_auth(app)
+    init_profiling(app)
+    init_alerts(app)
+    init_search(app)
+    init_jobs(app)
+    init_responses(app)
+    init_serializers(app)
+    init_replicas(app)
+
+    if app.config['SQLITE_WAL']:
+        with app.app_context():
+            for engine in db.engines.values():
+                if engine.dialect.name == 'sqlite':
+                    configure_sqlite(engine, app.config['SQLITE_BUSY_TIMEOUT_MS'])
+
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5555)
+    create_app().run(debug=True, port=5555)
@@ -0,0 +1,77 @@
+from collections import defaultdict
+from models import (db, dialect_insert, archive_horizon, ARCHIVES, ArchiveHorizon, ArchivedTotals, Sales, StockSnapshot,
+                    StockTransaction)
+
+#hot table -> (date column, archived_totals column <- expression summed per product)
+SOURCES = {
+    Sales.__table__: ('date_of_sale', lambda table: {
+        'quantity_sold': db.func.sum(table.c.quantity_sold),
+        'total_sold': db.func.sum(table.c.total_price),
+        'sale_count': db.func.count(),
+    }),
+    StockTransaction.__table__: ('date_of_transaction', lambda table: {
+        'stock_moved': db.func.sum(table.c.quantity),
+    }),
+}
+
+def carry_forward(connection, totals):
+    """Add {product_id: {archived_totals column: amount}} to the per product archived totals."""
+    table = ArchivedTotals.__table__
+    columns = sorted({column for amounts in totals.values() for column in amounts})
+    insert = dialect_insert(connection)(table)
+    connection.execute(
+        insert.on_conflict_do_update(
+            index_elements=['product_id'],
+            set_={column: table.c[column] + insert.excluded[column] for column in columns}),
+        [dict({column: 0 for column in ('quantity_sold', 'total_sold', 'sale_count', 'stock_moved')},
+              product_id=product_id, **amounts) for product_id, amounts in totals.items()],
+    )
+
+def move_horizon(connection, table, before):
+    #recorded before any row moves, readers union the archive from then on
+    horizon = archive_horizon(connection, table)
+    if horizon is None or horizon < before:
+        insert = dialect_insert(connection)(ArchiveHorizon.__table__)
+        connection.execute(insert.values(source=table.name, archived_before=before)
+            .on_conflict_do_update(index_elements=['source'], set_={'archived_before': before}))
+
+def archive_batch(connection, table, before, batch_size):
+    """Move up to batch_size of table's rows dated before `before` to its archive, returns how many moved."""
+    date_column, sums = SOURCES[table]
+    ids = db.select(table.c.id).where(table.c[date_column] < before).order_by(table.c.id).limit(batch_size).subquery()
+    last_id = connection.scalar(db.select(db.func.max(ids.c.id)))
+    if last_id is None:
+        return 0
+    batch = db.and_(table.c[date_column] < before, table.c.id <= last_id)
+
+    totals = defaultdict(dict)
+    aggregates = sums(table)
+    for product_id, *amounts in connection.execute(db.select(table.c.product_id, *aggregates.values())
+            .where(batch).group_by(table.c.product_id)):
+        totals[product_id].update(zip(aggregates, amounts))
+    archive = ARCHIVES[table]
+    connection.execute(archive.insert().from_select([column.name for column in table.c], db.select(*table.c).where(batch)))
+    carry_forward(connection, totals)
+    #core deletes, the session's flush listeners would back the archived sales out of stock_summary and the rollups
+    return connection.execute(table.delete().where(batch)).rowcount
+
+def archive_history(engine, before, batch_size=5000):
+    """Move sales and stock movements dated before `before` out of the hot tables, one transaction per batch.
+
+    Returns {table name: rows moved}. Running it again resumes where an interrupted run stopped.
+    """
+    with engine.begin() as connection:
+        #every product's balance at the horizon, so snapshot reads after it never replay archived movements
+        StockSnapshot.take(connection, before)
+        for table in SOURCES:
+            move_horizon(connection, table, before)
+    moved = {}
+    for table in SOURCES:
+        moved[table.name] = 0
+        while True:
+            with engine.begin() as connection:
+                count = archive_batch(connection, table, before, batch_size)
+            if not count:
+                break
+            moved[table.name] += count
+    return moved
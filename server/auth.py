@@ -0,0 +1,130 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import wraps
+import bcrypt as bcrypt_lib
+import jwt
+from flask import current_app, g, jsonify, request
+from models import db, User
+
+class HashPoolSaturated(Exception):
+    """Raised when more password hashes are queued than AUTH_POOL_MAX_PENDING allows."""
+
+class HashTimeout(Exception):
+    """Raised when a password hash takes longer than AUTH_HASH_TIMEOUT."""
+
+def _hash_password(password, rounds):
+    return bcrypt_lib.hashpw(password.encode('utf-8'), bcrypt_lib.gensalt(rounds)).decode('utf-8')
+
+def _check_password(password_hash, password):
+    return bcrypt_lib.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+class HashPool:
+    """Runs bcrypt on a few dedicated threads so a burst of sign-ins can't take every request thread."""
+
+    def __init__(self, workers, max_pending, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        #threads, not processes, bcrypt releases the GIL while it hashes and nothing has to be forked
+        #out of a threaded web worker; created on first use so each web worker starts its own
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='hash-pool')
+            return self._executor
+
+    def run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashPoolSaturated()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        #the slot is held until the hash finishes, a request that gave up waiting still leaves it queued
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HashTimeout()
+
+    def hash_password(self, password, rounds):
+        return self.run(_hash_password, password, rounds)
+
+    def check_password(self, password_hash, password):
+        return self.run(_check_password, password_hash, password)
+
+class TokenCache:
+    """LRU of already verified tokens, each entry lives until the token's own exp."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._data.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[token]
+                return None
+            self._data.move_to_end(token)
+            return user
+
+    def set(self, token, user, expires_at):
+        with self._lock:
+            self._data[token] = (user, expires_at)
+            self._data.move_to_end(token)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+def init_auth(app):
+    workers = app.config['AUTH_POOL_WORKERS']
+    app.extensions['hash_pool'] = HashPool(workers=workers,
+                                           max_pending=app.config['AUTH_POOL_MAX_PENDING'] or max(workers, 1) * 4,
+                                           timeout=app.config['AUTH_HASH_TIMEOUT'])
+    app.extensions['token_cache'] = TokenCache(maxsize=app.config['AUTH_TOKEN_CACHE_SIZE'])
+
+def hash_pool():
+    return current_app.extensions['hash_pool']
+
+def token_required(f):
+    """Reject the request with 401 unless it carries a valid HS256 bearer token, sets g.current_user."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        header = request.headers.get('Authorization', '')
+        token = header[len('Bearer '):] if header.startswith('Bearer ') else None
+        if not token:
+            return jsonify({'message': 'Token is missing😒'}), 401
+
+        cache = current_app.extensions['token_cache']
+        user = cache.get(token)
+        if user is None:
+            try:
+                payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'],
+                                     options={'require': ['exp']})
+            except jwt.ExpiredSignatureError:
+                return jsonify({'message': 'Token has expired😒'}), 401
+            except jwt.InvalidTokenError:
+                return jsonify({'message': 'Token is invalid😒'}), 401
+
+            found = db.session.get(User, payload.get('user_id'))
+            if found is None:
+                return jsonify({'message': 'Token is invalid😒'}), 401
+            user = {'id': found.id, 'name': found.name}
+            cache.set(token, user, payload['exp'])
+
+        g.current_user = user
+        return f(*args, **kwargs)
+    return decorated
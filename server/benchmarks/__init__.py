@@ -0,0 +1,4 @@
+"""Seeding, load generation and regression comparison for the inventory API.
+
+Run from the server directory, e.g. `python -m benchmarks.seed --help`.
+"""
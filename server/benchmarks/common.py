@@ -0,0 +1,7 @@
+from config import Config
+
+def bench_config(database_uri, **overrides):
+    """A config class pointing the app at the benchmark database."""
+    settings = {'SQLALCHEMY_DATABASE_URI': database_uri}
+    settings.update(overrides)
+    return type('BenchmarkConfig', (Config,), settings)
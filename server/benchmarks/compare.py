@@ -0,0 +1,57 @@
+"""Compare a loadtest or startup result against a stored baseline and exit non-zero on a regression.
+
+    python -m benchmarks.compare baseline.json results.json --tolerance 0.2
+    python -m benchmarks.compare startup-baseline.json startup.json --tolerance 0.2
+"""
+import argparse
+import json
+import sys
+
+def compare(baseline, current, tolerance):
+    """Return human readable regressions of `current` against `baseline`."""
+    regressions = []
+    for name, base in baseline.get('routes', {}).items():
+        result = current['routes'].get(name)
+        if result is None:
+            regressions.append(f'{name}: missing from the current run')
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if base[metric] and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {base[metric]} -> {result[metric]}')
+        if result['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput_rps {base['throughput_rps']} -> {result['throughput_rps']}")
+        #query counts are deterministic, any increase is a regression (e.g. a new N+1)
+        if base['queries_per_request'] is not None and result['queries_per_request'] is not None \
+                and result['queries_per_request'] > base['queries_per_request'] + 0.5:
+            regressions.append(f"{name}: queries_per_request {base['queries_per_request']} -> "
+                               f"{result['queries_per_request']}")
+        if result['errors'] > base['errors']:
+            regressions.append(f"{name}: errors {base['errors']} -> {result['errors']}")
+    #cold start from benchmarks.startup, the shorter phases are too noisy to gate on by themselves
+    for metric in ('import_ms', 'time_to_first_request_ms'):
+        base = baseline.get('startup', {}).get(metric)
+        result = current.get('startup', {}).get(metric)
+        if base and result is not None and result > base * (1 + tolerance):
+            regressions.append(f'startup: {metric} {base} -> {result}')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown, 0.2 = 20%%.')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    regressions = compare(baseline, current, args.tolerance)
+    for regression in regressions:
+        print(regression)
+    print(f'{len(regressions)} regressions against {args.baseline}')
+    sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
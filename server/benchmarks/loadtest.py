@@ -0,0 +1,264 @@
+"""Drive every API route with concurrent clients and record throughput, latency and SQL per request.
+
+The operational endpoints (/cache/stats, /jobs/stats, /replicas/stats and /metrics) are left out. supplier_delete
+and product_delete remove what supplier_create and product_create added earlier in the same run, so they only find
+rows when run after them, in the default order.
+
+    python -m benchmarks.loadtest --database sqlite:////tmp/bench.db --clients 8 --requests 500 --output results.json
+    python -m benchmarks.loadtest --database sqlite:////tmp/bench.db --url http://localhost:5555 --output results.json
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, text
+from app import create_app, encode_cursor
+from models import db
+from benchmarks.common import bench_config
+from benchmarks.seed import BENCH_PASSWORD
+
+def signup(suffix):
+    return ('POST', '/auth/signup', {'name': f'bench{suffix}', 'email': f'bench{suffix}@gmail.com',
+                                     'phone_number': suffix.replace('-', ''), 'password_hash': BENCH_PASSWORD}, False)
+
+def product_create(suffix):
+    return ('POST', '/products', {'name': f'Bench product {suffix}', 'sku': f'BENCH-{suffix}',
+                                  'description': 'Created by the load test', 'price': 9.99, 'quantity_in_stock': 10,
+                                  'supplier': []}, False)
+
+def products_bulk(number):
+    #one JSON line, an upsert of a seeded product by its sku
+    return ('POST', '/products/bulk', {'name': f'Product {number}', 'sku': f'SKU-{number:08d}',
+                                       'description': f'Synthetic product number {number}', 'price': 9.99,
+                                       'quantity_in_stock': 100}, True)
+
+def supplier_create(suffix):
+    return ('POST', '/suppliers', {'name': f'Bench supplier {suffix}', 'contact': f'bench{suffix}@example.com'}, False)
+
+#name -> request builder, each returns (method, path, json body or None, needs auth)
+ROUTES = {
+    'index': lambda ctx: ('GET', '/', None, False),
+    'signup': lambda ctx: signup(ctx.unique()),
+    'login': lambda ctx: ('POST', '/auth/login', {
+        'email': f"user{ctx.rng.randrange(ctx.sizes['user'])}@gmail.com", 'password_hash': BENCH_PASSWORD}, False),
+    'products_page': lambda ctx: ('GET', f"/products?limit=50&cursor={encode_cursor(ctx.rng.randrange(ctx.sizes['products']))}",
+                                  None, False),
+    'products_with_suppliers': lambda ctx: ('GET', f"/products?limit=50&include=suppliers&cursor={encode_cursor(ctx.rng.randrange(ctx.sizes['products']))}",
+                                            None, False),
+    'supplier_products': lambda ctx: ('GET', f"/suppliers/{ctx.pick('suppliers')}/products?limit=50", None, False),
+    'search': lambda ctx: ('GET', f"/search?q=SKU-{ctx.rng.randrange(ctx.sizes['products']):08d}"[:-3], None, False),
+    'search_name': lambda ctx: ('GET', f"/search?q=product+{ctx.rng.randrange(ctx.sizes['products'])}"[:-1], None, False),
+    'product': lambda ctx: ('GET', f"/products/{ctx.pick('products')}", None, False),
+    'product_patch': lambda ctx: ('PATCH', f"/products/{ctx.pick('products')}",
+                                  {'description': f'Updated at {time.time()}'}, False),
+    'adjust_stock': lambda ctx: ('POST', f"/products/{ctx.pick('products')}/adjust-stock",
+                                 {'delta': ctx.rng.choice((-1, 1))}, False),
+    'stock_levels': lambda ctx: ('GET', '/products/stock-levels', None, False),
+    'stock_as_of': lambda ctx: ('GET', f"/products/{ctx.pick('products')}/stock?as_of="
+                                       f"{(datetime.utcnow() - timedelta(days=ctx.rng.randrange(365))).isoformat()}", None, False),
+    'product_create': lambda ctx: product_create(ctx.unique()),
+    'product_delete': lambda ctx: ('DELETE', f"/products/{ctx.created('products', 'product_create')}", None, False),
+    'products_bulk': lambda ctx: products_bulk(ctx.pick('products') - 1),
+    'supplier': lambda ctx: ('GET', f"/suppliers/{ctx.pick('suppliers')}", None, False),
+    'supplier_create': lambda ctx: supplier_create(ctx.unique()),
+    'supplier_delete': lambda ctx: ('DELETE', f"/suppliers/{ctx.created('suppliers', 'supplier_create')}", None, False),
+    'restock_lookup': lambda ctx: ('POST', '/suppliers/restock-lookup', {
+        'skus': [f"SKU-{ctx.rng.randrange(ctx.sizes['products']):08d}" for _ in range(20)]}, False),
+    'sale': lambda ctx: ('GET', f"/sales/{ctx.pick('sales')}", None, False),
+    'sale_create': lambda ctx: ('POST', '/sales', {'product_id': ctx.pick('products'), 'name': 'Bench sale',
+                                                   'quantity_sold': 1, 'total_price': 9.99}, False),
+    'receipt': lambda ctx: ('GET', f"/receipts/{ctx.pick('receipts')}", None, False),
+    'stock_summary': lambda ctx: ('GET', '/stock-summary', None, False),
+    'analytics_sales': lambda ctx: ('GET', f"/analytics/sales?bucket=day&product_id={ctx.pick('products')}", None, False),
+    'checkout': lambda ctx: ('POST', '/checkout', {'items': [
+        {'product_id': ctx.pick('products'), 'quantity': 1} for _ in range(3)]}, True),
+    'alerts': lambda ctx: ('GET', '/alerts/low-stock?status=all&limit=50', None, False),
+    'export_sales': lambda ctx: ('GET', f"/export/sales?format=ndjson&from={(datetime.utcnow() - timedelta(days=1)).isoformat()}",
+                                 None, False),
+    'export_stock_transactions': lambda ctx: ('GET', f"/export/stock-transactions?from="
+                                                     f"{(datetime.utcnow() - timedelta(days=1)).isoformat()}", None, False),
+}
+
+class Context:
+    def __init__(self, sizes, seed):
+        self.sizes = sizes
+        self._local = threading.local()
+        self._seed = seed
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._run = time.time_ns()
+        self.token = None
+
+    @property
+    def rng(self):
+        if not hasattr(self._local, 'rng'):
+            self._local.rng = random.Random(f'{self._seed}-{threading.get_ident()}')
+        return self._local.rng
+
+    def pick(self, table):
+        return self.rng.randint(1, max(self.sizes[table], 1))
+
+    def unique(self):
+        #a suffix no other request or earlier run has used, for names and emails that must not collide
+        with self._lock:
+            self._counts['unique'] = self._counts.get('unique', 0) + 1
+            return f"{self._run}-{self._counts['unique']}"
+
+    def created(self, table, route):
+        #rows the create route added this run got ids after the seeded ones, each is handed out once
+        with self._lock:
+            self._counts[route] = self._counts.get(route, 0) + 1
+            return self.sizes[table] + self._counts[route]
+
+class InProcessDriver:
+    """Calls the Flask app through its test client and counts SQL statements per request."""
+
+    def __init__(self, database_uri, auth_workers):
+        self.app = create_app(bench_config(database_uri, AUTH_POOL_WORKERS=auth_workers))
+        self._local = threading.local()
+        with self.app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self._local.queries = getattr(self._local, 'queries', 0) + 1
+
+    def request(self, method, path, body, headers):
+        self._local.queries = 0
+        with self.app.test_client() as client:
+            response = client.open(path, method=method, json=body, headers=headers)
+            #exports stream, the body is read so their time and statements are counted
+            response.get_data()
+            return response.status_code, response.get_json(silent=True), self._local.queries
+
+class HttpDriver:
+    """Calls a running server, SQL counts are read from Server-Timing when PROFILING_ENABLED is on."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body, headers):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers=dict(headers, **({'Content-Type': 'application/json'} if data else {})))
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, raw, timing = response.status, response.read(), response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as e:
+            status, raw, timing = e.code, e.read(), e.headers.get('Server-Timing', '')
+        match = re.search(r'(\d+) statements', timing)
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            payload = None
+        return status, payload, int(match.group(1)) if match else None
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))] if ordered else None
+
+def run_route(driver, ctx, name, requests, clients):
+    build = ROUTES[name]
+    latencies, queries, errors = [], [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        method, path, body, needs_auth = build(ctx)
+        headers = {'Authorization': f'Bearer {ctx.token}'} if needs_auth else {}
+        started = time.perf_counter()
+        try:
+            status, _, statement_count = driver.request(method, path, body, headers)
+        except Exception:
+            status, statement_count = None, None
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if statement_count is not None:
+                queries.append(statement_count)
+            #409 is an expected outcome of checkout on a sold out product
+            if status is None or status >= 500 or status in (401, 429):
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    to_ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(requests / wall, 2),
+        'mean_ms': to_ms(sum(latencies) / len(latencies)),
+        'p50_ms': to_ms(percentile(latencies, 0.50)),
+        'p95_ms': to_ms(percentile(latencies, 0.95)),
+        'p99_ms': to_ms(percentile(latencies, 0.99)),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+def dataset_sizes(database_uri):
+    engine = create_engine(database_uri)
+    with engine.connect() as connection:
+        sizes = {table: connection.execute(text(f'SELECT count(*) FROM "{table}"')).scalar()
+                 for table in ('user', 'products', 'suppliers', 'sales', 'receipts', 'stock_transactions')}
+    engine.dispose()
+    return sizes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', required=True, help='URI of the seeded database (sizes are read from it).')
+    parser.add_argument('--url', help='Base URL of a running server, the app is driven in-process when omitted.')
+    parser.add_argument('--routes', default=','.join(ROUTES), help='Comma separated subset of: ' + ', '.join(ROUTES))
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients per route.')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per route.')
+    parser.add_argument('--auth-workers', type=int, default=2, help='Hashing processes for the in-process app.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    routes = [name.strip() for name in args.routes.split(',') if name.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    sizes = dataset_sizes(args.database)
+    ctx = Context(sizes, args.seed)
+    driver = HttpDriver(args.url) if args.url else InProcessDriver(args.database, args.auth_workers)
+
+    status, payload, _ = driver.request('POST', '/auth/login',
+                                        {'email': 'user0@gmail.com', 'password_hash': BENCH_PASSWORD}, {})
+    if status == 200:
+        ctx.token = payload['access_token']
+
+    results = {
+        'meta': {
+            'mode': 'http' if args.url else 'in-process',
+            'clients': args.clients,
+            'requests_per_route': args.requests,
+            'dataset': sizes,
+            'python': platform.python_version(),
+            'timestamp': datetime.utcnow().isoformat(),
+        },
+        'routes': {},
+    }
+    for name in routes:
+        results['routes'][name] = run_route(driver, ctx, name, args.requests, args.clients)
+        r = results['routes'][name]
+        print(f"{name:<16} {r['throughput_rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.2f}ms  p95 {r['p95_ms']:>8.2f}ms  "
+              f"p99 {r['p99_ms']:>8.2f}ms  queries {r['queries_per_request']}  errors {r['errors']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
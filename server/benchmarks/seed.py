@@ -0,0 +1,126 @@
+"""Fill a database with a synthetic catalog and sales history of a chosen size.
+
+    python -m benchmarks.seed --database sqlite:////tmp/bench.db --products 10000 --sales 1000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+import bcrypt
+from app import create_app
+from models import (db, User, Product, Supplier, Sales, Receipt, StockTransaction, StockSummary, SalesRollup,
+                    StockSnapshot, product_supplier)
+from search import rebuild_fts_index
+from benchmarks.common import bench_config
+
+BENCH_PASSWORD = 'bench1234'
+CHUNK = 10000
+
+def insert_chunked(table, rows):
+    #executemany in fixed-size chunks keeps memory flat for millions of rows
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            db.session.execute(table.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+    db.session.commit()
+
+def seed(args):
+    rng = random.Random(args.seed)
+    start = datetime.utcnow() - timedelta(days=args.days)
+    seconds = args.days * 86400
+
+    db.drop_all()
+    db.create_all()
+
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode(), bcrypt.gensalt()).decode()
+    insert_chunked(User.__table__, ({
+        'name': f'user{i}', 'email': f'user{i}@gmail.com', 'phone_number': f'{i:010d}', 'password_hash': password_hash,
+    } for i in range(args.users)))
+
+    prices = [round(rng.uniform(1, 500), 2) for _ in range(args.products)]
+    insert_chunked(Product.__table__, ({
+        'id': i + 1, 'name': f'Product {i}', 'sku': f'SKU-{i:08d}', 'description': f'Synthetic product number {i}',
+        'price': prices[i], 'quantity_in_stock': rng.randint(0, 5000),
+    } for i in range(args.products)))
+
+    insert_chunked(Supplier.__table__, ({
+        'id': i + 1, 'name': f'Supplier {i}', 'contact': f'supplier{i}@example.com',
+    } for i in range(args.suppliers)))
+
+    if args.suppliers:
+        insert_chunked(product_supplier, ({'product_id': product_id, 'supplier_id': supplier_id}
+            for product_id in range(1, args.products + 1)
+            for supplier_id in rng.sample(range(1, args.suppliers + 1), min(args.suppliers_per_product, args.suppliers))))
+
+    #one receipt per `lines_per_receipt` sales, sale ids are assigned in order so receipt.sale_id is computable
+    receipts = (args.sales + args.lines_per_receipt - 1) // args.lines_per_receipt
+    insert_chunked(Receipt.__table__, ({
+        'id': r + 1, 'sale_id': r * args.lines_per_receipt + 1, 'total_amount': 0.0,
+        'date_of_receipt': start + timedelta(seconds=seconds * r / max(receipts, 1)),
+    } for r in range(receipts)))
+
+    def sales():
+        for i in range(args.sales):
+            product_id = rng.randint(1, args.products)
+            quantity = rng.randint(1, 5)
+            yield {
+                'id': i + 1, 'product_id': product_id, 'name': f'Product {product_id - 1}', 'quantity_sold': quantity,
+                'total_price': prices[product_id - 1] * quantity,
+                'date_of_sale': start + timedelta(seconds=seconds * i / max(args.sales, 1)),
+                'receipt_id': i // args.lines_per_receipt + 1,
+            }
+    insert_chunked(Sales.__table__, sales())
+
+    receipt_totals = (db.select(db.func.sum(Sales.total_price))
+        .where(Sales.receipt_id == Receipt.id)
+        .scalar_subquery())
+    db.session.execute(db.update(Receipt).values(total_amount=receipt_totals))
+
+    insert_chunked(StockTransaction.__table__, ({
+        'product_id': rng.randint(1, args.products), 'quantity': rng.randint(1, 200),
+        'date_of_transaction': start + timedelta(seconds=rng.randrange(seconds)),
+        'transaction_type': rng.choice(('restock', 'adjustment', 'return')),
+    } for _ in range(args.stock_transactions)))
+
+    #derived tables are rebuilt with their own set-based code paths
+    connection = db.session.connection()
+    full = StockSummary.full_recomputation().subquery()
+    connection.execute(db.insert(StockSummary).from_select(
+        ['product_id', 'total_stock_value', 'total_sold_value', 'total_unsold_value'],
+        db.select(full.c.id, full.c.stock, full.c.sold, full.c.stock - full.c.sold)))
+    for bucket in SalesRollup.BUCKETS:
+        SalesRollup.backfill(connection, bucket)
+    #the random movements don't add up to the random stock levels, close the gap before snapshotting
+    StockTransaction.reconcile(connection)
+    StockSnapshot.backfill(connection)
+    if connection.dialect.name == 'sqlite':
+        rebuild_fts_index(connection)
+    db.session.commit()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', required=True, help='SQLAlchemy URI of the database to (re)create.')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--suppliers', type=int, default=500)
+    parser.add_argument('--suppliers-per-product', type=int, default=3)
+    parser.add_argument('--sales', type=int, default=1000000)
+    parser.add_argument('--lines-per-receipt', type=int, default=3)
+    parser.add_argument('--stock-transactions', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=365, help='Spread the history over this many days.')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible datasets.')
+    args = parser.parse_args(argv)
+
+    app = create_app(bench_config(args.database, CACHE_BACKEND='none'))
+    started = time.perf_counter()
+    with app.app_context():
+        seed(args)
+    print(f"Seeded {args.products} products, {args.suppliers} suppliers, {args.sales} sales and "
+          f"{args.stock_transactions} stock transactions in {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
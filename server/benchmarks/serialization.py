@@ -0,0 +1,93 @@
+"""Time a large list response through the ORM + to_dict + jsonify path and through the row serializers.
+
+    python -m benchmarks.serialization --database sqlite:////tmp/bench.db --rows 10000 --repeat 5 --output serialization.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+from flask.json.provider import DefaultJSONProvider
+from app import create_app
+from models import db, Product, Sales, StockTransaction
+from serializers import JSONProvider, OrjsonProvider, serializer
+from benchmarks.common import bench_config
+
+MODELS = {'products': Product, 'sales': Sales, 'stock-transactions': StockTransaction}
+
+def orm_page(model, rows):
+    #what the list endpoints did before: hydrate every row, then one to_dict per object
+    return [obj.to_dict() for obj in db.session.scalars(db.select(model).order_by(model.id).limit(rows))]
+
+def row_page(model, rows):
+    columns = serializer(model)
+    return columns.rows(db.session.execute(columns.select().order_by(model.id).limit(rows)).all())
+
+#path name -> (page builder, JSON provider)
+PATHS = {
+    'orm+json': (orm_page, DefaultJSONProvider),
+    'rows+json': (row_page, JSONProvider),
+    'rows+orjson': (row_page, OrjsonProvider),
+}
+
+def time_path(app, model, rows, build, provider_class, repeat):
+    provider = provider_class(app)
+    build_times, encode_times = [], []
+    for _ in range(repeat):
+        #a fresh session each time so the ORM path can't reuse objects from the last round
+        db.session.close()
+        started = time.perf_counter()
+        page = build(model, rows)
+        built = time.perf_counter()
+        body = provider.response({'items': page, 'next_cursor': None}).get_data()
+        encode_times.append(time.perf_counter() - built)
+        build_times.append(built - started)
+    to_ms = lambda seconds: round(seconds * 1000, 2)
+    build_ms, encode_ms = statistics.median(build_times), statistics.median(encode_times)
+    return {
+        'rows': len(page),
+        'bytes': len(body),
+        'build_ms': to_ms(build_ms),
+        'encode_ms': to_ms(encode_ms),
+        'total_ms': to_ms(build_ms + encode_ms),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', required=True, help='URI of a seeded database.')
+    parser.add_argument('--models', default=','.join(MODELS), help='Comma separated subset of: ' + ', '.join(MODELS))
+    parser.add_argument('--rows', type=int, default=10000, help='Rows per response.')
+    parser.add_argument('--repeat', type=int, default=5, help='Rounds per path, the median is reported.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    paths = dict(PATHS)
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        print('orjson is not installed, skipping rows+orjson')
+        del paths['rows+orjson']
+
+    app = create_app(bench_config(args.database, JOBS_WORKERS=0, ALERTS_INTERVAL_SECONDS=0))
+    results = {
+        'meta': {'rows': args.rows, 'repeat': args.repeat, 'python': platform.python_version(),
+                 'timestamp': datetime.utcnow().isoformat()},
+        'models': {},
+    }
+    with app.app_context():
+        for name in filter(None, (name.strip() for name in args.models.split(','))):
+            results['models'][name] = {}
+            for path, (build, provider_class) in paths.items():
+                r = results['models'][name][path] = time_path(app, MODELS[name], args.rows, build, provider_class, args.repeat)
+                baseline = results['models'][name]['orm+json']['total_ms']
+                print(f"{name:<20} {path:<12} {r['rows']:>7} rows  build {r['build_ms']:>8.2f}ms  "
+                      f"encode {r['encode_ms']:>8.2f}ms  total {r['total_ms']:>8.2f}ms  "
+                      f"x{baseline / r['total_ms']:.2f}  {r['bytes']} bytes")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Measure cold start: interpreter to first served request, in fresh processes, with the import profile.
+
+    python -m benchmarks.startup --database sqlite:////tmp/bench.db --repeat 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+#runs in the fresh process, each phase is timed from the first line of the script
+PROBE = """
+import time
+started = time.perf_counter()
+import json, sys
+from app import create_app
+imported = time.perf_counter()
+from benchmarks.common import bench_config
+app = create_app(bench_config(sys.argv[1], JOBS_WORKERS=0, ALERTS_INTERVAL_SECONDS=0))
+created = time.perf_counter()
+response = app.test_client().get('/products?limit=1')
+served = time.perf_counter()
+print(json.dumps({'status': response.status_code, 'served_at': time.time(), 'import_ms': (imported - started) * 1000,
+                  'create_app_ms': (created - imported) * 1000, 'first_request_ms': (served - created) * 1000}))
+"""
+
+PHASES = ('interpreter_ms', 'import_ms', 'create_app_ms', 'first_request_ms', 'time_to_first_request_ms')
+
+def parse_importtime(stderr):
+    """{module: (self us, cumulative us)} for the modules that app and the probe's other imports pull in directly."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        #nesting is shown by two spaces per level after the separator, the top level alone would just say 'app'
+        if len(name) - len(name.lstrip()) == 3:
+            modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+def cold_start(database):
+    server = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    #wall clock, the only clock shared with the child; -X importtime adds a little to every import
+    spawned = time.time()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE, database], cwd=server,
+                            capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    if timings.pop('status') != 200:
+        raise RuntimeError('The first request failed, is the database seeded?')
+    timings['time_to_first_request_ms'] = (timings.pop('served_at') - spawned) * 1000
+    #whatever came before the probe's first line: interpreter start and site imports
+    timings['interpreter_ms'] = timings['time_to_first_request_ms'] - sum(
+        timings[phase] for phase in ('import_ms', 'create_app_ms', 'first_request_ms'))
+    return timings, parse_importtime(result.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', required=True, help='URI of a seeded database.')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh processes to start, the median is reported.')
+    parser.add_argument('--top', type=int, default=15, help='Slowest direct imports to list.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    runs, imports = [], {}
+    for _ in range(args.repeat):
+        timings, modules = cold_start(args.database)
+        runs.append(timings)
+        for name, (own, cumulative) in modules.items():
+            imports.setdefault(name, []).append((own, cumulative))
+
+    startup = {phase: round(statistics.median(run[phase] for run in runs), 2) for phase in PHASES}
+    slowest = sorted(((name, statistics.median(c for _, c in times), statistics.median(o for o, _ in times))
+                      for name, times in imports.items()), key=lambda entry: entry[1], reverse=True)[:args.top]
+    results = {
+        'meta': {'repeat': args.repeat, 'python': platform.python_version(),
+                 'timestamp': datetime.utcnow().isoformat()},
+        'startup': startup,
+        'imports': [{'module': name, 'cumulative_ms': round(cumulative / 1000, 2), 'self_ms': round(own / 1000, 2)}
+                    for name, cumulative, own in slowest],
+    }
+
+    for phase in PHASES:
+        print(f'{phase:<26} {startup[phase]:>9.2f}ms')
+    print('slowest imports:')
+    for entry in results['imports']:
+        print(f"  {entry['module']:<32} {entry['cumulative_ms']:>9.2f}ms  (self {entry['self_ms']:.2f}ms)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
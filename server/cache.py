@@ -0,0 +1,201 @@
+import time
+import pickle
+import threading
+from itertools import chain
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from models import db, Product, Supplier, Sales, Receipt
+from replicas import on_primary
+
+MISSING = object()
+
+#cache namespace for each model whose GET payload is cached, keyed on the row id
+CACHED_MODELS = {Product: 'product', Supplier: 'supplier', Sales: 'sale', Receipt: 'receipt'}
+#the kinds whose entries carry the row's version_id, a fill is checked against it after the set
+VERSIONED_KINDS = {'product': Product, 'supplier': Supplier, 'receipt': Receipt}
+
+class LRUCache:
+    """In-process least-recently-used cache with a per-entry time to live."""
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'backend': 'lru',
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+class SharedCache:
+    """Cache kept in a redis-compatible server so every worker sees the same entries and invalidations."""
+
+    def __init__(self, client, ttl=300, prefix='inventory:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def stats(self):
+        #evictions happen on the server, so report its counter
+        return {
+            'backend': 'shared',
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.client.info('stats').get('evicted_keys', 0),
+        }
+
+class DictClient:
+    """Local stand-in for a redis client (get/set/delete/info), for tests and single-process runs."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (None, None))
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def info(self, section=None):
+        return {'evicted_keys': 0}
+
+def init_cache(app):
+    backend = app.config['CACHE_BACKEND']
+    ttl = app.config['CACHE_TTL']
+    if backend == 'lru':
+        cache = LRUCache(maxsize=app.config['CACHE_MAXSIZE'], ttl=ttl)
+    elif backend == 'redis':
+        import redis
+        cache = SharedCache(redis.Redis.from_url(app.config['CACHE_REDIS_URL']), ttl=ttl)
+    elif backend == 'local':
+        cache = SharedCache(DictClient(), ttl=ttl)
+    elif backend == 'none':
+        cache = None
+    else:
+        raise ValueError(f"Unknown CACHE_BACKEND '{backend}'")
+    app.extensions['cache'] = cache
+
+def get_cache():
+    return current_app.extensions.get('cache') if has_app_context() else None
+
+def cached(kind, entity_id, loader):
+    """Read-through lookup, loader(entity_id) runs on a miss and None results are not cached."""
+    cache = get_cache()
+    if cache is None:
+        return loader(entity_id)
+
+    key = f'{kind}:{entity_id}'
+    value = cache.get(key)
+    if value is MISSING:
+        #filled from the primary, an entry read off a lagging replica would outlive the invalidation it missed
+        with on_primary():
+            value = loader(entity_id)
+        if value is not None:
+            cache.set(key, value)
+            if isinstance(value, dict) and value.get('version_id') is not None \
+                    and current_version(kind, entity_id) != value['version_id']:
+                #a write committed between the load and the set, and its invalidation may have run before the set
+                cache.delete(key)
+    return value
+
+def current_version(kind, entity_id):
+    #on a connection of its own, the session's transaction may still be reading the snapshot the load saw
+    model = VERSIONED_KINDS[kind]
+    with db.engine.connect() as connection:
+        return connection.scalar(db.select(model.version_id).where(model.id == entity_id))
+
+def invalidate_after_commit(session, kind, entity_ids):
+    #for core statements that change cached rows without going through the unit of work
+    session.info.setdefault('cache_invalidations', set()).update((kind, entity_id) for entity_id in entity_ids)
+
+@event.listens_for(db.session, 'after_flush')
+def collect_invalidations(session, flush_context):
+    #new rows are never cached (misses aren't stored), only changed and deleted ones can be stale
+    for obj in chain(session.dirty, session.deleted):
+        kind = CACHED_MODELS.get(type(obj))
+        if kind is not None and obj.id is not None:
+            invalidate_after_commit(session, kind, [obj.id])
+    #products whose stock was moved by a core UPDATE from the ledger listener
+    invalidate_after_commit(session, 'product', session.info.get('moved_products', ()))
+
+@event.listens_for(db.session, 'after_commit')
+def apply_invalidations(session):
+    keys = session.info.pop('cache_invalidations', None)
+    cache = get_cache()
+    if keys and cache is not None:
+        cache.delete(*(f'{kind}:{entity_id}' for kind, entity_id in keys))
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_invalidations(session):
+    session.info.pop('cache_invalidations', None)
@@ -6,6 +6,60 @@ load_dotenv()
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URI', 'sqlite:///inventorydb.db') 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    PRODUCTS_PAGE_SIZE = int(os.getenv('PRODUCTS_PAGE_SIZE', 50))
+    PRODUCTS_MAX_PAGE_SIZE = int(os.getenv('PRODUCTS_MAX_PAGE_SIZE', 500))
+    SUPPLIER_LOOKUP_MAX_SKUS = int(os.getenv('SUPPLIER_LOOKUP_MAX_SKUS', 1000))
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))
+    EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 5000))
+    ALERTS_INTERVAL_SECONDS = float(os.getenv('ALERTS_INTERVAL_SECONDS', 0))
+    ALERTS_DEBOUNCE_SECONDS = int(os.getenv('ALERTS_DEBOUNCE_SECONDS', 3600))
+    ALERTS_CHUNK_SIZE = int(os.getenv('ALERTS_CHUNK_SIZE', 500))
+    ALERTS_WATERMARK_MARGIN = int(os.getenv('ALERTS_WATERMARK_MARGIN', 100))
+    SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+    SEARCH_DEFAULT_LIMIT = int(os.getenv('SEARCH_DEFAULT_LIMIT', 20))
+    SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', 100))
+    SEARCH_RANK_WINDOW = int(os.getenv('SEARCH_RANK_WINDOW', 200))
+    SEARCH_INDEX_TTL_SECONDS = float(os.getenv('SEARCH_INDEX_TTL_SECONDS', 5))
+    SEARCH_CHANGES_MARGIN = int(os.getenv('SEARCH_CHANGES_MARGIN', 100))
+    JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', 2))
+    JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+    JOBS_LOCK_SECONDS = int(os.getenv('JOBS_LOCK_SECONDS', 60))
+    JOBS_POLL_SECONDS = float(os.getenv('JOBS_POLL_SECONDS', 1))
+    JOBS_RETRY_BACKOFF_SECONDS = float(os.getenv('JOBS_RETRY_BACKOFF_SECONDS', 2))
+    #Cache-Control per resource, no-cache lets the browser keep a copy but revalidate it with the ETag
+    CACHE_CONTROL = {
+        'product': os.getenv('CACHE_CONTROL_PRODUCT', 'no-cache'),
+        'supplier': os.getenv('CACHE_CONTROL_SUPPLIER', 'no-cache'),
+        'receipt': os.getenv('CACHE_CONTROL_RECEIPT', 'no-cache'),
+        'products': os.getenv('CACHE_CONTROL_PRODUCTS', 'no-cache'),
+    }
+    JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto')
+    COMPRESS_ALGORITHMS = os.getenv('COMPRESS_ALGORITHMS', 'br,gzip')
+    COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    #read replicas, comma separated URIs that become the replica_1, replica_2, ... binds
+    SQLALCHEMY_BINDS = {f'replica_{number}': uri for number, uri in
+                        enumerate(filter(None, os.getenv('DATABASE_REPLICA_URIS', '').split(',')), 1)}
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_CHECK_SECONDS = float(os.getenv('REPLICA_CHECK_SECONDS', 1))
+    REPLICA_PIN_SECONDS = float(os.getenv('REPLICA_PIN_SECONDS', 10))
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 5000))
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'lru')
+    CACHE_MAXSIZE = int(os.getenv('CACHE_MAXSIZE', 10000))
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 300))
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    #hashing threads per web worker, gunicorn already runs about two workers per CPU
+    AUTH_POOL_WORKERS = int(os.getenv('AUTH_POOL_WORKERS', 1))
+    AUTH_POOL_MAX_PENDING = int(os.getenv('AUTH_POOL_MAX_PENDING', 0))
+    AUTH_HASH_TIMEOUT = float(os.getenv('AUTH_HASH_TIMEOUT', 10))
+    AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_N_PLUS_ONE_THRESHOLD = int(os.getenv('PROFILING_N_PLUS_ONE_THRESHOLD', 10))
+    PROFILING_CPROFILE_DIR = os.getenv('PROFILING_CPROFILE_DIR')
+    PROFILING_WINDOW = int(os.getenv('PROFILING_WINDOW', 1024))
+    SQLITE_WAL = os.getenv('SQLITE_WAL', 'true').lower() == 'true'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
     # SECRET_KEY = os.getenv('SECRET_KEY', 'your_secret_key')
 
 class DevelopmentConfig(Config):
@@ -17,6 +71,17 @@ class TestingConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+    #gunicorn runs several workers, per process entries would go stale in the workers that didn't do the write;
+    #shared when a redis URL is given, otherwise per process with a TTL short enough to bound the staleness
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if os.getenv('CACHE_REDIS_URL') else 'lru')
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 300 if CACHE_BACKEND in ('redis', 'local') else 5))
+    ALERTS_INTERVAL_SECONDS = float(os.getenv('ALERTS_INTERVAL_SECONDS', 30))
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
 
 def get_config():
     env = os.getenv('FLASK_ENV', 'development')
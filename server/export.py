@@ -0,0 +1,68 @@
+import io
+import csv
+import json
+import zlib
+from models import db, with_archive, Sales, StockTransaction
+
+#export name -> (model, date column used for the range filter, exported columns)
+EXPORTS = {
+    'sales': (Sales, 'date_of_sale',
+              ('id', 'product_id', 'name', 'quantity_sold', 'total_price', 'date_of_sale', 'receipt_id')),
+    'stock-transactions': (StockTransaction, 'date_of_transaction',
+                           ('id', 'product_id', 'quantity', 'date_of_transaction', 'transaction_type')),
+}
+FORMATS = ('csv', 'ndjson')
+
+def export_query(connection, name, start=None, end=None):
+    model, date_column, columns = EXPORTS[name]
+    #a range reaching past the archive horizon reads the archived rows as well
+    table = with_archive(connection, model.__table__, start)
+    query = db.select(*(table.c[column] for column in columns)).order_by(table.c[date_column], table.c.id)
+    if start is not None:
+        query = query.where(table.c[date_column] >= start)
+    if end is not None:
+        query = query.where(table.c[date_column] < end)
+    return query
+
+def iter_rows(engine, name, start, end, chunk_size):
+    #a server-side cursor on its own connection, only chunk_size rows are ever held in memory
+    with engine.connect() as connection:
+        result = (connection.execution_options(stream_results=True, yield_per=chunk_size)
+            .execute(export_query(connection, name, start, end)))
+        for partition in result.partitions():
+            yield partition
+
+def _value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+def encode_chunks(partitions, columns, fmt):
+    """Turn row partitions into text chunks of CSV (with a header) or newline delimited JSON."""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in partitions:
+            writer.writerows([_value(value) for value in row] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for rows in partitions:
+            yield ''.join(json.dumps(dict(zip(columns, map(_value, row)))) + '\n' for row in rows)
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(engine, name, fmt='csv', start=None, end=None, compress=False, chunk_size=5000):
+    """Generator of response body chunks (bytes) for an export, constant memory whatever the row count."""
+    columns = EXPORTS[name][2]
+    chunks = encode_chunks(iter_rows(engine, name, start, end, chunk_size), columns, fmt)
+    if compress:
+        return gzip_chunks(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks if chunk)
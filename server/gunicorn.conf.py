@@ -0,0 +1,12 @@
+import os
+import multiprocessing
+
+bind = os.getenv('BIND', '0.0.0.0:5555')
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('WEB_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+#each worker builds its own app and engine so pooled connections are never shared across a fork
+preload_app = False
+accesslog = '-'
@@ -0,0 +1,115 @@
+import csv
+import json
+import time
+from sqlalchemy.exc import IntegrityError
+from models import db, dialect_insert, Product, StockSummary, StockTransaction
+from cache import invalidate_after_commit
+from search import index_after_commit
+
+IMPORT_FIELDS = ("name", "sku", "description", "price", "quantity_in_stock")
+
+def read_rows(stream, fmt):
+    #yield rows one at a time so the whole file is never held in memory,
+    #json lines are decoded in validate_row so a bad line is reported like any other bad row
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt in ('jsonl', 'ndjson'):
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield line
+    else:
+        raise ValueError(f"Unsupported import format '{fmt}', use jsonl or csv")
+
+def validate_row(row):
+    if isinstance(row, str):
+        row = json.loads(row)
+    if not isinstance(row, dict):
+        raise ValueError("Row must be an object")
+    missing = [field for field in IMPORT_FIELDS if row.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+
+    price = float(row['price'])
+    quantity_in_stock = int(row['quantity_in_stock'])
+    if price < 0 or quantity_in_stock < 0:
+        raise ValueError("price and quantity_in_stock must not be negative")
+
+    return {
+        "name": str(row['name']).strip(),
+        "sku": str(row['sku']).strip(),
+        "description": str(row['description']),
+        "price": price,
+        "quantity_in_stock": quantity_in_stock,
+    }
+
+def upsert_statement(rows):
+    insert = dialect_insert(db.session.connection())
+    stmt = insert(Product).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[Product.sku],
+        set_=dict({field: stmt.excluded[field] for field in IMPORT_FIELDS if field != 'sku'},
+                  version_id=Product.version_id + 1),
+    )
+
+def upsert_rows(rows):
+    #core statements bypass the session flush, so keep stock_summary, the ledger and the cache in step explicitly
+    before = dict(db.session.execute(db.select(Product.sku, Product.quantity_in_stock)
+        .where(Product.sku.in_([row['sku'] for row in rows]))).all())
+    upserted = db.session.execute(upsert_statement(rows).returning(Product.id, Product.sku, Product.quantity_in_stock)).all()
+    product_ids = [product_id for product_id, _, _ in upserted]
+    connection = db.session.connection()
+    StockSummary.refresh_stock_values(connection, product_ids)
+    StockTransaction.append(connection, {product_id: quantity - before.get(sku, 0)
+                                         for product_id, sku, quantity in upserted}, 'import')
+    invalidate_after_commit(db.session, 'product', product_ids)
+    by_sku = {row['sku']: row for row in rows}
+    index_after_commit(db.session, 'product', {product_id: (by_sku[sku]['name'], sku, by_sku[sku]['description'])
+                                               for product_id, sku, _ in upserted})
+
+def flush_batch(batch, report):
+    #one multi-row upsert per chunk, on a constraint error retry the chunk row by row to find the culprits
+    rows = list(batch.values())
+    try:
+        upsert_rows([row for _, row in rows])
+        db.session.commit()
+        report['upserted'] += len(rows)
+        return
+    except IntegrityError:
+        db.session.rollback()
+
+    for line_number, row in rows:
+        try:
+            upsert_rows([row])
+            db.session.commit()
+            report['upserted'] += 1
+        except IntegrityError as e:
+            db.session.rollback()
+            report['errors'].append({'row': line_number, 'error': str(e.orig)})
+
+def import_products(rows, batch_size=500):
+    report = {'processed': 0, 'upserted': 0, 'errors': []}
+    started = time.perf_counter()
+
+    #keyed by sku so a repeated sku inside one chunk keeps its last occurrence
+    batch = {}
+    for line_number, row in enumerate(rows, start=1):
+        report['processed'] += 1
+        try:
+            valid = validate_row(row)
+        except (ValueError, TypeError) as e:
+            report['errors'].append({'row': line_number, 'error': str(e)})
+            continue
+
+        batch[valid['sku']] = (line_number, valid)
+        if len(batch) >= batch_size:
+            flush_batch(batch, report)
+            batch = {}
+
+    if batch:
+        flush_batch(batch, report)
+
+    elapsed = time.perf_counter() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['processed'] / elapsed, 1) if elapsed else None
+    return report
@@ -0,0 +1,225 @@
+import logging
+import threading
+import traceback
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event
+from models import db, dialect_insert, Job, Receipt, Sales, StockSummary, SalesRollup
+from alerts import WatermarkMoved, evaluate_low_stock
+
+logger = logging.getLogger(__name__)
+
+#job kind -> function(payload), run inside an app context and committed together with the job's done mark
+HANDLERS = {}
+
+def handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+def enqueue(session, jobs):
+    """Queue (kind, payload, idempotency key or None) jobs in the session's transaction.
+
+    Workers only see them once that transaction commits, and a key that was already queued is skipped.
+    """
+    if not jobs:
+        return
+    connection = session.connection()
+    now = datetime.utcnow()
+    rows = [{'kind': kind, 'payload': payload, 'idempotency_key': key, 'status': 'pending', 'attempts': 0,
+             'run_after': now, 'created_at': now} for kind, payload, key in jobs]
+    connection.execute(dialect_insert(connection)(Job.__table__)
+        .on_conflict_do_nothing(index_elements=['idempotency_key']), rows)
+    session.info['jobs_enqueued'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def wake_workers(session):
+    if session.info.pop('jobs_enqueued', False):
+        queue = current_app.extensions.get('job_queue')
+        if queue is not None:
+            queue.wake()
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_enqueued(session):
+    session.info.pop('jobs_enqueued', None)
+
+class JobQueue:
+    """Worker threads that claim jobs from the jobs table, run them and record the outcome."""
+
+    def __init__(self, app, workers, max_attempts, lock_seconds, poll_seconds, backoff_seconds):
+        self.app = app
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lock_seconds = lock_seconds
+        self.poll_seconds = poll_seconds
+        self.backoff_seconds = backoff_seconds
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        #started on the first request or enqueue, so CLI commands and migrations never spin up workers
+        with self._lock:
+            if self._threads or not self.workers:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'job-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    ran = self.run_next()
+                except Exception:
+                    logger.exception('Job worker failed')
+                    db.session.rollback()
+                    ran = False
+            if not ran:
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+
+    def claim(self):
+        """Mark the oldest runnable job as running and return (id, kind, payload, attempts), None when idle."""
+        table = Job.__table__
+        now = datetime.utcnow()
+        runnable = db.or_(db.and_(table.c.status == 'pending', table.c.run_after <= now),
+                          db.and_(table.c.status == 'running', table.c.locked_until < now))
+        candidates = db.session.execute(db.select(table.c.id, table.c.kind, table.c.payload, table.c.attempts)
+            .where(runnable)
+            .order_by(table.c.id)
+            .limit(self.workers or 1)).all()
+        for job_id, kind, payload, attempts in candidates:
+            #guarded like checkout, only one worker's UPDATE matches
+            claimed = db.session.execute(table.update()
+                .where(table.c.id == job_id, table.c.attempts == attempts, runnable)
+                .values(status='running', attempts=attempts + 1,
+                        locked_until=now + timedelta(seconds=self.lock_seconds))).rowcount
+            if claimed:
+                db.session.commit()
+                return job_id, kind, payload, attempts + 1
+        db.session.rollback()
+        return None
+
+    def run_next(self):
+        claimed = self.claim()
+        if claimed is None:
+            return False
+        self.run(*claimed)
+        return True
+
+    def run(self, job_id, kind, payload, attempts):
+        table = Job.__table__
+        mine = db.and_(table.c.id == job_id, table.c.attempts == attempts, table.c.status == 'running')
+        try:
+            HANDLERS[kind](payload)
+            finished = db.session.execute(table.update().where(mine)
+                .values(status='done', locked_until=None, last_error=None, finished_at=datetime.utcnow())).rowcount
+            if not finished:
+                #our lock ran out and another worker took the job over, its run is the one that counts
+                db.session.rollback()
+                return
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            failed = attempts >= self.max_attempts
+            now = datetime.utcnow()
+            db.session.execute(table.update().where(mine).values(
+                status='failed' if failed else 'pending',
+                run_after=now + timedelta(seconds=self.backoff_seconds * 2 ** (attempts - 1)),
+                locked_until=None,
+                last_error=traceback.format_exc(limit=5),
+                finished_at=now if failed else None))
+            db.session.commit()
+            logger.warning('Job %s (%s) failed on attempt %d%s', job_id, kind, attempts, ', giving up' if failed else '')
+
+    def run_pending(self, limit=None):
+        """Run jobs on the calling thread until none are runnable, returns how many ran."""
+        count = 0
+        while (limit is None or count < limit) and self.run_next():
+            count += 1
+        return count
+
+    @staticmethod
+    def stats():
+        table = Job.__table__
+        counts = dict(db.session.execute(db.select(table.c.status, db.func.count()).group_by(table.c.status)).all())
+        return {status: counts.get(status, 0) for status in Job.STATUSES}
+
+def init_jobs(app):
+    queue = JobQueue(app,
+                     workers=app.config['JOBS_WORKERS'],
+                     max_attempts=app.config['JOBS_MAX_ATTEMPTS'],
+                     lock_seconds=app.config['JOBS_LOCK_SECONDS'],
+                     poll_seconds=app.config['JOBS_POLL_SECONDS'],
+                     backoff_seconds=app.config['JOBS_RETRY_BACKOFF_SECONDS'])
+    app.extensions['job_queue'] = queue
+    app.before_request(queue.start)
+
+def sale_jobs(idempotency_scope, lines, receipt_id, refresh=()):
+    """The follow-up work of recording sales: summaries, rollups, the receipt text and a low stock check.
+
+    lines are (product_id, date_of_sale, quantity_sold, total_price) as inserted, so the job applies exactly
+    those amounts even if the sale is edited before it runs.
+    """
+    return [
+        ('apply_sales', {'lines': [[product_id, date_of_sale.isoformat(), quantity_sold, total_price]
+                                   for product_id, date_of_sale, quantity_sold, total_price in lines],
+                         'refresh': sorted(refresh)}, f'apply-sales:{idempotency_scope}'),
+        ('render_receipt', {'receipt_id': receipt_id}, f'render-receipt:{idempotency_scope}'),
+        ('evaluate_alerts', {}, f'evaluate-alerts:{idempotency_scope}'),
+    ]
+
+@handler('apply_sales')
+def apply_sales(payload):
+    lines = [(product_id, datetime.fromisoformat(date_of_sale), quantity_sold, total_price, 1)
+             for product_id, date_of_sale, quantity_sold, total_price in payload['lines']]
+    sold = defaultdict(float)
+    for product_id, _, _, total_price, _ in lines:
+        sold[product_id] += total_price
+    connection = db.session.connection()
+    StockSummary.apply_sold_deltas(connection, sold)
+    StockSummary.refresh_stock_values(connection, payload.get('refresh', []))
+    SalesRollup.apply_sales(connection, lines)
+
+def render(receipt, lines):
+    rows = [f'Receipt #{receipt.id}', receipt.date_of_receipt.strftime('%Y-%m-%d %H:%M')]
+    rows += [f'{quantity_sold} x {name}  {total_price:.2f}' for name, quantity_sold, total_price in lines]
+    rows.append(f'Total  {receipt.total_amount:.2f}')
+    return '\n'.join(rows)
+
+@handler('render_receipt')
+def render_receipt(payload):
+    receipt = db.session.get(Receipt, payload['receipt_id'])
+    if receipt is None:
+        return
+    lines = db.session.execute(db.select(Sales.name, Sales.quantity_sold, Sales.total_price)
+        .where(Sales.receipt_id == receipt.id)
+        .order_by(Sales.id)).all()
+    receipt.rendered = render(receipt, lines)
+    db.session.flush()
+
+@handler('evaluate_alerts')
+def evaluate_alerts(payload):
+    try:
+        evaluate_low_stock(db.session.connection(), current_app.config['ALERTS_DEBOUNCE_SECONDS'],
+                           current_app.config['ALERTS_CHUNK_SIZE'], product_ids=payload.get('product_ids', ()),
+                           margin=current_app.config['ALERTS_WATERMARK_MARGIN'])
+    except WatermarkMoved:
+        #the other evaluator covered the new rows, but not products handed to this job directly;
+        #those fail the attempt so the queue retries them after its backoff
+        if payload.get('product_ids'):
+            raise
+        db.session.rollback()
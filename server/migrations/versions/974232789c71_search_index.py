@@ -0,0 +1,52 @@
+"""search index
+
+Revision ID: 974232789c71
+Revises: f7e3e8ad1b18
+Create Date: 2026-10-17 20:01:52.509303
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '974232789c71'
+down_revision = 'f7e3e8ad1b18'
+branch_labels = None
+depends_on = None
+
+
+#products at even rowids and suppliers at odd ones, so the triggers address rows without a scan
+TRIGGERS = {
+    'products_search_insert': "AFTER INSERT ON products BEGIN "
+        "INSERT INTO search_index(rowid, name, sku, description) VALUES (new.id * 2, new.name, new.sku, new.description); END",
+    'products_search_update': "AFTER UPDATE OF name, sku, description ON products BEGIN "
+        "DELETE FROM search_index WHERE rowid = old.id * 2; "
+        "INSERT INTO search_index(rowid, name, sku, description) VALUES (new.id * 2, new.name, new.sku, new.description); END",
+    'products_search_delete': "AFTER DELETE ON products BEGIN DELETE FROM search_index WHERE rowid = old.id * 2; END",
+    'suppliers_search_insert': "AFTER INSERT ON suppliers BEGIN "
+        "INSERT INTO search_index(rowid, name) VALUES (new.id * 2 + 1, new.name); END",
+    'suppliers_search_update': "AFTER UPDATE OF name ON suppliers BEGIN "
+        "DELETE FROM search_index WHERE rowid = old.id * 2 + 1; "
+        "INSERT INTO search_index(rowid, name) VALUES (new.id * 2 + 1, new.name); END",
+    'suppliers_search_delete': "AFTER DELETE ON suppliers BEGIN DELETE FROM search_index WHERE rowid = old.id * 2 + 1; END",
+}
+
+
+def upgrade():
+    #FTS5 is SQLite only, other databases search through the in-memory index
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("CREATE VIRTUAL TABLE search_index USING fts5(name, sku, description, prefix='2 3')")
+    for name, body in TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+    op.execute("INSERT INTO search_index(rowid, name, sku, description) SELECT id * 2, name, sku, description FROM products")
+    op.execute("INSERT INTO search_index(rowid, name) SELECT id * 2 + 1, name FROM suppliers")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.execute("DROP TABLE IF EXISTS search_index")
@@ -0,0 +1,48 @@
+"""sales take stock
+
+Revision ID: ad56da7b6839
+Revises: 78355e9bae1f
+Create Date: 2026-10-17 21:10:04.118532
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ad56da7b6839'
+down_revision = '78355e9bae1f'
+branch_labels = None
+depends_on = None
+
+
+#units sold per product, hot sales plus whatever archive_history carried forward
+SOLD = ("(SELECT COALESCE(SUM(sales.quantity_sold), 0) FROM sales WHERE sales.product_id = products.id)"
+        " + COALESCE((SELECT archived_totals.quantity_sold FROM archived_totals"
+        " WHERE archived_totals.product_id = products.id), 0)")
+
+UNSOLD = "(SELECT products.price * products.quantity_in_stock FROM products WHERE products.id = stock_summary.product_id)"
+
+
+def move_sold_units(sign, transaction_type):
+    #quantity_in_stock used to count every unit received, sales now take theirs off it, through the ledger
+    bind = op.get_bind()
+    bind.execute(sa.text(
+        f"INSERT INTO stock_transactions (product_id, quantity, date_of_transaction, transaction_type) "
+        f"SELECT products.id, {sign} * ({SOLD}), :now, :transaction_type FROM products WHERE ({SOLD}) != 0"),
+        {'now': datetime.utcnow(), 'transaction_type': transaction_type})
+    bind.execute(sa.text(
+        f"UPDATE products SET quantity_in_stock = quantity_in_stock + {sign} * ({SOLD}), version_id = version_id + 1"))
+
+
+def upgrade():
+    move_sold_units(-1, 'sale')
+    op.execute(f"UPDATE stock_summary SET total_unsold_value = {UNSOLD}, "
+               f"total_stock_value = {UNSOLD} + total_sold_value, version_id = version_id + 1")
+
+
+def downgrade():
+    move_sold_units(1, 'reconciliation')
+    op.execute(f"UPDATE stock_summary SET total_stock_value = {UNSOLD}, "
+               f"total_unsold_value = {UNSOLD} - total_sold_value, version_id = version_id + 1")
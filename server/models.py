@@ -1,11 +1,47 @@
 import re
+from collections import defaultdict
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import DateTime
+from flask_sqlalchemy.session import Session
+from sqlalchemy import DateTime, event, inspect
+from sqlalchemy.sql.dml import UpdateBase
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, has_app_context
 
-db = SQLAlchemy()
+class RoutingSession(Session):
+    """Sends the reads of requests routed to a read replica there, every write and everything else to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if self._flushing or isinstance(clause, UpdateBase):
+                #once the request writes it stays on the primary
+                g.wrote = True
+            elif mapper is None and clause is None:
+                #a bare connection() may be written through, so it is always the primary's; read paths that
+                #want the replica ask for read_engine() themselves
+                pass
+            elif not g.get('wrote') and g.get('read_engine') is not None:
+                return g.read_engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def dialect_insert(connection):
+    """The INSERT construct with ON CONFLICT support for the connection's database."""
+    #imported here, the connection's dialect is already loaded and the other one never needs to be
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    raise RuntimeError(f"Upserts are not supported on {dialect}")
+
+#compiled once at import, signup and the User validators share them
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9_.+-]+@gmail\.com$')
+PHONE_NUMBER_PATTERN = re.compile(r'^\d{10}$')
+PASSWORD_PATTERN = re.compile(r'^(?=.*[A-Za-z])(?=.*\d)[A-Za-z\d]{8,}$')
 
 class User(db.Model):
     __tablename__ = "user"
@@ -35,21 +71,21 @@ class User(db.Model):
 
     @staticmethod
     def validate_email(email):
-        if re.match(r'^[a-zA-Z0-9_.+-]+@gmail\.com$', email):
+        if EMAIL_PATTERN.match(email):
             return True
         else:
             raise ValueError("Email must end with '@gmail.com'.")
 
     @staticmethod
     def validate_phone_number(phone_number):
-        if re.match(r'^\d{10}$', phone_number):
+        if PHONE_NUMBER_PATTERN.match(phone_number):
             return True
         else:
             raise ValueError("Phone number must be 10 digits.")
 
     @staticmethod
     def validate_password(password):
-        if re.match(r'^(?=.*[A-Za-z])(?=.*\d)[A-Za-z\d]{8,}$', password):
+        if PASSWORD_PATTERN.match(password):
             return True
         else:
             raise ValueError("Password must be at least 8 characters, include letters and numbers, and contain no special symbols")
@@ -62,7 +98,9 @@ class User(db.Model):
 
 product_supplier = db.Table('product_supplier',
     db.Column('product_id', db.Integer, db.ForeignKey('products.id'), primary_key=True),
-    db.Column('supplier_id', db.Integer, db.ForeignKey('suppliers.id'), primary_key=True)
+    db.Column('supplier_id', db.Integer, db.ForeignKey('suppliers.id'), primary_key=True),
+    #the primary key covers product -> suppliers, this covers supplier -> products
+    db.Index('ix_product_supplier_supplier_id', 'supplier_id')
 )
 
 class Product(db.Model):
@@ -72,123 +110,654 @@ class Product(db.Model):
     sku = db.Column(db.String, unique=True, nullable=False)
     description = db.Column(db.String, nullable=False)
     price = db.Column(db.Float, nullable=False)
-    quantity_in_stock = db.Column(db.Integer, nullable=False)
+    #units on hand, sales take theirs off; every change is appended to the stock ledger,
+    #active history keeps the old value for the delta
+    quantity_in_stock = db.column_property(db.Column(db.Integer, nullable=False), active_history=True)
+    #a low stock alert is raised once quantity_in_stock falls to this level, no alerts when unset
+    reorder_point = db.Column(db.Integer, nullable=True)
+    #bumped by every write, ORM flushes check it and core statements increment it themselves
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default="1")
     suppliers = db.relationship('Supplier', secondary=product_supplier, back_populates='products')
 
-    stock_transactions = db.relationship('StockTransaction', backref='product', lazy=True)
-    sales = db.relationship('Sale', backref='product', lazy=True)
+    __mapper_args__ = {"version_id_col": version_id}
 
-    def get_current_quantity_in_stock(self):
-        total_quantity_sold = sum(sale.quantity_sold for sale in self.sales)
-        return self.quantity_in_stock - total_quantity_sold
+    sales = db.relationship('Sales', backref='product', lazy=True)
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "sku": self.sku,
-            "description": self.description,
-            "price": self.price,
-            "quantity_in_stock": self.quantity_in_stock
-        }
+    @classmethod
+    def stock_levels(cls, product_ids=None):
+        """Rows of (product_id, sku, quantity_in_stock, quantity_sold) without reading every sale.
+
+        Closed days come from the daily rollups, which cover archived sales too, only today is summed from sales.
+        """
+        today = SalesRollup.truncate(datetime.utcnow(), "day")
+        closed = (db.select(SalesRollup.product_id, db.func.sum(SalesRollup.quantity_sold).label("quantity_sold"))
+            .where(SalesRollup.bucket == "day", SalesRollup.bucket_start < today)
+            .group_by(SalesRollup.product_id))
+        recent = (db.select(Sales.product_id, db.func.sum(Sales.quantity_sold).label("quantity_sold"))
+            .where(Sales.date_of_sale >= today)
+            .group_by(Sales.product_id))
+        query = db.select(cls.id.label("product_id"), cls.sku, cls.quantity_in_stock).order_by(cls.id)
+        if product_ids is not None:
+            query = query.where(cls.id.in_(product_ids))
+            closed = closed.where(SalesRollup.product_id.in_(product_ids))
+            recent = recent.where(Sales.product_id.in_(product_ids))
+        closed, recent = closed.subquery(), recent.subquery()
+        quantity_sold = db.func.coalesce(closed.c.quantity_sold, 0) + db.func.coalesce(recent.c.quantity_sold, 0)
+        query = (query.add_columns(quantity_sold.label("quantity_sold"))
+            .outerjoin(closed, closed.c.product_id == cls.id)
+            .outerjoin(recent, recent.c.product_id == cls.id))
+        return db.session.execute(query).all()
+
+    COLUMNS = ("id", "name", "sku", "description", "price", "quantity_in_stock", "reorder_point")
+
+    def to_dict(self, fields=None):
+        return {field: getattr(self, field) for field in (fields or self.COLUMNS)}
     
 class Supplier(db.Model):
     __tablename__ = "suppliers"
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, unique=True, nullable=False)
     contact = db.Column(db.String, unique=True, nullable=False)
+    #the ETag of GET /suppliers/<id>
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default="1")
 
     products = db.relationship('Product', secondary=product_supplier, back_populates='suppliers')
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "contact": self.contact
-        }
+    __mapper_args__ = {"version_id_col": version_id}
+
+    COLUMNS = ("id", "name", "contact")
+
+    def to_dict(self, fields=None):
+        return {field: getattr(self, field) for field in (fields or self.COLUMNS)}
 
 class Sales(db.Model):
     __tablename__ = "sales"
+    __table_args__ = (
+        db.Index('ix_sales_product_id_date_of_sale', 'product_id', 'date_of_sale'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    #old values are loaded on assignment so stock_summary and the rollups can back out the previous amounts
+    product_id = db.column_property(db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False), active_history=True)
     name = db.Column(db.String, nullable=False)
-    quantity_sold = db.Column(db.Integer, nullable=False)
-    total_price = db.Column(db.Float, nullable=False)
-    date_of_sale = db.Column(DateTime, default=datetime.utcnow, nullable=False)
-    receipt_id = db.Column(db.Integer, db.ForeignKey('receipts.id'), nullable=False)
+    quantity_sold = db.column_property(db.Column(db.Integer, nullable=False), active_history=True)
+    total_price = db.column_property(db.Column(db.Float, nullable=False), active_history=True)
+    date_of_sale = db.column_property(db.Column(DateTime, default=datetime.utcnow, nullable=False, index=True), active_history=True)
+    receipt_id = db.Column(db.Integer, db.ForeignKey('receipts.id'), nullable=False, index=True)
 
-    receipt = db.relationship('Receipt', backref=db.backref('sales', lazy=True))
+    receipt = db.relationship('Receipt', foreign_keys=[receipt_id], backref=db.backref('sales', lazy=True))
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "product_id": self.product_id,
-            "name": self.name,
-            "quantity_sold": self.quantity_sold,
-            "total_price": self.total_price,
-            "date_of_sale": self.date_of_sale,
-            "receipt_id": self.receipt_id
-        }
+    #set on a new sale whose stock_summary and rollup updates are queued as a job instead of run in the flush
+    summaries_deferred = False
+
+    COLUMNS = ("id", "product_id", "name", "quantity_sold", "total_price", "date_of_sale", "receipt_id")
+
+    def to_dict(self, fields=None):
+        return {field: getattr(self, field) for field in (fields or self.COLUMNS)}
 
 class StockTransaction(db.Model):
     __tablename__ = "stock_transactions"
+    __table_args__ = (
+        db.Index('ix_stock_transactions_product_id_date_of_transaction', 'product_id', 'date_of_transaction'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    date_of_transaction = db.Column(DateTime, default=datetime.utcnow, nullable=False)
+    date_of_transaction = db.Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     transaction_type = db.Column(db.String, nullable=False)
 
-    product = db.relationship('Product', backref=db.backref('stock_transactions', lazy=True))
+    #passive so deleting a product doesn't load its whole ledger, delete_stock_history removes it in bulk
+    product = db.relationship('Product', backref=db.backref('stock_transactions', lazy=True, passive_deletes='all'))
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "product_id": self.product_id,
-            "quantity": self.quantity,
-            "date_of_transaction": self.date_of_transaction,
-            "transaction_type": self.transaction_type
-        }
+    @classmethod
+    def append(cls, connection, movements, transaction_type, when=None):
+        """Append {product_id: quantity delta} to the ledger, zero deltas are skipped."""
+        when = when or datetime.utcnow()
+        rows = [{"product_id": product_id, "quantity": quantity, "date_of_transaction": when,
+                 "transaction_type": transaction_type} for product_id, quantity in movements.items() if quantity]
+        if rows:
+            connection.execute(cls.__table__.insert(), rows)
+
+    @classmethod
+    def reconcile(cls, connection, when=None):
+        """Append a reconciliation movement for every product whose ledger balance differs from quantity_in_stock."""
+        table = cls.__table__
+        products = Product.__table__
+        balance = (db.select(table.c.product_id, db.func.sum(table.c.quantity).label("balance"))
+            .group_by(table.c.product_id)
+            .subquery())
+        difference = (products.c.quantity_in_stock - db.func.coalesce(balance.c.balance, 0)
+                      - ArchivedTotals.carried(ArchivedTotals.stock_moved, products.c.id))
+        return connection.execute(table.insert().from_select(
+            ["product_id", "quantity", "date_of_transaction", "transaction_type"],
+            db.select(products.c.id, difference, db.literal(when or datetime.utcnow(), DateTime), db.literal("reconciliation"))
+                .outerjoin(balance, balance.c.product_id == products.c.id)
+                .where(difference != 0),
+        )).rowcount
+
+    COLUMNS = ("id", "product_id", "quantity", "date_of_transaction", "transaction_type")
+
+    def to_dict(self, fields=None):
+        return {field: getattr(self, field) for field in (fields or self.COLUMNS)}
     
 class Receipt(db.Model):
     __tablename__ = "receipts"
     id = db.Column(db.Integer, primary_key=True)
-    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
+    #first line of the receipt, a checkout receipt covers every sale pointing back at it through receipt_id;
+    #no foreign key since archive_history may move that sale to archived_sales
+    sale_id = db.Column(db.Integer, nullable=True, index=True)
     total_amount = db.Column(db.Float, nullable=False)
     date_of_receipt = db.Column(DateTime, default=datetime.utcnow, nullable=False)
+    #plain text receipt, filled in by the render_receipt job after the sale commits
+    rendered = db.Column(db.Text, nullable=True)
+    #the ETag of GET /receipts/<id>, bumped when the sale_id post-update or the rendered text lands
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default="1")
 
-    sale = db.relationship('Sales', backref='receipt')
+    sale = db.relationship('Sales', primaryjoin='Receipt.sale_id == Sales.id', foreign_keys=[sale_id], post_update=True)
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "sale_id": self.sale_id,
-            "total_amount": self.total_amount,
-            "date_of_receipt": self.date_of_receipt
-        }
+    __mapper_args__ = {"version_id_col": version_id}
+
+    COLUMNS = ("id", "sale_id", "total_amount", "date_of_receipt")
+
+    def to_dict(self, fields=None):
+        return {field: getattr(self, field) for field in (fields or self.COLUMNS)}
     
 class StockSummary(db.Model):
     __tablename__ = "stock_summary"
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, unique=True)
     total_stock_value = db.Column(db.Float, nullable=False, default=0.0)
     total_sold_value = db.Column(db.Float, nullable=False, default=0.0)
+    #the value of the units on hand, and the stock value is that plus everything sold
     total_unsold_value = db.Column(db.Float, nullable=False, default=0.0)
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default="1")
     
-    product = db.relationship("Product", backref="stock_summary")
+    product = db.relationship("Product", backref=db.backref("stock_summary", cascade="all, delete-orphan"))
+
+    __mapper_args__ = {"version_id_col": version_id}
 
     def update_stock_values(self):
-        product = Product.query.get(self.product_id)
-        self.total_stock_value = product.quantity_in_stock * product.price
+        """Recompute this row from scratch, the incremental path keeps it current so this is only for repairs."""
+        product = db.session.get(Product, self.product_id)
         total_sold = db.session.query(db.func.sum(Sales.total_price)).filter_by(product_id=self.product_id).scalar() or 0
-        self.total_sold_value = total_sold
-        self.total_unsold_value = self.total_stock_value - self.total_sold_value
-        db.session.commit()
+        self.total_sold_value = total_sold + db.session.scalar(
+            db.select(ArchivedTotals.carried(ArchivedTotals.total_sold, self.product_id)))
+        self.total_unsold_value = product.quantity_in_stock * product.price
+        self.total_stock_value = self.total_unsold_value + self.total_sold_value
+
+    @staticmethod
+    def full_recomputation():
+        """Select (id, stock, sold) for every product straight from products and sales, unsold is stock - sold."""
+        sold = (db.select(Sales.product_id, db.func.sum(Sales.total_price).label("sold"))
+            .group_by(Sales.product_id)
+            .subquery())
+        total_sold = db.func.coalesce(sold.c.sold, 0.0) + ArchivedTotals.carried(ArchivedTotals.total_sold, Product.id)
+        return (db.select(Product.id, (Product.price * Product.quantity_in_stock + total_sold).label("stock"),
+                          total_sold.label("sold"))
+            .outerjoin(sold, sold.c.product_id == Product.id))
+
+    @classmethod
+    def insert_missing(cls, connection, product_ids):
+        #rows created here are computed in full, so they already include whatever the caller just wrote
+        if not product_ids:
+            return
+        full = cls.full_recomputation().where(Product.id.in_(product_ids)).subquery()
+        existing = db.select(cls.product_id).where(cls.product_id.in_(product_ids))
+        connection.execute(db.insert(cls).from_select(
+            ["product_id", "total_stock_value", "total_sold_value", "total_unsold_value"],
+            db.select(full.c.id, full.c.stock, full.c.sold, full.c.stock - full.c.sold)
+                .where(full.c.id.not_in(existing)),
+        ))
+
+    @classmethod
+    def apply_sold_deltas(cls, connection, deltas):
+        """Add {product_id: sold value delta} to the summaries, in the caller's transaction.
+
+        The units sold have already left quantity_in_stock, refresh_stock_values brings the unsold value along.
+        """
+        table = cls.__table__
+        for product_id, delta in deltas.items():
+            if delta:
+                connection.execute(table.update()
+                    .where(table.c.product_id == product_id)
+                    .values(total_sold_value=table.c.total_sold_value + delta,
+                            total_stock_value=table.c.total_stock_value + delta,
+                            version_id=table.c.version_id + 1))
+        cls.insert_missing(connection, list(deltas))
+
+    @classmethod
+    def refresh_stock_values(cls, connection, product_ids):
+        """Re-derive the unsold and stock values from the current price and quantity of the given products."""
+        if not product_ids:
+            return
+        table = cls.__table__
+        products = Product.__table__
+        unsold = (db.select(products.c.price * products.c.quantity_in_stock)
+            .where(products.c.id == table.c.product_id)
+            .scalar_subquery())
+        connection.execute(table.update()
+            .where(table.c.product_id.in_(product_ids))
+            .values(total_unsold_value=unsold, total_stock_value=unsold + table.c.total_sold_value,
+                    version_id=table.c.version_id + 1))
+        cls.insert_missing(connection, list(product_ids))
+
+    COLUMNS = ("id", "product_id", "total_stock_value", "total_sold_value", "total_unsold_value")
+
+    def to_dict(self, fields=None):
+        return {field: getattr(self, field) for field in (fields or self.COLUMNS)}
+
+class SalesRollup(db.Model):
+    __tablename__ = "sales_rollups"
+    __table_args__ = (
+        db.UniqueConstraint('bucket', 'product_id', 'bucket_start', name='uq_sales_rollups_bucket_product_id_start'),
+        db.Index('ix_sales_rollups_bucket_bucket_start', 'bucket', 'bucket_start'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.String(4), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    bucket_start = db.Column(DateTime, nullable=False)
+    quantity_sold = db.Column(db.Integer, nullable=False, default=0)
+    total_sales = db.Column(db.Float, nullable=False, default=0.0)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+
+    BUCKETS = ("hour", "day")
+
+    @staticmethod
+    def truncate(moment, bucket):
+        if bucket == "hour":
+            return moment.replace(minute=0, second=0, microsecond=0)
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def bucket_expression(connection, column, bucket):
+        #same truncation as truncate(), in SQL; on SQLite the text matches how DateTime values are stored
+        if connection.dialect.name == "postgresql":
+            return db.func.date_trunc(bucket, column)
+        pattern = "%Y-%m-%d %H:00:00.000000" if bucket == "hour" else "%Y-%m-%d 00:00:00.000000"
+        return db.func.strftime(pattern, column)
+
+    @classmethod
+    def apply_sales(cls, connection, sales):
+        """Fold (product_id, date_of_sale, quantity_sold, total_price, sign) tuples into every bucket size."""
+        deltas = defaultdict(lambda: [0, 0.0, 0])
+        for product_id, date_of_sale, quantity_sold, total_price, sign in sales:
+            for bucket in cls.BUCKETS:
+                delta = deltas[(bucket, product_id, cls.truncate(date_of_sale, bucket))]
+                delta[0] += sign * quantity_sold
+                delta[1] += sign * total_price
+                delta[2] += sign
+        if not deltas:
+            return
+
+        insert = dialect_insert(connection)(cls.__table__)
+        connection.execute(
+            insert.on_conflict_do_update(
+                index_elements=["bucket", "product_id", "bucket_start"],
+                set_={
+                    "quantity_sold": cls.__table__.c.quantity_sold + insert.excluded.quantity_sold,
+                    "total_sales": cls.__table__.c.total_sales + insert.excluded.total_sales,
+                    "sale_count": cls.__table__.c.sale_count + insert.excluded.sale_count,
+                }),
+            [{"bucket": bucket, "product_id": product_id, "bucket_start": bucket_start,
+              "quantity_sold": quantity_sold, "total_sales": total_sales, "sale_count": sale_count}
+             for (bucket, product_id, bucket_start), (quantity_sold, total_sales, sale_count) in deltas.items()],
+        )
+
+    @classmethod
+    def backfill(cls, connection, bucket):
+        """Rebuild one bucket size from the full sales history, archived sales included."""
+        connection.execute(cls.__table__.delete().where(cls.bucket == bucket))
+        sales = with_archive(connection, Sales.__table__)
+        bucket_start = cls.bucket_expression(connection, sales.c.date_of_sale, bucket)
+        connection.execute(db.insert(cls).from_select(
+            ["bucket", "product_id", "bucket_start", "quantity_sold", "total_sales", "sale_count"],
+            db.select(db.literal(bucket), sales.c.product_id, bucket_start,
+                      db.func.sum(sales.c.quantity_sold), db.func.sum(sales.c.total_price), db.func.count())
+                .group_by(sales.c.product_id, bucket_start),
+        ))
+
+    def to_dict(self):
+        return {
+            "bucket": self.bucket,
+            "product_id": self.product_id,
+            "bucket_start": self.bucket_start,
+            "quantity_sold": self.quantity_sold,
+            "total_sales": self.total_sales,
+            "sale_count": self.sale_count,
+        }
+
+class StockSnapshot(db.Model):
+    """The ledger balance of a product just before taken_at, so a point in time read only replays what came after."""
+    __tablename__ = "stock_snapshots"
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'taken_at', name='uq_stock_snapshots_product_id_taken_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    taken_at = db.Column(DateTime, nullable=False)
+    quantity_in_stock = db.Column(db.Integer, nullable=False)
+
+    @classmethod
+    def take(cls, connection, until, moves=None):
+        """Checkpoint every product with movements since its latest snapshot, carrying that snapshot forward.
+
+        Only the hot ledger is read unless moves says otherwise, archive_history checkpoints every product at the
+        horizon first, so no snapshot older than it still has movements left to replay.
+        """
+        table = cls.__table__
+        moves = StockTransaction.__table__ if moves is None else moves
+        latest = (db.select(table.c.product_id, db.func.max(table.c.taken_at).label("taken_at"))
+            .group_by(table.c.product_id)
+            .subquery())
+        last = (db.select(table.c.product_id, table.c.taken_at, table.c.quantity_in_stock)
+            .join(latest, db.and_(latest.c.product_id == table.c.product_id, latest.c.taken_at == table.c.taken_at))
+            .subquery())
+        pending = (db.select(moves.c.product_id, db.func.sum(moves.c.quantity).label("moved"))
+            .outerjoin(last, last.c.product_id == moves.c.product_id)
+            .where(moves.c.date_of_transaction < until,
+                   db.or_(last.c.taken_at.is_(None), moves.c.date_of_transaction >= last.c.taken_at))
+            .group_by(moves.c.product_id)
+            .subquery())
+        return connection.execute(db.insert(cls).from_select(
+            ["product_id", "taken_at", "quantity_in_stock"],
+            db.select(pending.c.product_id, db.literal(until, DateTime),
+                      db.func.coalesce(last.c.quantity_in_stock, 0) + pending.c.moved)
+                .outerjoin(last, last.c.product_id == pending.c.product_id),
+        )).rowcount
+
+    @classmethod
+    def backfill(cls, connection):
+        """Rebuild a snapshot at the start of every day each product had movements, from the full ledger."""
+        connection.execute(cls.__table__.delete())
+        moves = with_archive(connection, StockTransaction.__table__)
+        day = SalesRollup.bucket_expression(connection, moves.c.date_of_transaction, "day")
+        daily = (db.select(moves.c.product_id, day.label("day"), db.func.sum(moves.c.quantity).label("moved"))
+            .group_by(moves.c.product_id, day)
+            .subquery())
+        #running total up to and including the day, minus the day itself, is the balance at its start
+        opening = db.func.sum(daily.c.moved).over(partition_by=daily.c.product_id, order_by=daily.c.day) - daily.c.moved
+        count = connection.execute(db.insert(cls).from_select(
+            ["product_id", "taken_at", "quantity_in_stock"],
+            db.select(daily.c.product_id, daily.c.day, opening),
+        )).rowcount
+        horizon = archive_horizon(connection, StockTransaction.__table__)
+        if horizon is not None:
+            #the daily snapshots before the horizon would replay archived days, checkpoint past them again
+            count += cls.take(connection, horizon, moves)
+        return count
+
+    @classmethod
+    def stock_as_of(cls, connection, product_id, as_of):
+        """(quantity, snapshot taken_at or None, movements replayed) for the ledger balance at as_of."""
+        table = cls.__table__
+        snapshot = connection.execute(db.select(table.c.taken_at, table.c.quantity_in_stock)
+            .where(table.c.product_id == product_id, table.c.taken_at <= as_of)
+            .order_by(table.c.taken_at.desc())
+            .limit(1)).first()
+        #replaying from before the horizon reads the archived movements too
+        moves = with_archive(connection, StockTransaction.__table__, snapshot.taken_at if snapshot is not None else None)
+        replay = (db.select(db.func.coalesce(db.func.sum(moves.c.quantity), 0), db.func.count())
+            .where(moves.c.product_id == product_id, moves.c.date_of_transaction <= as_of))
+        if snapshot is not None:
+            replay = replay.where(moves.c.date_of_transaction >= snapshot.taken_at)
+        moved, replayed = connection.execute(replay).one()
+        if snapshot is None:
+            return moved, None, replayed
+        return snapshot.quantity_in_stock + moved, snapshot.taken_at, replayed
 
     def to_dict(self):
         return {
-            "id": self.id,
             "product_id": self.product_id,
-            "total_stock_value": self.total_stock_value,
-            "total_sold_value": self.total_sold_value,
-            "total_unsold_value": self.total_unsold_value,
+            "taken_at": self.taken_at,
+            "quantity_in_stock": self.quantity_in_stock,
+        }
+
+class LowStockAlert(db.Model):
+    __tablename__ = "low_stock_alerts"
+    __table_args__ = (
+        db.Index('ix_low_stock_alerts_product_id_created_at', 'product_id', 'created_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity_in_stock = db.Column(db.Integer, nullable=False)
+    reorder_point = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(DateTime, default=datetime.utcnow, nullable=False)
+    #null while the product is still at or below its reorder point
+    resolved_at = db.Column(DateTime, nullable=True, index=True)
+
+    COLUMNS = ("id", "product_id", "quantity_in_stock", "reorder_point", "created_at", "resolved_at")
+
+    def to_dict(self, fields=None):
+        return {field: getattr(self, field) for field in (fields or self.COLUMNS)}
+
+class Job(db.Model):
+    """A unit of deferred work, written in the same transaction as the change that needs it."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String, nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    #a second enqueue with the same key is dropped, so retried requests don't queue the work twice
+    idempotency_key = db.Column(db.String, unique=True, nullable=True)
+    status = db.Column(db.String(8), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(DateTime, default=datetime.utcnow, nullable=False)
+    #a running job whose worker died is picked up again once this passes
+    locked_until = db.Column(DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(DateTime, nullable=True)
+
+    STATUSES = ("pending", "running", "done", "failed")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "payload": self.payload,
+            "idempotency_key": self.idempotency_key,
+            "status": self.status,
+            "attempts": self.attempts,
+            "run_after": self.run_after,
+            "last_error": self.last_error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
         }
+
+class AlertWatermark(db.Model):
+    """The highest row id of each source table the low stock evaluator has already looked at."""
+    __tablename__ = "alert_watermarks"
+    source = db.Column(db.String, primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+
+class AlertRetry(db.Model):
+    """A product the debounce window kept from raising an alert, re-checked once retry_at has passed."""
+    __tablename__ = "alert_retries"
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    retry_at = db.Column(DateTime, nullable=False, index=True)
+
+class SearchChange(db.Model):
+    """A product or supplier whose name, sku or description was written, read by every process's search index."""
+    __tablename__ = "search_changes"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String, nullable=False)
+    #no foreign key, deletes are logged too
+    entity_id = db.Column(db.Integer, nullable=False)
+    changed_at = db.Column(DateTime, nullable=False, index=True)
+
+class ReplicaHeartbeat(db.Model):
+    """One row the primary touches on every lag check, a replica's copy tells how far behind it is."""
+    __tablename__ = "replica_heartbeat"
+    id = db.Column(db.Integer, primary_key=True)
+    beat_at = db.Column(db.DateTime, nullable=False)
+
+class ArchivedSales(db.Model):
+    """Sales older than the archive horizon, moved out of sales by archive_history with their ids kept."""
+    __tablename__ = "archived_sales"
+    __table_args__ = (
+        db.Index('ix_archived_sales_product_id_date_of_sale', 'product_id', 'date_of_sale'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String, nullable=False)
+    quantity_sold = db.Column(db.Integer, nullable=False)
+    total_price = db.Column(db.Float, nullable=False)
+    date_of_sale = db.Column(DateTime, nullable=False, index=True)
+    receipt_id = db.Column(db.Integer, nullable=False)
+
+class ArchivedStockTransaction(db.Model):
+    """Stock movements older than the archive horizon, moved out of stock_transactions by archive_history."""
+    __tablename__ = "archived_stock_transactions"
+    __table_args__ = (
+        db.Index('ix_archived_stock_transactions_product_id_date_of_transaction', 'product_id', 'date_of_transaction'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    date_of_transaction = db.Column(DateTime, nullable=False, index=True)
+    transaction_type = db.Column(db.String, nullable=False)
+
+class ArchivedTotals(db.Model):
+    """Per product sums of everything archived, carried forward so all-time totals don't need the archive."""
+    __tablename__ = "archived_totals"
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    quantity_sold = db.Column(db.Integer, nullable=False, default=0)
+    total_sold = db.Column(db.Float, nullable=False, default=0.0)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    stock_moved = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def carried(cls, column, product_id):
+        #the archived part of an all-time sum, 0 for products with nothing archived
+        return db.func.coalesce(db.select(column).where(cls.product_id == product_id).scalar_subquery(), 0)
+
+class ArchiveHorizon(db.Model):
+    """Rows of each source table dated before archived_before may be in its archive table."""
+    __tablename__ = "archive_horizons"
+    source = db.Column(db.String, primary_key=True)
+    archived_before = db.Column(DateTime, nullable=False)
+
+#hot table -> its archive, both with the same columns in the same order
+ARCHIVES = {
+    Sales.__table__: ArchivedSales.__table__,
+    StockTransaction.__table__: ArchivedStockTransaction.__table__,
+}
+
+def archive_horizon(connection, table):
+    return connection.scalar(db.select(ArchiveHorizon.archived_before).where(ArchiveHorizon.source == table.name))
+
+def with_archive(connection, table, start=None):
+    """table, or table UNION ALL its archive when reading from start (None for all history) reaches past the horizon."""
+    horizon = archive_horizon(connection, table)
+    if horizon is None or (start is not None and start >= horizon):
+        return table
+    return db.union_all(db.select(*table.c), db.select(*ARCHIVES[table].c)).subquery(f"{table.name}_history")
+
+def _history_value(obj, attr):
+    #the value an attribute had before this flush
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else getattr(obj, attr)
+
+@event.listens_for(db.session, "after_flush")
+def maintain_stock_summary(session, flush_context):
+    #translate the sales and product rows written by this flush into stock_summary deltas
+    sold_deltas = defaultdict(float)
+    restocked = set()
+
+    for obj in session.new:
+        if isinstance(obj, Sales) and not obj.summaries_deferred:
+            sold_deltas[obj.product_id] += obj.total_price
+        elif isinstance(obj, Product):
+            restocked.add(obj.id)
+
+    for obj in session.deleted:
+        if isinstance(obj, Sales):
+            sold_deltas[_history_value(obj, "product_id")] -= _history_value(obj, "total_price")
+
+    for obj in session.dirty:
+        if isinstance(obj, Sales) and session.is_modified(obj):
+            sold_deltas[_history_value(obj, "product_id")] -= _history_value(obj, "total_price")
+            sold_deltas[obj.product_id] += obj.total_price
+        elif isinstance(obj, Product):
+            state = inspect(obj)
+            if state.attrs.price.history.has_changes() or state.attrs.quantity_in_stock.history.has_changes():
+                restocked.add(obj.id)
+
+    if not sold_deltas and not restocked:
+        return
+    connection = session.connection()
+    StockSummary.apply_sold_deltas(connection, sold_deltas)
+    StockSummary.refresh_stock_values(connection, restocked)
+
+ROLLUP_ATTRS = ("product_id", "date_of_sale", "quantity_sold", "total_price")
+
+@event.listens_for(db.session, "after_flush")
+def maintain_sales_rollups(session, flush_context):
+    sales = []
+    for obj in session.new:
+        if isinstance(obj, Sales) and not obj.summaries_deferred:
+            sales.append((obj.product_id, obj.date_of_sale, obj.quantity_sold, obj.total_price, 1))
+    for obj in session.deleted:
+        if isinstance(obj, Sales):
+            sales.append(tuple(_history_value(obj, attr) for attr in ROLLUP_ATTRS) + (-1,))
+    for obj in session.dirty:
+        if isinstance(obj, Sales) and session.is_modified(obj):
+            sales.append(tuple(_history_value(obj, attr) for attr in ROLLUP_ATTRS) + (-1,))
+            sales.append((obj.product_id, obj.date_of_sale, obj.quantity_sold, obj.total_price, 1))
+
+    if sales:
+        SalesRollup.apply_sales(session.connection(), sales)
+
+@event.listens_for(db.session, "before_flush")
+def delete_stock_history(session, flush_context, instances):
+    #a deleted product takes its ledger, snapshots, alerts and emptied rollups along, before its own row goes;
+    #products with sales are refused before they get here, the sales would keep referencing them
+    product_ids = [obj.id for obj in session.deleted if isinstance(obj, Product)]
+    if product_ids:
+        connection = session.connection()
+        for model in (StockTransaction, ArchivedStockTransaction, ArchivedTotals, StockSnapshot, LowStockAlert,
+                      AlertRetry, SalesRollup):
+            connection.execute(model.__table__.delete().where(model.__table__.c.product_id.in_(product_ids)))
+
+@event.listens_for(db.session, "after_flush")
+def maintain_stock_ledger(session, flush_context):
+    #product edits append their delta to the ledger, movements added through the session move the product
+    opened, edits = {}, {}
+    movements = defaultdict(int)
+    for obj in session.new:
+        if isinstance(obj, Product):
+            opened[obj.id] = obj.quantity_in_stock
+        elif isinstance(obj, StockTransaction):
+            movements[obj.product_id] += obj.quantity
+    for obj in session.dirty:
+        if isinstance(obj, Product) and obj not in session.deleted:
+            history = inspect(obj).attrs.quantity_in_stock.history
+            if history.has_changes():
+                old = history.deleted[0] if history.deleted else None
+                edits[obj.id] = (obj.quantity_in_stock or 0) - (old or 0)
+
+    if not opened and not edits and not movements:
+        return
+    connection = session.connection()
+    StockTransaction.append(connection, opened, "opening")
+    StockTransaction.append(connection, edits, "adjustment")
+    products = Product.__table__
+    for product_id, quantity in movements.items():
+        connection.execute(products.update()
+            .where(products.c.id == product_id)
+            .values(quantity_in_stock=products.c.quantity_in_stock + quantity, version_id=products.c.version_id + 1))
+    if movements:
+        StockSummary.refresh_stock_values(connection, list(movements))
+        session.info.setdefault("moved_products", set()).update(movements)
+
+@event.listens_for(db.session, "after_flush_postexec")
+def expire_moved_products(session, flush_context):
+    #the UPDATE above bypassed the identity map, reload quantity_in_stock and the version on next access
+    moved = session.info.pop("moved_products", None)
+    if moved:
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Product) and obj.id in moved:
+                session.expire(obj, ["quantity_in_stock", "version_id"])
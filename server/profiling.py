@@ -0,0 +1,147 @@
+import os
+import re
+import time
+import cProfile
+import logging
+import threading
+from collections import Counter, defaultdict, deque
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from models import db
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+class RequestMetrics:
+    """Rolling per-endpoint samples of wall time, SQL time and statement counts."""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self.samples = defaultdict(lambda: {
+            'duration': deque(maxlen=window),
+            'sql_duration': deque(maxlen=window),
+            'sql_statements': deque(maxlen=window),
+        })
+        self.totals = defaultdict(lambda: {'count': 0, 'duration': 0.0, 'sql_duration': 0.0, 'sql_statements': 0})
+        self.n_plus_one = Counter()
+
+    def record(self, endpoint, duration, sql_duration, sql_statements, n_plus_one):
+        with self._lock:
+            samples, totals = self.samples[endpoint], self.totals[endpoint]
+            samples['duration'].append(duration)
+            samples['sql_duration'].append(sql_duration)
+            samples['sql_statements'].append(sql_statements)
+            totals['count'] += 1
+            totals['duration'] += duration
+            totals['sql_duration'] += sql_duration
+            totals['sql_statements'] += sql_statements
+            if n_plus_one:
+                self.n_plus_one[endpoint] += 1
+
+    @staticmethod
+    def quantile(values, q):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+    def prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        summaries = (
+            ('duration', 'inventory_request_duration_seconds', 'Wall time spent handling a request.'),
+            ('sql_duration', 'inventory_request_sql_duration_seconds', 'Time spent in SQL per request.'),
+            ('sql_statements', 'inventory_request_sql_statements', 'SQL statements executed per request.'),
+        )
+        lines = []
+        with self._lock:
+            for key, name, help_text in summaries:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} summary']
+                for endpoint, samples in sorted(self.samples.items()):
+                    label = _escape(endpoint)
+                    for q in QUANTILES:
+                        lines.append(f'{name}{{endpoint="{label}",quantile="{q}"}} {self.quantile(samples[key], q)}')
+                    lines.append(f'{name}_sum{{endpoint="{label}"}} {self.totals[endpoint][key]}')
+                    lines.append(f'{name}_count{{endpoint="{label}"}} {self.totals[endpoint]["count"]}')
+
+            lines += ['# HELP inventory_n_plus_one_requests_total Requests that repeated one statement shape too often.',
+                      '# TYPE inventory_n_plus_one_requests_total counter']
+            for endpoint, count in sorted(self.n_plus_one.items()):
+                lines.append(f'inventory_n_plus_one_requests_total{{endpoint="{_escape(endpoint)}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+def statement_shape(statement):
+    #collapse whitespace and IN lists so "... IN (?, ?)" and "... IN (?, ?, ?)" count as the same query
+    shape = re.sub(r'\s+', ' ', statement).strip()
+    return re.sub(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,?)+\)', '(?)', shape)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'profile_started' in g:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'profile_started' in g and conn.info.get('profile_query_start'):
+        g.profile_sql_duration += time.perf_counter() - conn.info['profile_query_start'].pop()
+        g.profile_shapes[statement_shape(statement)] += 1
+
+def init_profiling(app):
+    """Attach the per-request profiler when PROFILING_ENABLED is set, it is a no-op otherwise."""
+    if not app.config['PROFILING_ENABLED']:
+        return
+
+    metrics = RequestMetrics(window=app.config['PROFILING_WINDOW'])
+    app.extensions['request_metrics'] = metrics
+    threshold = app.config['PROFILING_N_PLUS_ONE_THRESHOLD']
+    profile_dir = app.config['PROFILING_CPROFILE_DIR']
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_profile():
+        g.profile_started = time.perf_counter()
+        g.profile_sql_duration = 0.0
+        g.profile_shapes = Counter()
+        if profile_dir:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def finish_profile(response):
+        if 'profile_started' not in g:
+            return response
+        duration = time.perf_counter() - g.profile_started
+        endpoint = f'{request.method} {request.url_rule.rule if request.url_rule else "unmatched"}'
+        statements = sum(g.profile_shapes.values())
+
+        repeated = [(shape, count) for shape, count in g.profile_shapes.items() if count > threshold]
+        for shape, count in repeated:
+            logger.warning('Possible N+1 in %s: %d executions of %s', endpoint, count, shape)
+
+        metrics.record(endpoint, duration, g.profile_sql_duration, statements, bool(repeated))
+        response.headers['Server-Timing'] = (f'app;dur={duration * 1000:.2f}, '
+                                             f'sql;dur={g.profile_sql_duration * 1000:.2f};desc="{statements} statements"')
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            name = re.sub(r'[^A-Za-z0-9]+', '_', endpoint).strip('_')
+            profiler.dump_stats(os.path.join(profile_dir, f'{name}-{time.time_ns()}.prof'))
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        #after_request is skipped when a handler raises
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
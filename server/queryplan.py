@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Product, Sales, ArchivedSales, StockTransaction, ArchivedStockTransaction, Receipt, StockSummary, SalesRollup, StockSnapshot, LowStockAlert, product_supplier
+
+def hot_queries():
+    """The per-product and date-range lookups the API runs on every request, keyed by a readable name."""
+    since = datetime.utcnow() - timedelta(days=30)
+    return {
+        'sold value of a product': db.select(db.func.sum(Sales.total_price)).where(Sales.product_id == 1),
+        'sales of a product in a date range': db.select(Sales.id)
+            .where(Sales.product_id == 1, Sales.date_of_sale >= since),
+        'sales in a date range': db.select(Sales.id).where(Sales.date_of_sale >= since),
+        'sales on a receipt': db.select(Sales.id).where(Sales.receipt_id == 1),
+        'stock movements of a product in a date range': db.select(StockTransaction.id)
+            .where(StockTransaction.product_id == 1, StockTransaction.date_of_transaction >= since),
+        'stock movements in a date range': db.select(StockTransaction.id)
+            .where(StockTransaction.date_of_transaction >= since),
+        'archived sales in a date range': db.select(ArchivedSales.id).where(ArchivedSales.date_of_sale >= since),
+        'archived stock movements of a product in a date range': db.select(ArchivedStockTransaction.quantity)
+            .where(ArchivedStockTransaction.product_id == 1, ArchivedStockTransaction.date_of_transaction >= since),
+        'receipt of a sale': db.select(Receipt.id).where(Receipt.sale_id == 1),
+        'stock summary of a product': db.select(StockSummary.id).where(StockSummary.product_id == 1),
+        'products of a supplier': db.select(product_supplier.c.product_id).where(product_supplier.c.supplier_id == 1),
+        'product by sku': db.select(Product.id).where(Product.sku == 'SKU'),
+        'daily rollups of a product': db.select(SalesRollup.total_sales)
+            .where(SalesRollup.bucket == 'day', SalesRollup.product_id == 1, SalesRollup.bucket_start >= since),
+        'daily rollups of the catalog': db.select(SalesRollup.total_sales)
+            .where(SalesRollup.bucket == 'day', SalesRollup.bucket_start >= since),
+        'latest stock snapshot of a product': db.select(StockSnapshot.quantity_in_stock)
+            .where(StockSnapshot.product_id == 1, StockSnapshot.taken_at <= since)
+            .order_by(StockSnapshot.taken_at.desc()).limit(1),
+        'alerts of a product': db.select(db.func.max(LowStockAlert.created_at)).where(LowStockAlert.product_id == 1),
+        'open low stock alerts': db.select(LowStockAlert.id).where(LowStockAlert.resolved_at.is_(None)),
+    }
+
+def full_scans(connection, statement):
+    """Return the plan lines showing a full table scan for this statement, empty when every table is reached through an index."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        sql = str(statement.compile(dialect=sqlite.dialect(), compile_kwargs={'literal_binds': True}))
+        plan = [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+        #SCAN walks a whole table (or a whole index), SEARCH seeks into an index
+        return [line for line in plan if line.startswith('SCAN')]
+    if dialect == 'postgresql':
+        sql = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+        #small test tables make the planner prefer seq scans, ask whether it *could* avoid one
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        plan = [row[0] for row in connection.exec_driver_sql(f'EXPLAIN {sql}')]
+        return [line for line in plan if 'Seq Scan' in line]
+    raise RuntimeError(f"Query plan checks are not supported on {dialect}")
+
+def check_query_plans(connection):
+    """Map each hot query that falls back to a full scan to the offending plan lines."""
+    failures = {}
+    for name, statement in hot_queries().items():
+        scans = full_scans(connection, statement)
+        if scans:
+            failures[name] = scans
+    return failures
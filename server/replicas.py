@@ -0,0 +1,151 @@
+import time
+import random
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from functools import wraps
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, request
+from models import db, dialect_insert, ReplicaHeartbeat
+
+logger = logging.getLogger(__name__)
+
+#set after a write, requests carrying it read from the primary until the time it holds
+PIN_COOKIE = 'primary_until'
+
+class ReplicaRouter:
+    """Picks a read replica whose heartbeat is recent enough, or None to read from the primary."""
+
+    def __init__(self, primary, replicas, max_lag=5, check_seconds=1):
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_seconds = check_seconds
+        self.lags = {name: None for name in replicas}
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def beat(self):
+        now = datetime.utcnow()
+        with self.primary.begin() as connection:
+            insert = dialect_insert(connection)
+            connection.execute(insert(ReplicaHeartbeat).values(id=1, beat_at=now)
+                .on_conflict_do_update(index_elements=[ReplicaHeartbeat.id], set_={'beat_at': now}))
+
+    def lag(self, engine):
+        #seconds between now and the newest heartbeat the replica has, infinite when it can't be read
+        try:
+            with engine.connect() as connection:
+                beat_at = connection.scalar(db.select(ReplicaHeartbeat.beat_at).where(ReplicaHeartbeat.id == 1))
+        except Exception as error:
+            logger.warning('Replica lag check failed: %s', error)
+            return float('inf')
+        if beat_at is None:
+            return float('inf')
+        return max((datetime.utcnow() - beat_at).total_seconds(), 0.0)
+
+    def check(self):
+        """Touch the primary's heartbeat, then measure how far each replica is behind it."""
+        try:
+            self.beat()
+        except Exception as error:
+            logger.warning('Replica heartbeat failed: %s', error)
+        for name, engine in self.replicas.items():
+            lag = self.lag(engine)
+            if (lag > self.max_lag) != (self.lags[name] is not None and self.lags[name] > self.max_lag):
+                logger.warning('Replica %s is %s (lag %.1fs)', name, 'lagging' if lag > self.max_lag else 'back', lag)
+            self.lags[name] = lag
+        return self.lags
+
+    def pick(self):
+        #one thread re-checks every check_seconds, the others route on the last figures meanwhile
+        if (self._checked_at is None or time.monotonic() - self._checked_at >= self.check_seconds) \
+                and self._lock.acquire(blocking=self._checked_at is None):
+            try:
+                self.check()
+                self._checked_at = time.monotonic()
+            finally:
+                self._lock.release()
+        healthy = [name for name, lag in self.lags.items() if lag is not None and lag <= self.max_lag]
+        return self.replicas[random.choice(healthy)] if healthy else None
+
+    def stats(self):
+        return {
+            'max_lag_seconds': self.max_lag,
+            'replicas': {name: {'lag_seconds': None if lag is None else round(lag, 3),
+                                'healthy': lag is not None and lag <= self.max_lag}
+                         for name, lag in self.lags.items()},
+        }
+
+    def sync(self):
+        """The local copy step: a fresh heartbeat, then the primary SQLite file backed up over every replica file."""
+        if self.primary.dialect.name != 'sqlite' or any(engine.dialect.name != 'sqlite'
+                                                        for engine in self.replicas.values()):
+            raise RuntimeError('Only SQLite replicas can be synced by copying, use the database\'s own replication')
+        self.beat()
+        source = sqlite3.connect(self.primary.url.database)
+        try:
+            for engine in self.replicas.values():
+                target = sqlite3.connect(engine.url.database, timeout=30)
+                try:
+                    #the backup API takes a consistent snapshot, even with writers active in WAL mode
+                    source.backup(target)
+                finally:
+                    target.close()
+        finally:
+            source.close()
+
+def get_router():
+    return current_app.extensions.get('replicas') if has_app_context() else None
+
+def pinned_to_primary():
+    try:
+        return float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def replica_reads(fn):
+    """Lets the view's reads go to a healthy replica, unless this client wrote recently."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        router = get_router()
+        if router is not None and request.method in ('GET', 'HEAD') and not pinned_to_primary():
+            g.read_engine = router.pick()
+        return fn(*args, **kwargs)
+    return wrapper
+
+def read_engine():
+    """The engine this request reads from, for views that run core queries outside the session."""
+    return g.get('read_engine') or db.engine
+
+@contextmanager
+def on_primary():
+    #for reads whose result outlives the request, like cache fills, which a lagging replica must not plant
+    engine = g.pop('read_engine', None) if has_app_context() else None
+    try:
+        yield
+    finally:
+        if engine is not None:
+            g.read_engine = engine
+
+def pin_after_write(response):
+    #core writes on a bare connection() never pass through get_bind, any successful write method pins as well
+    wrote = g.get('wrote') or (request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400)
+    if wrote:
+        pin = current_app.config['REPLICA_PIN_SECONDS']
+        response.set_cookie(PIN_COOKIE, f'{time.time() + pin:.3f}', max_age=int(pin) + 1, httponly=True,
+                            samesite='Lax')
+    return response
+
+def init_replicas(app):
+    """Route reads of replica_reads views to the replica_* binds, None in app.extensions when there are none."""
+    with app.app_context():
+        replicas = {key: engine for key, engine in db.engines.items() if key and key.startswith('replica_')}
+        primary = db.engines[None]
+    if not replicas:
+        app.extensions['replicas'] = None
+        return
+    app.extensions['replicas'] = ReplicaRouter(primary, replicas, app.config['REPLICA_MAX_LAG_SECONDS'],
+                                               app.config['REPLICA_CHECK_SECONDS'])
+    app.after_request(pin_after_write)
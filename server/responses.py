@@ -0,0 +1,57 @@
+import gzip
+import logging
+from flask import current_app, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+def cache_control(response, resource):
+    policy = current_app.config['CACHE_CONTROL'].get(resource)
+    if policy:
+        response.headers['Cache-Control'] = policy
+    return response
+
+def versioned(resource, version, build):
+    """build()'s JSON tagged with the row version, or an empty 304 when If-None-Match already has that version."""
+    etag = str(version)
+    #a hit skips serializing the body altogether, the version comes straight from the cached row
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    return cache_control(response, resource)
+
+def compress(response):
+    encoders = current_app.extensions['compression']
+    if (not encoders or response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype != 'application/json'):
+        return response
+    #tagged single rows stay as they are so their ETag keeps meaning the same bytes for If-Match
+    if 'ETag' in response.headers or (response.content_length or 0) < current_app.config['COMPRESS_MIN_BYTES']:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(list(encoders))
+    if encoding is None:
+        return response
+    response.set_data(encoders[encoding](response.get_data()))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_responses(app):
+    """Compress large JSON responses with the best encoding the client accepts from COMPRESS_ALGORITHMS."""
+    level = app.config['COMPRESS_LEVEL']
+    encoders = {}
+    for algorithm in filter(None, (name.strip() for name in app.config['COMPRESS_ALGORITHMS'].split(','))):
+        if algorithm == 'br':
+            try:
+                import brotli
+            except ImportError:
+                logger.info('brotli is not installed, responses are only gzipped')
+                continue
+            encoders['br'] = lambda data: brotli.compress(data, quality=min(level, 11))
+        elif algorithm == 'gzip':
+            encoders['gzip'] = lambda data: gzip.compress(data, compresslevel=level, mtime=0)
+        else:
+            raise ValueError(f"Unknown compression algorithm '{algorithm}'")
+    app.extensions['compression'] = encoders
+    app.after_request(compress)
@@ -0,0 +1,335 @@
+import re
+import time
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from flask import current_app
+from datetime import datetime
+from sqlalchemy import event, inspect, text
+from models import db, Product, SearchChange, Supplier
+from replicas import on_primary
+
+KINDS = ('product', 'supplier')
+#ranking weight of a match in each field
+WEIGHTS = {'name': 10.0, 'sku': 5.0, 'description': 1.0}
+
+def tokens(value):
+    #same split as FTS5's default unicode61 tokenizer for ascii text
+    return re.findall(r'[a-z0-9]+', (value or '').lower())
+
+def field_weights(name, sku, description):
+    """{token: weight of the best field it appears in} for one product or supplier."""
+    weights = {}
+    for field, value in (('name', name), ('sku', sku), ('description', description)):
+        for token in tokens(value):
+            weights[token] = max(weights.get(token, 0.0), WEIGHTS[field])
+    return weights
+
+def score(weights, terms):
+    #earlier terms are whole words, the last one may still be half typed and counts double when complete
+    *words, last = terms
+    return (sum(weights.get(word, 0.0) for word in words) +
+            max((weight * (2.0 if token == last else 1.0) for token, weight in weights.items() if token.startswith(last)),
+                default=0.0))
+
+def sku_range(column, prefix):
+    #a range on the unique sku index, LIKE can't use it on SQLite
+    return db.and_(column >= prefix, column < prefix + '\uffff')
+
+#products live at even rowids and suppliers at odd ones, so triggers can address a row without a scan
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(name, sku, description, prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS products_search_insert AFTER INSERT ON products BEGIN "
+    "INSERT INTO search_index(rowid, name, sku, description) VALUES (new.id * 2, new.name, new.sku, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS products_search_update AFTER UPDATE OF name, sku, description ON products BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2; "
+    "INSERT INTO search_index(rowid, name, sku, description) VALUES (new.id * 2, new.name, new.sku, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS products_search_delete AFTER DELETE ON products BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER IF NOT EXISTS suppliers_search_insert AFTER INSERT ON suppliers BEGIN "
+    "INSERT INTO search_index(rowid, name) VALUES (new.id * 2 + 1, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS suppliers_search_update AFTER UPDATE OF name ON suppliers BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2 + 1; "
+    "INSERT INTO search_index(rowid, name) VALUES (new.id * 2 + 1, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS suppliers_search_delete AFTER DELETE ON suppliers BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2 + 1; END",
+)
+
+def rebuild_fts_index(connection):
+    """Create the FTS5 table and its triggers if missing, then repopulate it from products and suppliers."""
+    for statement in FTS_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("DELETE FROM search_index")
+    connection.exec_driver_sql("INSERT INTO search_index(rowid, name, sku, description) "
+                               "SELECT id * 2, name, sku, description FROM products")
+    connection.exec_driver_sql("INSERT INTO search_index(rowid, name) SELECT id * 2 + 1, name FROM suppliers")
+
+class FTSIndex:
+    """SQLite FTS5 search, the index lives in the database and triggers keep it current."""
+
+    def __init__(self, window=200):
+        self.window = window
+
+    def sku_prefix(self, prefix, limit):
+        rows = db.session.execute(db.select(Product.id, Product.name, Product.sku)
+            .where(db.or_(sku_range(Product.sku, prefix), sku_range(Product.sku, prefix.upper())))
+            .order_by(Product.sku)
+            .limit(limit)).all()
+        return [{'type': 'product', 'id': product_id, 'name': name, 'sku': sku}
+                for product_id, name, sku in rows]
+
+    def text_search(self, terms, limit, kinds):
+        *words, last = terms
+        match = ' '.join([f'"{word}"' for word in words] + [f'"{last}"*'])
+        parity = '' if len(kinds) == len(KINDS) else f" AND rowid % 2 = {KINDS.index(kinds[0])}"
+        #bm25() would read the full doclist of every common word, rank a window of matches in python instead
+        rows = db.session.execute(text(
+            f"SELECT rowid, name, sku, description FROM search_index WHERE search_index MATCH :match{parity} LIMIT :window"),
+            {'match': match, 'window': self.window}).all()
+        ranked = heapq.nlargest(limit, rows, key=lambda row: (score(field_weights(*row[1:]), terms), -row[0]))
+        return [dict({'type': KINDS[rowid % 2], 'id': rowid // 2, 'name': name},
+                     **({'sku': sku} if rowid % 2 == 0 else {}))
+                for rowid, name, sku, description in ranked]
+
+class PrefixIndex:
+    """In-memory token prefix index for databases without FTS5.
+
+    This process's commits are applied through session events as they happen. Every process's writes are also
+    logged to search_changes, and every ttl seconds the rows changed since the last look are read back.
+    """
+
+    def __init__(self, window=200, ttl=5, margin=100):
+        self.window = window
+        self.ttl = ttl
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+        self.loaded_at = None
+        #highest search_changes id already read
+        self.change_id = 0
+        self.documents = {}
+        self.postings = defaultdict(dict)
+        self.vocabulary = []
+        self.skus = []
+
+    def load(self):
+        if self.loaded_at is not None:
+            if self.ttl and time.monotonic() - self.loaded_at >= self.ttl:
+                self.refresh()
+            return
+        #the first load reads everything and blocks every search until it's done
+        with self._loading:
+            if self.loaded_at is not None:
+                return
+            #from the primary, like cache fills, a lagging replica would hold the index back
+            with on_primary():
+                #read before the tables, a change committed meanwhile is then read again by the first refresh
+                change_id = db.session.scalar(db.select(db.func.max(SearchChange.id))) or 0
+                for product_id, name, sku, description in db.session.execute(
+                        db.select(Product.id, Product.name, Product.sku, Product.description)):
+                    self._add(('product', product_id), name, sku, description, bulk=True)
+                for supplier_id, name in db.session.execute(db.select(Supplier.id, Supplier.name)):
+                    self._add(('supplier', supplier_id), name, None, None, bulk=True)
+            with self._lock:
+                self.vocabulary = sorted(self.postings)
+                self.skus.sort()
+                self.change_id = change_id
+                self.loaded_at = time.monotonic()
+
+    def refresh(self, chunk_size=500):
+        """Re-read the products and suppliers logged in search_changes since the last look, by any process."""
+        #one thread refreshes, the others keep searching the current copy meanwhile
+        if not self._loading.acquire(blocking=False):
+            return
+        try:
+            table = SearchChange.__table__
+            with on_primary():
+                #ids are handed out before commit, the last `margin` are read again for changes that committed late
+                rows = db.session.execute(db.select(table.c.id, table.c.kind, table.c.entity_id)
+                    .where(table.c.id > self.change_id - self.margin)).all()
+                changes = {(kind, entity_id): None for _, kind, entity_id in rows}
+                ids = {kind: sorted(entity_id for key_kind, entity_id in changes if key_kind == kind) for kind in KINDS}
+                for start in range(0, len(ids['product']), chunk_size):
+                    for product_id, name, sku, description in db.session.execute(
+                            db.select(Product.id, Product.name, Product.sku, Product.description)
+                            .where(Product.id.in_(ids['product'][start:start + chunk_size]))):
+                        changes[('product', product_id)] = (name, sku, description)
+                for start in range(0, len(ids['supplier']), chunk_size):
+                    for supplier_id, name in db.session.execute(db.select(Supplier.id, Supplier.name)
+                            .where(Supplier.id.in_(ids['supplier'][start:start + chunk_size]))):
+                        changes[('supplier', supplier_id)] = (name, None, None)
+            with self._lock:
+                self._apply(changes)
+                self.change_id = max([self.change_id] + [change_id for change_id, _, _ in rows])
+                self.loaded_at = time.monotonic()
+        finally:
+            self._loading.release()
+
+    def apply(self, changes):
+        """Apply {(kind, id): (name, sku, description) or None for deleted} from a commit."""
+        with self._lock:
+            #before the first load there is nothing to update, the load reads the committed rows
+            if self.loaded_at is not None:
+                self._apply(changes)
+
+    def _apply(self, changes):
+        for key, fields in changes.items():
+            self._remove(key)
+            if fields is not None:
+                self._add(key, *fields)
+
+    def _add(self, key, name, sku, description, bulk=False):
+        weights = field_weights(name, sku, description)
+        for token, weight in weights.items():
+            if token not in self.postings and not bulk:
+                insort(self.vocabulary, token)
+            self.postings[token][key] = weight
+        self.documents[key] = (name, sku, weights)
+        if sku is not None:
+            entry = (sku.lower(), key[1])
+            if bulk:
+                self.skus.append(entry)
+            else:
+                insort(self.skus, entry)
+
+    def _remove(self, key):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        name, sku, document_tokens = document
+        for token in document_tokens:
+            postings = self.postings[token]
+            postings.pop(key, None)
+            if not postings:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+        if sku is not None:
+            del self.skus[bisect_left(self.skus, (sku.lower(), key[1]))]
+
+    def _result(self, key):
+        name, sku, _ = self.documents[key]
+        return dict({'type': key[0], 'id': key[1], 'name': name}, **({'sku': sku} if sku is not None else {}))
+
+    def sku_prefix(self, prefix, limit):
+        self.load()
+        prefix = prefix.lower()
+        with self._lock:
+            start = bisect_left(self.skus, (prefix,))
+            keys = []
+            for sku, product_id in self.skus[start:start + limit]:
+                if not sku.startswith(prefix):
+                    break
+                keys.append(('product', product_id))
+            return [self._result(key) for key in keys]
+
+    def _expand(self, prefix):
+        #the indexed tokens starting with prefix, at most a window of them
+        expanded = []
+        for position in range(bisect_left(self.vocabulary, prefix), len(self.vocabulary)):
+            token = self.vocabulary[position]
+            if not token.startswith(prefix) or len(expanded) == self.window:
+                break
+            expanded.append(token)
+        return expanded
+
+    def text_search(self, terms, limit, kinds):
+        self.load()
+        *words, last = terms
+        with self._lock:
+            #walk the postings of the rarest term and check each document's own tokens for the rest,
+            #stopping after a window of candidates like the FTS5 path does
+            choices = [[word] for word in words] + [self._expand(last)]
+            driver = min(choices, key=lambda choice: sum(len(self.postings.get(token, ())) for token in choice))
+            candidates = {}
+            for token in driver:
+                for key in self.postings.get(token, ()):
+                    if len(candidates) == self.window:
+                        break
+                    weights = self.documents[key][2]
+                    if key[0] in kinds and key not in candidates and all(word in weights for word in words) \
+                            and any(candidate.startswith(last) for candidate in weights):
+                        candidates[key] = score(weights, terms)
+            best = heapq.nlargest(limit, candidates.items(), key=lambda item: (item[1], -item[0][1]))
+            return [self._result(key) for key, _ in best]
+
+def get_index():
+    return current_app.extensions['search']
+
+def search(q, limit, kinds=KINDS):
+    """SKU prefix matches first, then full text matches ranked by field weight."""
+    index = get_index()
+    q = q.strip()
+    results = index.sku_prefix(q, limit) if 'product' in kinds and q else []
+    #a word that prefixes a sku may also be the start of a name, text matches fill the rest of the page
+    terms = tokens(q)
+    if terms and len(results) < limit:
+        seen = {(result['type'], result['id']) for result in results}
+        for result in index.text_search(terms, limit, kinds):
+            if (result['type'], result['id']) not in seen:
+                results.append(result)
+    return results[:limit]
+
+def include_object(object, name, type_, reflected, compare_to):
+    #keep autogenerate from dropping the FTS5 table and its shadow tables, they are not in the models
+    return not (type_ == 'table' and reflected and compare_to is None and name.startswith('search_index'))
+
+def init_search(app):
+    backend = app.config['SEARCH_BACKEND']
+    if backend == 'auto':
+        backend = 'fts5' if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') else 'memory'
+    if backend == 'fts5':
+        app.extensions['search'] = FTSIndex(window=app.config['SEARCH_RANK_WINDOW'])
+    elif backend == 'memory':
+        app.extensions['search'] = PrefixIndex(window=app.config['SEARCH_RANK_WINDOW'],
+                                               ttl=app.config['SEARCH_INDEX_TTL_SECONDS'],
+                                               margin=app.config['SEARCH_CHANGES_MARGIN'])
+    else:
+        raise ValueError(f"Unknown SEARCH_BACKEND '{backend}'")
+
+def record_changes(session, changes):
+    #logged in the writer's transaction for the other processes' indexes, and kept to apply locally on commit
+    connection = session.connection()
+    connection.execute(SearchChange.__table__.insert(), [{'kind': kind, 'entity_id': entity_id, 'changed_at': datetime.utcnow()}
+                                                         for kind, entity_id in changes])
+    session.info.setdefault('search_changes', {}).update(changes)
+
+def index_after_commit(session, kind, documents):
+    #for core statements, {id: (name, sku, description)} to put into the in-memory index once committed
+    if isinstance(current_app.extensions.get('search'), PrefixIndex) and documents:
+        record_changes(session, {(kind, entity_id): fields for entity_id, fields in documents.items()})
+
+def _fields(obj):
+    if isinstance(obj, Product):
+        return obj.name, obj.sku, obj.description
+    return obj.name, None, None
+
+def _searchable_changed(obj):
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in ('name', 'sku', 'description') if field in state.attrs)
+
+@event.listens_for(db.session, 'after_flush')
+def collect_search_changes(session, flush_context):
+    if not isinstance(current_app.extensions.get('search'), PrefixIndex):
+        return
+    changes = {}
+    for obj in session.new | session.dirty:
+        if isinstance(obj, (Product, Supplier)) and obj not in session.deleted \
+                and (obj in session.new or _searchable_changed(obj)):
+            changes[('product' if isinstance(obj, Product) else 'supplier', obj.id)] = _fields(obj)
+    for obj in session.deleted:
+        if isinstance(obj, (Product, Supplier)):
+            changes[('product' if isinstance(obj, Product) else 'supplier', obj.id)] = None
+    if changes:
+        record_changes(session, changes)
+
+@event.listens_for(db.session, 'after_commit')
+def apply_search_changes(session):
+    changes = session.info.pop('search_changes', None)
+    index = current_app.extensions.get('search')
+    if changes and isinstance(index, PrefixIndex):
+        index.apply(changes)
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_search_changes(session):
+    session.info.pop('search_changes', None)
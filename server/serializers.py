@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+from flask.json.provider import DefaultJSONProvider
+from models import db
+
+DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MONTHS = (None, 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+def http_date(value):
+    #the same 'Sat, 18 Oct 2025 03:52:29 GMT' werkzeug writes, without going through email.utils
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return (f'{DAYS[value.weekday()]}, {value.day:02d} {MONTHS[value.month]} {value.year:04d} '
+            f'{value.hour:02d}:{value.minute:02d}:{value.second:02d} GMT')
+
+def default(value):
+    if isinstance(value, datetime):
+        return http_date(value)
+    return DefaultJSONProvider.default(value)
+
+class ModelSerializer:
+    """Column accessors for one model and field list, compiled once and reused for every row."""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.columns = tuple(getattr(model, field) for field in fields)
+
+    def select(self, *extra):
+        return db.select(*self.columns, *extra)
+
+    def row(self, row):
+        return dict(zip(self.fields, row))
+
+    def rows(self, rows, *extra):
+        #straight from Row tuples, nothing is hydrated into ORM objects, extra names any columns selected after ours
+        keys = self.fields + extra
+        return [dict(zip(keys, row)) for row in rows]
+
+@lru_cache(maxsize=256)
+def serializer(model, fields=None):
+    """The shared serializer for model's COLUMNS, or for a tuple of fields."""
+    return ModelSerializer(model, tuple(fields or model.COLUMNS))
+
+def load_row(model, fields, entity_id):
+    """One row's fields as a dict, read without building the ORM object, None when it doesn't exist."""
+    columns = serializer(model, fields)
+    row = db.session.execute(columns.select().where(model.id == entity_id)).first()
+    return columns.row(row) if row is not None else None
+
+def row_dicts(rows):
+    #for hand written selects, keyed by their column labels
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's encoder with a faster date formatter."""
+    default = staticmethod(default)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Encodes with orjson, producing the same JSON as the default provider (non-ASCII text is left unescaped)."""
+    default = staticmethod(default)
+
+    def __init__(self, app):
+        super().__init__(app)
+        import orjson
+        self._orjson = orjson
+        #datetimes are handed to default() so they keep the HTTP date format clients already parse
+        self._options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SORT_KEYS
+
+    def _dumps(self, obj, indent=False):
+        try:
+            return self._orjson.dumps(obj, default=self.default,
+                                      option=self._options | (self._orjson.OPT_INDENT_2 if indent else 0))
+        except self._orjson.JSONEncodeError:
+            #orjson sorts non-string keys as text, json sorts them before converting, so those go the slow way
+            return super().dumps(obj, **({'indent': 2} if indent else {'separators': (',', ':')})).encode()
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps(obj, indent='indent' in kwargs).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._dumps(obj, indent) + b'\n', mimetype=self.mimetype)
+
+def init_serializers(app):
+    """Pick the JSON encoder, JSON_BACKEND auto uses orjson whenever it is installed."""
+    backend = app.config['JSON_BACKEND']
+    if backend == 'auto':
+        try:
+            import orjson  # noqa: F401
+            backend = 'orjson'
+        except ImportError:
+            backend = 'json'
+    if backend == 'orjson':
+        app.json = OrjsonProvider(app)
+    elif backend == 'json':
+        app.json = JSONProvider(app)
+    else:
+        raise ValueError(f"Unknown JSON_BACKEND '{backend}'")
@@ -0,0 +1,5 @@
+#production entry point: gunicorn -c gunicorn.conf.py serve:app
+from app import create_app
+from config import ProductionConfig
+
+app = create_app(ProductionConfig)
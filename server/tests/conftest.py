@@ -0,0 +1,63 @@
+import datetime
+import jwt
+import pytest
+from app import create_app
+from benchmarks.common import bench_config
+from models import db, User
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build an app on a fresh SQLite file in tmp_path, config overrides as keyword arguments."""
+    apps = []
+    def make(**overrides):
+        #jobs run on the test's own thread through run_jobs, search uses the in-memory index since create_all skips FTS
+        settings = dict(TESTING=True, JOBS_WORKERS=0, ALERTS_INTERVAL_SECONDS=0, SEARCH_BACKEND='memory',
+                        AUTH_POOL_WORKERS=0, BCRYPT_LOG_ROUNDS=4)
+        settings.update(overrides)
+        app = create_app(bench_config(f"sqlite:///{tmp_path / f'inventory{len(apps)}.db'}", **settings))
+        with app.app_context():
+            db.create_all(bind_key=None)
+        apps.append(app)
+        return app
+    yield make
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers(app):
+    with app.app_context():
+        user = User(name='tester', email='tester@gmail.com', phone_number='0712345678', password_hash='unused')
+        db.session.add(user)
+        db.session.commit()
+        token = jwt.encode({'user_id': user.id, 'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=30)},
+                           app.config['SECRET_KEY'], algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture
+def make_product(client):
+    """POST a product and return its id."""
+    count = 0
+    def make(quantity_in_stock=10, price=2.0, reorder_point=None):
+        nonlocal count
+        count += 1
+        response = client.post('/products', json={
+            'name': f'Product {count}', 'sku': f'SKU-{count}', 'description': 'A test product', 'price': price,
+            'quantity_in_stock': quantity_in_stock, 'reorder_point': reorder_point, 'supplier': []})
+        assert response.status_code == 201
+        return count
+    return make
+
+def run_jobs(app):
+    with app.app_context():
+        return app.extensions['job_queue'].run_pending()
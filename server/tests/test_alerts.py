@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from alerts import evaluate_low_stock
+from conftest import run_jobs
+from models import db, Job, LowStockAlert
+
+def evaluate(app, now):
+    with app.app_context(), db.engine.begin() as connection:
+        return evaluate_low_stock(connection, debounce_seconds=3600, now=now)
+
+def open_alerts(app, product_id):
+    with app.app_context():
+        return LowStockAlert.query.filter_by(product_id=product_id, resolved_at=None).count()
+
+def test_debounced_product_is_rechecked_after_the_window(app, client, make_product):
+    product_id = make_product(quantity_in_stock=10, reorder_point=3)
+    now = datetime.utcnow()
+    client.post(f'/products/{product_id}/adjust-stock', json={'delta': -8})
+    assert evaluate(app, now)['raised'] == 1
+    client.post(f'/products/{product_id}/adjust-stock', json={'delta': 8})
+    assert evaluate(app, now + timedelta(minutes=1))['resolved'] == 1
+
+    #back under the reorder point inside the window: held back, not forgotten
+    client.post(f'/products/{product_id}/adjust-stock', json={'delta': -9})
+    assert evaluate(app, now + timedelta(minutes=2))['deferred'] == 1
+    assert open_alerts(app, product_id) == 0
+
+    #nothing touches the product again, the retry alone brings it back
+    report = evaluate(app, now + timedelta(hours=2))
+    assert report['raised'] == 1
+    assert open_alerts(app, product_id) == 1
+
+def test_reorder_point_edit_is_evaluated(app, client, make_product):
+    product_id = make_product(quantity_in_stock=5)
+    run_jobs(app)
+    evaluate(app, datetime.utcnow())
+
+    response = client.patch(f'/products/{product_id}', json={'reorder_point': 6})
+    assert response.status_code == 200
+    run_jobs(app)
+    assert open_alerts(app, product_id) == 1
+
+def test_product_ids_job_is_retried_when_the_watermark_moves(app, client, make_product, monkeypatch):
+    import jobs
+    from alerts import WatermarkMoved
+    product_id = make_product(quantity_in_stock=5)
+    run_jobs(app)
+    evaluate(app, datetime.utcnow())
+
+    evaluate_low_stock = jobs.evaluate_low_stock
+    def collide_once(*args, **kwargs):
+        monkeypatch.setattr(jobs, 'evaluate_low_stock', evaluate_low_stock)
+        raise WatermarkMoved('sales')
+    monkeypatch.setattr(jobs, 'evaluate_low_stock', collide_once)
+    assert client.patch(f'/products/{product_id}', json={'reorder_point': 6}).status_code == 200
+
+    with app.app_context():
+        queue = app.extensions['job_queue']
+        queue.backoff_seconds = 0
+        queue.run_pending()
+        assert Job.query.filter_by(kind='evaluate_alerts').one().status == 'done'
+        assert Job.query.filter_by(kind='evaluate_alerts').one().attempts == 2
+    assert open_alerts(app, product_id) == 1
@@ -0,0 +1,11 @@
+def test_invalid_product_id_is_rejected(client):
+    response = client.get('/analytics/sales?product_id=abc')
+    assert response.status_code == 400
+
+def test_product_id_filters_the_series(client, make_product):
+    first, second = make_product(), make_product()
+    for product_id in (first, second):
+        assert client.post('/sales', json={'product_id': product_id, 'name': 'Product', 'quantity_sold': 1,
+                                           'total_price': 2.0}).status_code == 201
+    series = client.get(f'/analytics/sales?bucket=hour&product_id={first}').get_json()
+    assert sum(point['sale_count'] for point in series['series']) == 1
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from archive import archive_history
+from conftest import run_jobs
+from export import iter_rows
+from models import db, Product, Sales, StockSummary, StockTransaction
+
+def snapshot(app, client, product_id, sale_ids, as_of):
+    """Every read that archiving must leave unchanged."""
+    with app.app_context():
+        summary = StockSummary.query.filter_by(product_id=product_id).one()
+        return {
+            'levels': [tuple(row) for row in Product.stock_levels()],
+            'summary': (summary.total_stock_value, summary.total_sold_value, summary.total_unsold_value),
+            'sales': [client.get(f'/sales/{sale_id}').get_json() for sale_id in sale_ids],
+            'as_of': client.get(f'/products/{product_id}/stock?as_of={as_of.isoformat()}').get_json()['quantity_in_stock'],
+            'now': client.get(f'/products/{product_id}/stock').get_json()['quantity_in_stock'],
+            'exports': {name: [tuple(row) for partition in iter_rows(db.engine, name, None, None, 100) for row in partition]
+                        for name in ('sales', 'stock-transactions')},
+            'rollups': client.get(f'/analytics/sales?product_id={product_id}&from=2000-01-01').get_json()['series'],
+        }
+
+def test_archived_history_reads_the_same(app, client, make_product):
+    product_id = make_product(quantity_in_stock=50)
+    old, recent = datetime.utcnow() - timedelta(days=400), datetime.utcnow() - timedelta(days=2)
+    with app.app_context():
+        #a restock dated in the past, added through the session so it moves the product too
+        db.session.add(StockTransaction(product_id=product_id, quantity=10, date_of_transaction=old,
+                                        transaction_type='restock'))
+        db.session.commit()
+    for date_of_sale, quantity in ((old, 3), (old + timedelta(days=1), 2), (recent, 4)):
+        response = client.post('/sales', json={'product_id': product_id, 'name': 'Product 1', 'quantity_sold': quantity,
+                                               'total_price': 2.0 * quantity, 'date_of_sale': date_of_sale.isoformat()})
+        assert response.status_code == 201
+    run_jobs(app)
+    with app.app_context():
+        sale_ids = db.session.scalars(db.select(Sales.id).order_by(Sales.id)).all()
+
+    as_of = old + timedelta(days=2)
+    before = snapshot(app, client, product_id, sale_ids, as_of)
+    with app.app_context():
+        moved = archive_history(db.engine, datetime.utcnow() - timedelta(days=365), batch_size=1)
+        assert moved == {'sales': 2, 'stock_transactions': 1}
+        assert db.session.scalar(db.select(db.func.count()).select_from(Sales)) == 1
+    #the archived sales are looked up again rather than served from entries cached before the move
+    app.extensions['cache'].clear()
+    after = snapshot(app, client, product_id, sale_ids, as_of)
+    assert after == before
+
+    #a second run finds nothing left to move, and a new sale still lands on top of the carried totals
+    with app.app_context():
+        assert archive_history(db.engine, datetime.utcnow() - timedelta(days=365)) == {'sales': 0, 'stock_transactions': 0}
+    assert client.post('/sales', json={'product_id': product_id, 'name': 'Product 1', 'quantity_sold': 1,
+                                       'total_price': 2.0}).status_code == 201
+    run_jobs(app)
+    levels = client.get('/products/stock-levels').get_json()['stock_levels']
+    assert [(level['quantity_sold'], level['quantity_in_stock']) for level in levels] == [(10, 50)]
+
+def test_archive_command_keeps_products_with_archived_sales(app, client, make_product):
+    product_id = make_product(quantity_in_stock=5)
+    old = datetime.utcnow() - timedelta(days=100)
+    assert client.post('/sales', json={'product_id': product_id, 'name': 'Product 1', 'quantity_sold': 1,
+                                       'total_price': 2.0, 'date_of_sale': old.isoformat()}).status_code == 201
+    run_jobs(app)
+
+    result = app.test_cli_runner().invoke(args=['archive-history', '--days', '30'])
+    assert result.exit_code == 0, result.output
+    assert 'Archived 1 sales' in result.output
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).select_from(Sales)) == 0
+    #the sale only lives in the archive now, it still blocks deleting the product
+    assert client.delete(f'/products/{product_id}').status_code == 409
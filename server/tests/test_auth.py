@@ -0,0 +1,61 @@
+import threading
+import time
+import auth
+from auth import TokenCache
+
+SIGNUP = {'name': 'alice', 'email': 'alice@gmail.com', 'phone_number': '0712345678', 'password_hash': 'secret123'}
+
+def test_signup_and_login_hash_on_the_pool(make_app):
+    client = make_app(AUTH_POOL_WORKERS=1).test_client()
+    assert client.post('/auth/signup', json=SIGNUP).status_code == 201
+    response = client.post('/auth/login', json={'email': SIGNUP['email'], 'password_hash': SIGNUP['password_hash']})
+    assert response.status_code == 200
+    assert client.post('/auth/login', json={'email': SIGNUP['email'], 'password_hash': 'wrong1234'}).status_code == 401
+
+def test_full_pool_sheds_signups_with_429(make_app):
+    app = make_app(AUTH_POOL_WORKERS=1, AUTH_POOL_MAX_PENDING=1)
+    release = threading.Event()
+    #another sign-in holds the only slot
+    busy = threading.Thread(target=app.extensions['hash_pool'].run, args=(release.wait,))
+    busy.start()
+    try:
+        time.sleep(0.05)
+        response = app.test_client().post('/auth/signup', json=SIGNUP)
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '1'
+    finally:
+        release.set()
+        busy.join()
+    assert app.test_client().post('/auth/signup', json=SIGNUP).status_code == 201
+
+def test_slow_hash_times_out_with_503(make_app, monkeypatch):
+    app = make_app(AUTH_POOL_WORKERS=1, AUTH_HASH_TIMEOUT=0.05)
+    release = threading.Event()
+    monkeypatch.setattr(auth, '_hash_password', lambda password, rounds: release.wait())
+    try:
+        response = app.test_client().post('/auth/signup', json=SIGNUP)
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+    finally:
+        release.set()
+
+def test_token_cache_drops_expired_and_least_recent_tokens():
+    cache = TokenCache(maxsize=2)
+    cache.set('expired', {'id': 1}, time.time() - 1)
+    assert cache.get('expired') is None
+
+    cache.set('a', {'id': 1}, time.time() + 60)
+    cache.set('b', {'id': 2}, time.time() + 60)
+    assert cache.get('a') == {'id': 1}
+    #b is now the least recently used
+    cache.set('c', {'id': 3}, time.time() + 60)
+    assert cache.get('b') is None
+    assert cache.get('a') == {'id': 1}
+    assert cache.get('c') == {'id': 3}
+
+def test_cached_token_skips_the_user_lookup(app, client, auth_headers, monkeypatch):
+    assert client.post('/checkout', json={'items': []}, headers=auth_headers).status_code == 400
+    #a deleted user keeps working until the token expires, the cache is keyed on the token alone
+    monkeypatch.setattr(auth.db.session, 'get', lambda *args: None)
+    assert client.post('/checkout', json={'items': []}, headers=auth_headers).status_code == 400
+    assert client.post('/checkout', json={'items': []}, headers={'Authorization': 'Bearer nope'}).status_code == 401
@@ -0,0 +1,20 @@
+from app import ProductResource
+from cache import MISSING, cached, get_cache
+from models import db, Product
+
+def test_fill_racing_a_write_is_dropped(app, make_product):
+    product_id = make_product()
+    with app.test_request_context():
+        def load_then_write(product_id):
+            value = ProductResource.load(product_id)
+            #another worker commits and invalidates after the load but before the fill is stored
+            with db.engine.begin() as connection:
+                connection.execute(db.update(Product).where(Product.id == product_id)
+                                   .values(price=3.0, version_id=Product.version_id + 1))
+            get_cache().delete(f'product:{product_id}')
+            return value
+
+        stale = cached('product', product_id, load_then_write)
+        assert stale['price'] == 2.0
+        assert get_cache().get(f'product:{product_id}') is MISSING
+        assert cached('product', product_id, ProductResource.load)['price'] == 3.0
@@ -0,0 +1,33 @@
+from conftest import run_jobs
+
+def test_checkout_is_all_or_nothing(app, client, auth_headers, make_product):
+    plenty, scarce = make_product(quantity_in_stock=10), make_product(quantity_in_stock=1)
+    items = [{'product_id': plenty, 'quantity': 2}, {'product_id': scarce, 'quantity': 2}]
+    assert client.post('/checkout', json={'items': items}, headers=auth_headers).status_code == 409
+    assert client.get(f'/products/{plenty}').get_json()['quantity_in_stock'] == 10
+
+    assert client.post('/checkout', json={'items': items}).status_code == 401
+    assert client.post('/checkout', json={'items': [{'product_id': 999, 'quantity': 1}]},
+                       headers=auth_headers).status_code == 404
+
+    response = client.post('/checkout', json={'items': items[:1]}, headers=auth_headers)
+    assert response.status_code == 201
+    run_jobs(app)
+    receipt = client.get(f"/receipts/{response.get_json()['receipt']['id']}").get_json()
+    assert receipt['total_amount'] == 4.0
+    assert 'Total  4.00' in receipt['rendered']
+
+def test_checkout_writes_one_sale_per_product_under_one_receipt(app, client, auth_headers, make_product):
+    first, second = make_product(price=2.0), make_product(price=5.0)
+    items = [{'product_id': first, 'quantity': 1}, {'product_id': second, 'quantity': 2}, {'product_id': first, 'quantity': 1}]
+    response = client.post('/checkout', json={'items': items}, headers=auth_headers)
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['receipt']['total_amount'] == 14.0
+
+    #repeated products are folded into one line
+    sales = [client.get(f'/sales/{sale_id}').get_json() for sale_id in body['sale_ids']]
+    assert [(sale['product_id'], sale['quantity_sold'], sale['total_price']) for sale in sales] == [(first, 2, 4.0), (second, 2, 10.0)]
+    assert {sale['receipt_id'] for sale in sales} == {body['receipt']['id']}
+    assert client.post('/checkout', json={'items': [{'product_id': first, 'quantity': 0}]},
+                       headers=auth_headers).status_code == 400
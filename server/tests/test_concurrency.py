@@ -0,0 +1,30 @@
+def etag(response):
+    return response.headers['ETag'].strip('"')
+
+def test_patch_and_delete_with_stale_if_match_fail(client, make_product):
+    product_id = make_product()
+    stale = etag(client.get(f'/products/{product_id}'))
+    response = client.patch(f'/products/{product_id}', json={'price': 3.0}, headers={'If-Match': f'"{stale}"'})
+    assert response.status_code == 200
+    current = etag(response)
+    assert current != stale
+
+    assert client.patch(f'/products/{product_id}', json={'price': 4.0},
+                        headers={'If-Match': f'"{stale}"'}).status_code == 412
+    assert client.delete(f'/products/{product_id}', headers={'If-Match': f'"{stale}"'}).status_code == 412
+    assert client.get(f'/products/{product_id}').get_json()['price'] == 3.0
+    assert client.delete(f'/products/{product_id}', headers={'If-Match': f'"{current}"'}).status_code == 200
+
+def test_adjust_stock_conflicts(client, make_product):
+    product_id = make_product(quantity_in_stock=5)
+    version = etag(client.get(f'/products/{product_id}'))
+
+    response = client.post(f'/products/{product_id}/adjust-stock', json={'delta': -6})
+    assert response.status_code == 409
+    response = client.post(f'/products/{product_id}/adjust-stock', json={'delta': -2}, headers={'If-Match': f'"{version}"'})
+    assert response.status_code == 200
+    assert response.get_json()['quantity_in_stock'] == 3
+    response = client.post(f'/products/{product_id}/adjust-stock', json={'delta': 1}, headers={'If-Match': f'"{version}"'})
+    assert response.status_code == 412
+    assert client.post('/products/999/adjust-stock', json={'delta': 1}).status_code == 404
+    assert client.post(f'/products/{product_id}/adjust-stock', json={'delta': 0}).status_code == 400
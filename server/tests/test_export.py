@@ -0,0 +1,58 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+def record_sales(client, product_id, dates):
+    for day in dates:
+        assert client.post('/sales', json={'product_id': product_id, 'name': 'Product 1', 'quantity_sold': 1,
+                                           'total_price': 2.0, 'date_of_sale': day.isoformat()}).status_code == 201
+
+def test_sales_export_as_csv_and_ndjson(app, client, make_product):
+    product_id = make_product()
+    start = datetime(2024, 1, 1)
+    record_sales(client, product_id, [start + timedelta(days=day) for day in (2, 0, 1)])
+
+    response = client.get('/export/sales')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=sales.csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    #ordered by date, not by id
+    assert [row['id'] for row in rows] == ['2', '3', '1']
+    assert rows[0]['date_of_sale'] == '2024-01-01T00:00:00'
+
+    response = client.get('/export/sales?format=ndjson&from=2024-01-02&to=2024-01-03')
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line)['id'] for line in response.get_data(as_text=True).splitlines()] == [3]
+
+def test_export_streams_in_chunks_and_gzips(make_app):
+    app = make_app(EXPORT_CHUNK_SIZE=2)
+    client = app.test_client()
+    assert client.post('/products', json={'name': 'Product 1', 'sku': 'SKU-1', 'description': 'A widget', 'price': 1.0,
+                                          'quantity_in_stock': 10, 'supplier': []}).status_code == 201
+    record_sales(client, 1, [datetime(2024, 1, 1) + timedelta(hours=hour) for hour in range(5)])
+
+    response = client.get('/export/sales?gzip=true')
+    assert response.is_streamed
+    assert response.mimetype == 'application/gzip'
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.get_data()).decode())))
+    assert len(rows) == 5
+
+    #stock movements: the opening stock plus one sale each
+    lines = client.get('/export/stock-transactions?format=ndjson').get_data(as_text=True).splitlines()
+    assert [json.loads(line)['transaction_type'] for line in lines].count('sale') == 5
+
+def test_export_rejects_bad_arguments(client):
+    assert client.get('/export/receipts').status_code == 404
+    assert client.get('/export/sales?format=xml').status_code == 400
+    assert client.get('/export/sales?from=yesterday').status_code == 400
+
+def test_export_command_writes_a_file(app, client, make_product, tmp_path):
+    product_id = make_product()
+    record_sales(client, product_id, [datetime(2024, 1, 1)])
+    output = tmp_path / 'sales.ndjson'
+    result = app.test_cli_runner().invoke(args=['export', 'sales', '--format', 'ndjson', '--output', str(output)])
+    assert result.exit_code == 0, result.output
+    assert [json.loads(line)['product_id'] for line in output.read_text().splitlines()] == [product_id]
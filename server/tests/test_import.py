@@ -0,0 +1,56 @@
+import json
+from models import db, Product, StockSummary, StockTransaction
+
+def jsonl(*rows):
+    return '\n'.join(row if isinstance(row, str) else json.dumps(row) for row in rows)
+
+def product(sku, name=None, quantity_in_stock=5, price=2.0):
+    return {'name': name or f'Product {sku}', 'sku': sku, 'description': 'Imported', 'price': price,
+            'quantity_in_stock': quantity_in_stock}
+
+def test_bulk_import_upserts_on_sku(app, client, auth_headers):
+    response = client.post('/products/bulk', data=jsonl(product('A'), product('B')), headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json()['upserted'] == 2
+
+    #a second import updates in place and moves the ledger and summary by the difference
+    response = client.post('/products/bulk', data=jsonl(product('A', quantity_in_stock=8, price=3.0)), headers=auth_headers)
+    assert response.status_code == 200
+    with app.app_context():
+        imported = db.session.execute(db.select(Product.id, Product.quantity_in_stock, Product.price, Product.version_id)
+                                      .where(Product.sku == 'A')).one()
+        assert (imported.quantity_in_stock, imported.price, imported.version_id) == (8, 3.0, 2)
+        ledger = db.session.scalar(db.select(db.func.sum(StockTransaction.quantity))
+                                   .where(StockTransaction.product_id == imported.id))
+        assert ledger == 8
+        assert StockSummary.query.filter_by(product_id=imported.id).one().total_unsold_value == 24.0
+    #the upsert bypasses the session, the search index is told about the rows explicitly
+    assert [result['name'] for result in client.get('/search?q=product').get_json()['results']] == ['Product A', 'Product B']
+    assert client.post('/products/bulk', data=jsonl(product('C'))).status_code == 401
+
+def test_bulk_import_reports_bad_rows_with_207(app, client, auth_headers):
+    rows = jsonl(product('A'), '{not json', {'sku': 'B'}, product('C', quantity_in_stock=-1), product('D'))
+    response = client.post('/products/bulk', data=rows, headers=auth_headers)
+    assert response.status_code == 207
+    report = response.get_json()
+    assert (report['processed'], report['upserted']) == (5, 2)
+    assert [error['row'] for error in report['errors']] == [2, 3, 4]
+
+def test_constraint_error_is_retried_row_by_row(app, client, auth_headers):
+    assert client.post('/products/bulk', data=jsonl(product('A', name='Taken')), headers=auth_headers).status_code == 200
+    #B collides with A's unique name, the chunk fails and only B is reported after the row by row retry
+    rows = jsonl(product('B', name='Taken'), product('C'), product('D'))
+    response = client.post('/products/bulk', data=rows, headers=auth_headers)
+    assert response.status_code == 207
+    report = response.get_json()
+    assert report['upserted'] == 2
+    assert [error['row'] for error in report['errors']] == [1]
+    with app.app_context():
+        assert sorted(db.session.scalars(db.select(Product.sku))) == ['A', 'C', 'D']
+
+def test_csv_import(app, client, auth_headers):
+    data = 'name,sku,description,price,quantity_in_stock\nWidget,W-1,A widget,1.5,4\n'
+    response = client.post('/products/bulk?format=csv', data=data, headers=auth_headers)
+    assert response.status_code == 200
+    assert client.get('/products/1').get_json()['quantity_in_stock'] == 4
+    assert client.post('/products/bulk?format=xml', data=data, headers=auth_headers).status_code == 400
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+import jobs
+from jobs import enqueue
+from models import db, Job
+
+def flaky(failures):
+    calls = []
+    def run(payload):
+        calls.append(payload)
+        if len(calls) <= failures:
+            raise RuntimeError('boom')
+    return run, calls
+
+def job_state(app):
+    with app.app_context():
+        job = Job.query.one()
+        return job.status, job.attempts, job.last_error
+
+def test_failed_job_waits_out_its_backoff(app, monkeypatch):
+    run, calls = flaky(1)
+    monkeypatch.setitem(jobs.HANDLERS, 'flaky', run)
+    queue = app.extensions['job_queue']
+    with app.app_context():
+        enqueue(db.session, [('flaky', {'n': 1}, None)])
+        db.session.commit()
+        assert queue.run_pending() == 1
+    status, attempts, last_error = job_state(app)
+    assert (status, attempts) == ('pending', 1)
+    assert 'boom' in last_error
+
+    with app.app_context():
+        #still inside the backoff window, nothing is runnable
+        assert queue.run_pending() == 0
+        queue.backoff_seconds = 0
+        Job.query.update({'run_after': datetime.utcnow()})
+        db.session.commit()
+        assert queue.run_pending() == 1
+    assert job_state(app) == ('done', 2, None)
+    assert calls == [{'n': 1}, {'n': 1}]
+
+def test_job_fails_after_max_attempts(make_app, monkeypatch):
+    app = make_app(JOBS_MAX_ATTEMPTS=3, JOBS_RETRY_BACKOFF_SECONDS=0)
+    run, calls = flaky(10)
+    monkeypatch.setitem(jobs.HANDLERS, 'flaky', run)
+    with app.app_context():
+        enqueue(db.session, [('flaky', {}, None)])
+        db.session.commit()
+        assert app.extensions['job_queue'].run_pending() == 3
+        assert app.test_client().get('/jobs/stats').get_json()['failed'] == 1
+    assert job_state(app)[:2] == ('failed', 3)
+    assert len(calls) == 3
+
+def test_idempotency_key_queues_once(app, monkeypatch):
+    run, calls = flaky(0)
+    monkeypatch.setitem(jobs.HANDLERS, 'flaky', run)
+    with app.app_context():
+        enqueue(db.session, [('flaky', {'n': 1}, 'once'), ('flaky', {'n': 2}, None)])
+        enqueue(db.session, [('flaky', {'n': 3}, 'once')])
+        db.session.commit()
+        assert Job.query.count() == 2
+        assert app.extensions['job_queue'].run_pending() == 2
+        #the key stays taken once the job is done
+        enqueue(db.session, [('flaky', {'n': 4}, 'once')])
+        db.session.commit()
+        assert app.extensions['job_queue'].run_pending() == 0
+    assert calls == [{'n': 1}, {'n': 2}]
+
+def test_rolled_back_jobs_are_never_run(app, monkeypatch):
+    run, calls = flaky(0)
+    monkeypatch.setitem(jobs.HANDLERS, 'flaky', run)
+    with app.app_context():
+        enqueue(db.session, [('flaky', {}, None)])
+        db.session.rollback()
+        assert app.extensions['job_queue'].run_pending() == 0
+    assert calls == []
+
+def test_expired_lock_is_taken_over(app, monkeypatch):
+    run, calls = flaky(0)
+    monkeypatch.setitem(jobs.HANDLERS, 'flaky', run)
+    with app.app_context():
+        enqueue(db.session, [('flaky', {}, None)])
+        #a worker claimed it and died
+        Job.query.update({'status': 'running', 'attempts': 1, 'locked_until': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        assert app.extensions['job_queue'].run_pending() == 1
+    assert job_state(app) == ('done', 2, None)
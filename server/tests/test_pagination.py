@@ -0,0 +1,48 @@
+from app import encode_cursor
+from models import db, product_supplier
+
+def test_keyset_pages_cover_every_product_once(client, make_product):
+    for _ in range(5):
+        make_product()
+    seen, cursor = [], None
+    while True:
+        response = client.get('/products', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.get_json()
+        seen += [product['id'] for product in body['products']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert seen == [1, 2, 3, 4, 5]
+
+    #a product deleted between pages doesn't shift the next page
+    assert client.delete('/products/3').status_code == 200
+    page = client.get('/products', query_string={'limit': 2, 'cursor': encode_cursor(2)}).get_json()['products']
+    assert [product['id'] for product in page] == [4, 5]
+
+def test_fields_project_the_listing(client, make_product):
+    make_product(price=3.5)
+    products = client.get('/products?fields=sku,price').get_json()['products']
+    #id always comes back so the client can page and look rows up
+    assert products == [{'id': 1, 'sku': 'SKU-1', 'price': 3.5}]
+    assert client.get('/products?fields=sku,cost').status_code == 400
+
+def test_bad_cursor_and_limit_are_rejected_or_clamped(app, client, make_product):
+    for _ in range(3):
+        make_product()
+    assert client.get('/products?cursor=not-a-cursor').status_code == 400
+    assert client.get('/products?limit=ten').status_code == 400
+    assert len(client.get('/products?limit=0').get_json()['products']) == 1
+    app.config['PRODUCTS_MAX_PAGE_SIZE'] = 2
+    assert len(client.get('/products?limit=100').get_json()['products']) == 2
+
+def test_include_suppliers_embeds_each_products_suppliers(app, client, make_product):
+    first, second = make_product(), make_product()
+    assert client.post('/suppliers', json={'name': 'Acme', 'contact': 'acme@example.com'}).status_code == 201
+    with app.app_context():
+        db.session.execute(product_supplier.insert(), [{'product_id': first, 'supplier_id': 1}])
+        db.session.commit()
+    products = client.get('/products?include=suppliers&fields=name').get_json()['products']
+    assert [(product['id'], [supplier['name'] for supplier in product['suppliers']]) for product in products] == \
+        [(first, ['Acme']), (second, [])]
+    assert client.get('/products?include=receipts').status_code == 400
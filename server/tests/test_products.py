@@ -0,0 +1,22 @@
+from models import db, Product, StockTransaction
+
+def test_delete_product_with_sales_conflicts(app, client, make_product):
+    product_id = make_product(quantity_in_stock=5)
+    response = client.post('/sales', json={'product_id': product_id, 'name': 'Product 1', 'quantity_sold': 1,
+                                           'total_price': 2.0})
+    assert response.status_code == 201
+
+    response = client.delete(f'/products/{product_id}')
+    assert response.status_code == 409
+    with app.app_context():
+        assert db.session.get(Product, product_id) is not None
+
+def test_delete_product_without_sales_takes_its_ledger(app, client, make_product):
+    product_id = make_product(quantity_in_stock=5)
+    assert client.post(f'/products/{product_id}/adjust-stock', json={'delta': 2}).status_code == 200
+
+    response = client.delete(f'/products/{product_id}')
+    assert response.status_code == 200
+    with app.app_context():
+        assert db.session.get(Product, product_id) is None
+        assert StockTransaction.query.filter_by(product_id=product_id).count() == 0
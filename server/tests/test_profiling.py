@@ -0,0 +1,51 @@
+import re
+from models import db, product_supplier
+from profiling import RequestMetrics, statement_shape
+
+def test_server_timing_and_metrics(make_app):
+    app = make_app(PROFILING_ENABLED=True)
+    client = app.test_client()
+    response = client.get('/products')
+    assert response.status_code == 200
+    assert re.fullmatch(r'app;dur=[\d.]+, sql;dur=[\d.]+;desc="\d+ statements"', response.headers['Server-Timing'])
+
+    metrics = client.get('/metrics')
+    assert metrics.mimetype == 'text/plain'
+    text = metrics.get_data(as_text=True)
+    assert '# TYPE inventory_request_duration_seconds summary' in text
+    assert 'inventory_request_duration_seconds_count{endpoint="GET /products"} 1' in text
+    assert 'inventory_request_sql_statements{endpoint="GET /products",quantile="0.5"}' in text
+
+def test_profiling_is_off_by_default(client):
+    assert 'Server-Timing' not in client.get('/products').headers
+    assert client.get('/metrics').status_code == 404
+
+def test_repeated_statements_count_as_n_plus_one(make_app, caplog):
+    app = make_app(PROFILING_ENABLED=True, PROFILING_N_PLUS_ONE_THRESHOLD=1)
+    client = app.test_client()
+    assert client.post('/products', json={'name': 'Widget', 'sku': 'W-1', 'description': 'A widget', 'price': 1.0,
+                                          'quantity_in_stock': 1, 'supplier': []}).status_code == 201
+    for name in ('Acme', 'Globex'):
+        assert client.post('/suppliers', json={'name': name, 'contact': f'{name.lower()}@example.com'}).status_code == 201
+    with app.app_context():
+        db.session.execute(product_supplier.insert(), [{'product_id': 1, 'supplier_id': 1}, {'product_id': 1, 'supplier_id': 2}])
+        db.session.commit()
+
+    #each embedded supplier is its own cached lookup, two of the same SELECT
+    assert client.get('/products/1').status_code == 200
+    assert 'Possible N+1 in GET /products/<int:product_id>' in caplog.text
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'inventory_n_plus_one_requests_total{endpoint="GET /products/<int:product_id>"} 1' in text
+
+def test_statement_shape_folds_in_lists():
+    assert statement_shape('SELECT *\n  FROM products WHERE id IN (?, ?, ?)') == \
+        statement_shape('SELECT * FROM products WHERE id IN (?)') == 'SELECT * FROM products WHERE id IN (?)'
+
+def test_metrics_keep_a_rolling_window():
+    metrics = RequestMetrics(window=2)
+    for duration in (1.0, 2.0, 3.0):
+        metrics.record('GET /x', duration, 0.0, 1, False)
+    assert list(metrics.samples['GET /x']['duration']) == [2.0, 3.0]
+    #totals still count every request
+    assert metrics.totals['GET /x']['count'] == 3
+    assert RequestMetrics.quantile([], 0.5) == 0.0
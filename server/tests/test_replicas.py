@@ -0,0 +1,28 @@
+import pytest
+from replicas import PIN_COOKIE
+
+@pytest.fixture
+def replicated(make_app, tmp_path):
+    return make_app(CACHE_BACKEND='none', SQLALCHEMY_BINDS={'replica_0': f"sqlite:///{tmp_path / 'replica.db'}"})
+
+def set_cookie(response):
+    return next((header for header in response.headers.getlist('Set-Cookie') if header.startswith(PIN_COOKIE)), None)
+
+def test_stock_reads_go_to_the_replica_without_pinning(replicated):
+    writer, reader = replicated.test_client(), replicated.test_client()
+    response = writer.post('/products', json={'name': 'Widget', 'sku': 'W-1', 'description': 'A widget', 'price': 1.0,
+                                              'quantity_in_stock': 5, 'supplier': []})
+    assert set_cookie(response) is not None
+    with replicated.app_context():
+        replicated.extensions['replicas'].sync()
+
+    #the primary moves on, the replica still has the synced copy
+    assert writer.post('/products/1/adjust-stock', json={'delta': 3}).status_code == 200
+
+    response = reader.get('/products/1/stock')
+    assert response.status_code == 200
+    assert response.get_json()['quantity_in_stock'] == 5
+    assert set_cookie(response) is None
+
+    #the writer reads its own write from the primary
+    assert writer.get('/products/1/stock').get_json()['quantity_in_stock'] == 8
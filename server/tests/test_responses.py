@@ -0,0 +1,32 @@
+import gzip
+import json
+
+def test_get_with_current_etag_is_not_modified(client, make_product):
+    product_id = make_product()
+    response = client.get(f'/products/{product_id}')
+    assert response.status_code == 200
+
+    response = client.get(f'/products/{product_id}', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    client.patch(f'/products/{product_id}', json={'price': 3.0})
+    response = client.get(f'/products/{product_id}', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 200
+    assert response.get_json()['price'] == 3.0
+
+def test_large_lists_are_compressed_and_small_rows_are_not(client, make_product):
+    for _ in range(30):
+        make_product()
+    response = client.get('/products?limit=30', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.headers['Cache-Control'] == 'no-cache'
+    products = json.loads(gzip.decompress(response.data))['products']
+    assert len(products) == 30
+
+    #a single tagged row keeps its bytes so the ETag still names them
+    response = client.get('/products/1', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json()['name'] == 'Product 1'
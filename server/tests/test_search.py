@@ -0,0 +1,34 @@
+import time
+
+def test_memory_index_picks_up_other_processes_commits(make_app):
+    #two apps on one database stand in for two web workers
+    writer = make_app(SEARCH_INDEX_TTL_SECONDS=0.05)
+    reader = make_app(SEARCH_INDEX_TTL_SECONDS=0.05, SQLALCHEMY_DATABASE_URI=writer.config['SQLALCHEMY_DATABASE_URI'])
+    assert reader.test_client().get('/search?q=widget').get_json()['results'] == []
+
+    response = writer.test_client().post('/products', json={'name': 'Blue Widget', 'sku': 'BW-1', 'description': 'A widget',
+                                                            'price': 1.0, 'quantity_in_stock': 1, 'supplier': []})
+    assert response.status_code == 201
+    time.sleep(0.1)
+    results = reader.test_client().get('/search?q=widget').get_json()['results']
+    assert [result['name'] for result in results] == ['Blue Widget']
+
+    #renames and deletes reach the other index through the change log too
+    product_id = results[0]['id']
+    assert writer.test_client().patch(f'/products/{product_id}', json={'name': 'Red Gizmo'}).status_code == 200
+    time.sleep(0.1)
+    assert reader.test_client().get('/search?q=blue').get_json()['results'] == []
+    assert [result['name'] for result in reader.test_client().get('/search?q=giz').get_json()['results']] == ['Red Gizmo']
+
+    assert writer.test_client().delete(f'/products/{product_id}').status_code == 200
+    time.sleep(0.1)
+    assert reader.test_client().get('/search?q=giz').get_json()['results'] == []
+
+def test_sku_prefix_does_not_hide_name_matches(client):
+    response = client.post('/products', json={'name': 'Gadget', 'sku': 'WID-1', 'description': 'Not a widget by name',
+                                              'price': 1.0, 'quantity_in_stock': 1, 'supplier': []})
+    assert response.status_code == 201
+    assert client.post('/suppliers', json={'name': 'Acme widgets', 'contact': 'acme@example.com'}).status_code == 201
+
+    results = client.get('/search?q=wid').get_json()['results']
+    assert [(result['type'], result['name']) for result in results] == [('product', 'Gadget'), ('supplier', 'Acme widgets')]
@@ -0,0 +1,59 @@
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+import pytest
+from werkzeug.http import http_date as werkzeug_http_date
+from models import db, Product
+from serializers import JSONProvider, http_date, load_row, row_dicts, serializer
+
+PAYLOAD = {'b': 1, 'a': [1.5, None, True], 'when': datetime(2025, 10, 18, 3, 52, 29), 'price': Decimal('2.50'),
+           'id': uuid.UUID(int=1), 'nested': {'z': 'text', 'y': datetime(2024, 2, 29)}}
+
+def both_bodies(make_app, payload):
+    fast, plain = make_app(JSON_BACKEND='orjson'), make_app(JSON_BACKEND='json')
+    assert type(plain.json) is JSONProvider
+    bodies = []
+    for app in (fast, plain):
+        with app.app_context():
+            bodies.append(app.json.response(payload).get_data())
+    return bodies
+
+def test_http_date_matches_werkzeug():
+    for value in (datetime(2025, 10, 18, 3, 52, 29), datetime(2024, 2, 29, 23, 59, 59, 999999),
+                  datetime(2025, 1, 1, 2, 0, tzinfo=timezone(timedelta(hours=3)))):
+        assert http_date(value) == werkzeug_http_date(value)
+
+def test_orjson_provider_writes_the_same_bytes(make_app):
+    pytest.importorskip('orjson')
+    fast, plain = both_bodies(make_app, PAYLOAD)
+    assert fast == plain
+
+def test_orjson_provider_falls_back_for_non_string_keys(make_app):
+    pytest.importorskip('orjson')
+    #json sorts 3 before 10, orjson would sort them as text
+    fast, plain = both_bodies(make_app, {'by_id': {3: 'a', 10: 'b'}})
+    assert fast == plain == b'{"by_id":{"3":"a","10":"b"}}\n'
+
+def test_orjson_provider_leaves_non_ascii_unescaped(make_app):
+    pytest.importorskip('orjson')
+    fast, plain = both_bodies(make_app, {'name': 'Café'})
+    assert fast == '{"name":"Café"}\n'.encode()
+    assert json.loads(fast) == json.loads(plain)
+
+def test_unknown_backend_is_rejected(make_app):
+    with pytest.raises(ValueError):
+        make_app(JSON_BACKEND='simplejson')
+
+def test_serializers_read_rows_without_the_orm(app, make_product):
+    make_product(price=2.5)
+    assert serializer(Product) is serializer(Product)
+    with app.app_context():
+        row = load_row(Product, ('name', 'price'), 1)
+        assert row == {'name': 'Product 1', 'price': 2.5}
+        assert load_row(Product, ('name',), 99) is None
+        products = serializer(Product, ('id', 'sku'))
+        rows = db.session.execute(products.select(Product.price)).all()
+        assert products.rows(rows, 'price') == [{'id': 1, 'sku': 'SKU-1', 'price': 2.5}]
+        assert row_dicts(rows) == [{'id': 1, 'sku': 'SKU-1', 'price': 2.5}]
+        assert row_dicts([]) == []
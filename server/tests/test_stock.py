@@ -0,0 +1,85 @@
+from conftest import run_jobs
+from models import db, ArchivedTotals, Product, StockSummary, StockTransaction
+
+def stock_state(app, product_id):
+    """quantity_in_stock, the stock_levels row, the ledger balance and the summary values."""
+    with app.app_context():
+        product = db.session.get(Product, product_id)
+        level, = Product.stock_levels([product_id])
+        ledger = db.session.scalar(db.select(db.func.sum(StockTransaction.quantity))
+                                   .where(StockTransaction.product_id == product_id)) or 0
+        ledger += db.session.scalar(db.select(ArchivedTotals.carried(ArchivedTotals.stock_moved, product_id)))
+        summary = StockSummary.query.filter_by(product_id=product_id).one()
+        return {
+            'quantity_in_stock': product.quantity_in_stock,
+            'level_in_stock': level.quantity_in_stock,
+            'level_sold': level.quantity_sold,
+            'ledger': ledger,
+            'summary': (summary.total_stock_value, summary.total_sold_value, summary.total_unsold_value),
+            'price': product.price,
+        }
+
+def assert_consistent(state):
+    #one meaning of stock: units on hand, every view of it agrees and the summary values add up
+    assert state['level_in_stock'] == state['quantity_in_stock']
+    assert state['ledger'] == state['quantity_in_stock']
+    stock, sold, unsold = state['summary']
+    assert unsold == state['quantity_in_stock'] * state['price']
+    assert stock == unsold + sold
+
+def test_checkout_takes_units_off_once(app, client, auth_headers, make_product):
+    product_id = make_product(quantity_in_stock=10, price=2.0)
+    response = client.post('/checkout', json={'items': [{'product_id': product_id, 'quantity': 4}]}, headers=auth_headers)
+    assert response.status_code == 201
+    run_jobs(app)
+
+    state = stock_state(app, product_id)
+    assert state['quantity_in_stock'] == 6
+    assert state['level_sold'] == 4
+    assert state['summary'] == (20.0, 8.0, 12.0)
+    assert_consistent(state)
+
+def test_sale_and_checkout_agree(app, client, auth_headers, make_product):
+    product_id = make_product(quantity_in_stock=10, price=2.0)
+    response = client.post('/sales', json={'product_id': product_id, 'name': 'Product 1', 'quantity_sold': 3,
+                                           'total_price': 6.0})
+    assert response.status_code == 201
+    response = client.post('/checkout', json={'items': [{'product_id': product_id, 'quantity': 2}]}, headers=auth_headers)
+    assert response.status_code == 201
+    run_jobs(app)
+
+    state = stock_state(app, product_id)
+    assert state['quantity_in_stock'] == 5
+    assert state['level_sold'] == 5
+    assert_consistent(state)
+
+def test_sale_cannot_oversell(app, client, make_product):
+    product_id = make_product(quantity_in_stock=2)
+    response = client.post('/sales', json={'product_id': product_id, 'name': 'Product 1', 'quantity_sold': 3,
+                                           'total_price': 6.0})
+    assert response.status_code == 409
+    run_jobs(app)
+    state = stock_state(app, product_id)
+    assert state['quantity_in_stock'] == 2
+    assert state['level_sold'] == 0
+    assert_consistent(state)
+
+def test_every_stock_path_keeps_the_ledger_and_summary_in_step(app, client, auth_headers, make_product):
+    product_id = make_product(quantity_in_stock=20, price=1.5)
+    assert client.patch(f'/products/{product_id}', json={'quantity_in_stock': 25}).status_code == 200
+    assert client.post(f'/products/{product_id}/adjust-stock', json={'delta': -5}).status_code == 200
+    assert client.post('/sales', json={'product_id': product_id, 'name': 'Product 1', 'quantity_sold': 4,
+                                       'total_price': 6.0}).status_code == 201
+    assert client.post('/checkout', json={'items': [{'product_id': product_id, 'quantity': 6}]},
+                       headers=auth_headers).status_code == 201
+    assert client.patch(f'/products/{product_id}', json={'price': 2.0}).status_code == 200
+    run_jobs(app)
+
+    state = stock_state(app, product_id)
+    assert state['quantity_in_stock'] == 10
+    assert state['level_sold'] == 10
+    assert_consistent(state)
+    with app.app_context():
+        assert StockTransaction.reconcile(db.session.connection()) == 0
+    result = app.test_cli_runner().invoke(args=['rebuild-stock-summary', '--check'])
+    assert result.exit_code == 0, result.output
@@ -0,0 +1,53 @@
+from models import db, product_supplier
+
+def link(app, pairs):
+    with app.app_context():
+        db.session.execute(product_supplier.insert(), [{'product_id': product_id, 'supplier_id': supplier_id}
+                                                       for product_id, supplier_id in pairs])
+        db.session.commit()
+
+def make_suppliers(client, *names):
+    for name in names:
+        assert client.post('/suppliers', json={'name': name, 'contact': f'{name.lower()}@example.com'}).status_code == 201
+
+def test_supplier_products_are_paged(app, client, make_product):
+    products = [make_product() for _ in range(3)]
+    make_suppliers(client, 'Acme', 'Globex')
+    link(app, [(products[0], 1), (products[2], 1), (products[1], 2)])
+
+    body = client.get('/suppliers/1/products?limit=1').get_json()
+    assert [product['sku'] for product in body['products']] == ['SKU-1']
+    body = client.get(f"/suppliers/1/products?limit=1&cursor={body['next_cursor']}").get_json()
+    assert [product['sku'] for product in body['products']] == ['SKU-3']
+    assert body['next_cursor'] is None
+    assert client.get('/suppliers/99/products').status_code == 404
+
+def test_restock_lookup_groups_skus_by_supplier(app, client, make_product):
+    products = [make_product() for _ in range(3)]
+    make_suppliers(client, 'Acme', 'Globex')
+    link(app, [(products[0], 1), (products[0], 2), (products[1], 2)])
+
+    body = client.post('/suppliers/restock-lookup', json={'skus': ['SKU-1', 'SKU-2', 'SKU-3', 'NOPE']}).get_json()
+    #the supplier covering the most skus comes first
+    assert [(supplier['name'], supplier['skus']) for supplier in body['suppliers']] == \
+        [('Globex', ['SKU-1', 'SKU-2']), ('Acme', ['SKU-1'])]
+    assert body['unsupplied_skus'] == ['NOPE', 'SKU-3']
+
+def test_restock_lookup_validates_its_input(app, client):
+    assert client.post('/suppliers/restock-lookup', json={'skus': 'SKU-1'}).status_code == 400
+    assert client.post('/suppliers/restock-lookup', json={'skus': [1]}).status_code == 400
+    app.config['SUPPLIER_LOOKUP_MAX_SKUS'] = 2
+    assert client.post('/suppliers/restock-lookup', json={'skus': ['A', 'B', 'C']}).status_code == 400
+
+def test_deleting_a_supplier_drops_it_from_cached_products(app, client, make_product):
+    product_id = make_product()
+    make_suppliers(client, 'Acme')
+    link(app, [(product_id, 1)])
+    response = client.get(f'/products/{product_id}')
+    assert [supplier['name'] for supplier in response.get_json()['suppliers']] == ['Acme']
+
+    assert client.delete('/suppliers/1').status_code == 200
+    #the product's version moved on, so a conditional GET with the old ETag gets the new body
+    response = client.get(f'/products/{product_id}', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 200
+    assert response.get_json()['suppliers'] == []